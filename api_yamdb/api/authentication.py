@@ -0,0 +1,55 @@
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from users.cache import get_token_state, load_token_state
+from users.models import TokenUser, User
+
+from .cache import shared_cache
+
+# Версия токенов пользователя на момент выпуска
+VERSION_CLAIM = 'token_version'
+
+
+def access_token_for(user):
+    """Токен доступа с правами пользователя в claims"""
+    token = AccessToken.for_user(user)
+    for field in User.CLAIM_FIELDS:
+        token[field] = getattr(user, field)
+    token[VERSION_CLAIM] = user.token_version
+    return token
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """JWT-аутентификация без запросов к БД.
+
+    Версия токенов и права пользователя берутся из общего кэша, а при
+    промахе - из основной БД: токен с устаревшей версией отклоняется,
+    смена роли и флагов через save() действует сразу, в обход save() -
+    через AUTH_CACHE_TIMEOUT. Остальные поля догружаются из кэша
+    пользователей при обращении. Токены без версии проверяются,
+    как в JWTAuthentication.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None or VERSION_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+        # Кэш в памяти процесса не узнает о смене прав в других воркерах
+        claims = (
+            get_token_state(user_id) if shared_cache()
+            else load_token_state(user_id)
+        )
+        if claims is None:
+            raise AuthenticationFailed(
+                'User not found', code='user_not_found'
+            )
+        if claims['token_version'] != validated_token[VERSION_CLAIM]:
+            raise AuthenticationFailed(
+                'Token has been revoked', code='token_revoked'
+            )
+        if not claims['is_active']:
+            raise AuthenticationFailed(
+                'User is inactive', code='user_inactive'
+            )
+        return TokenUser.from_claims(user_id, claims)
@@ -0,0 +1,177 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .db_router import replica_may_lag
+
+GENERATION_KEY = 'api:generation:{}'
+RESPONSE_KEY = 'api:response:{}'
+
+# Бэкенды, которые не видят изменений из других процессов
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def shared_cache():
+    """Кэш по умолчанию общий для воркеров и команд manage.py.
+
+    Иначе поколение, сброшенное в одном процессе, не увидят остальные,
+    и они бессрочно отдавали бы устаревшие ответы и 304.
+    """
+    return settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_BACKENDS
+
+
+def get_generations(*resources):
+    """Текущие поколения ресурсов, отсутствующие заводятся заново.
+
+    Поколение - время последнего изменения в наносекундах, поэтому
+    после вытеснения из кэша счетчик не повторяет старые значения,
+    а вытеснение только сбрасывает закэшированные ответы.
+    """
+    keys = {GENERATION_KEY.format(resource): resource
+            for resource in resources}
+    found = cache.get_many(keys)
+    for key in keys.keys() - found.keys():
+        cache.add(key, time.time_ns(), None)
+        found[key] = cache.get(key)
+    return tuple(found[GENERATION_KEY.format(resource)]
+                 for resource in resources)
+
+
+def bump_generations(*resources):
+    """Инвалидирует все закэшированные ответы и ETag ресурсов"""
+    keys = [GENERATION_KEY.format(resource) for resource in resources]
+    current = cache.get_many(keys)
+    now = time.time_ns()
+    cache.set_many(
+        {key: max(now, current.get(key, 0) + 1) for key in keys}, None
+    )
+
+
+class ResourceGenerationMixin:
+    """Поколения ресурсов, от которых зависит ответ представления"""
+
+    cache_resources = ()
+
+    def get_cache_resources(self):
+        return self.cache_resources
+
+    def get_resource_generations(self):
+        if getattr(self, '_generations', None) is None:
+            self._generations = get_generations(*self.get_cache_resources())
+        return self._generations
+
+
+class ConditionalGetMixin(ResourceGenerationMixin):
+    """Отвечает 304 Not Modified на list и retrieve без обращения к БД.
+
+    ETag и Last-Modified строятся из поколений ресурсов, поэтому
+    проверка выполняется до выборки данных и сериализации. Ответ
+    из отстающей реплики и ответы при кэше в памяти процесса
+    отдаются без них.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        if not shared_cache():
+            return handler(request, *args, **kwargs)
+        generations = self.get_resource_generations()
+        raw = repr((
+            self.basename,
+            request.accepted_renderer.format,
+            generations,
+        ))
+        etag = '"{}"'.format(hashlib.md5(raw.encode()).hexdigest())
+        last_modified = max(generations) // 10 ** 9
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is not None:
+            return response
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200 and not replica_may_lag(generations):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+
+class CachedResponseMixin(ResourceGenerationMixin):
+    """Кэширует ответы list и retrieve до изменения ресурсов.
+
+    Ключ включает поколения ресурсов из cache_resources, аргументы URL
+    и нормализованные параметры фильтрации, поиска и пагинации.
+    Ответы из реплики вскоре после изменения ресурсов не кэшируются,
+    при кэше в памяти процесса ответы не кэшируются вовсе.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def get_cache_params(self):
+        """Имена query-параметров, влияющих на ответ"""
+        params = set()
+        filterset_class = getattr(self, 'filterset_class', None)
+        if filterset_class is not None:
+            params.update(filterset_class.base_filters)
+        if getattr(self, 'search_fields', None):
+            params.add(api_settings.SEARCH_PARAM)
+        paginator = self.paginator
+        if paginator is not None:
+            for attr in ('page_query_param', 'page_size_query_param'):
+                if getattr(paginator, attr, None):
+                    params.add(getattr(paginator, attr))
+        return params
+
+    def get_cache_key(self, request):
+        query = sorted(
+            (name, value)
+            for name in self.get_cache_params()
+            for value in request.query_params.getlist(name)
+            if value != ''
+        )
+        raw = repr((
+            self.basename,
+            self.action,
+            request.get_host(),
+            sorted(self.kwargs.items()),
+            self.get_resource_generations(),
+            query,
+        ))
+        return RESPONSE_KEY.format(hashlib.md5(raw.encode()).hexdigest())
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not shared_cache():
+            return handler(request, *args, **kwargs)
+        key = self.get_cache_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            return Response(cached)
+        response = handler(request, *args, **kwargs)
+        if (
+            response.status_code == 200
+            and not replica_may_lag(self.get_resource_generations())
+        ):
+            cache.set(key, response.data, settings.API_CACHE_TIMEOUT)
+        return response
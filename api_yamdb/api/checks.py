@@ -0,0 +1,16 @@
+from django.core.checks import Tags, Warning, register
+
+from .cache import shared_cache
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """Кэш ответов и ETag требуют кэша, общего для всех процессов"""
+    if shared_cache():
+        return []
+    return [Warning(
+        'Кэш по умолчанию хранится в памяти процесса: кэш ответов API '
+        'и ETag отключены.',
+        hint='Укажите в CACHE_BACKEND файловый кэш, Redis или Memcached.',
+        id='api.W001',
+    )]
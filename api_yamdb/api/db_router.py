@@ -0,0 +1,82 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+PRIMARY = 'default'
+STICKY_COOKIE = 'primary_reads'
+STICKY_SALT = 'api.db_router.sticky'
+
+_state = threading.local()
+
+
+def read_alias():
+    """БД для чтения в текущем потоке"""
+    return getattr(_state, 'alias', None) or PRIMARY
+
+
+@contextmanager
+def read_from(alias):
+    """Направляет чтения в блоке в alias, None - в основную БД"""
+    previous = getattr(_state, 'alias', None)
+    _state.alias = alias
+    try:
+        yield
+    finally:
+        _state.alias = previous
+
+
+def stick_to_primary(response, user_id):
+    """После записи пользователь какое-то время читает из основной БД.
+
+    Отметка хранится в подписанной cookie с id пользователя, поэтому
+    ее видит любой воркер, а чужая или просроченная не действует.
+    """
+    response.set_signed_cookie(
+        STICKY_COOKIE, str(user_id), salt=STICKY_SALT,
+        max_age=settings.REPLICA_STICKY_SECONDS, httponly=True,
+        samesite='Lax',
+    )
+
+
+def is_sticky(request, user_id):
+    if user_id is None:
+        return False
+    value = request.get_signed_cookie(
+        STICKY_COOKIE, default=None, salt=STICKY_SALT,
+        max_age=settings.REPLICA_STICKY_SECONDS,
+    )
+    return value == str(user_id)
+
+
+def replica_may_lag(generations):
+    """Чтение идет из реплики, которая могла не получить последние изменения.
+
+    generations - поколения ресурсов из api.cache, то есть время
+    последнего изменения в наносекундах. Такие ответы нельзя кэшировать:
+    устаревшие данные закрепились бы под новым поколением.
+    """
+    if read_alias() == PRIMARY or not generations:
+        return False
+    lag = settings.REPLICA_STICKY_SECONDS * 10 ** 9
+    return time.time_ns() - max(generations) < lag
+
+
+class ReplicaRouter:
+    """Запись - в основную БД, чтение - в БД, выбранную для запроса.
+
+    Реплику для безопасных запросов API выбирает
+    ReplicaRoutingMiddleware, вне запросов (команды, миграции)
+    все идет в основную БД.
+    """
+
+    def db_for_read(self, model, **hints):
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная БД
+        return True
@@ -0,0 +1,374 @@
+import json
+import random
+import time
+from datetime import datetime, timezone
+
+from api.authentication import access_token_for
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max, Q
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from reviews.models import Category, Comment, Genre, Review, Title
+from users.models import User
+
+API = '/api/v1'
+
+# Размер пачки в сценарии массовой записи произведений
+BULK_TITLES = 1000
+
+# Сценарии замера по мере роста отзывов и комментариев (--sweep)
+SWEEP_ENDPOINTS = (
+    'titles-list', 'titles-detail', 'reviews-list-cursor',
+    'search-reviews', 'search-comments',
+)
+
+
+def percentile(values, fraction):
+    """Перцентиль методом ближайшего ранга"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1,
+                       round(fraction * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+class Scenarios:
+    """Запросы к эндпоинтам api/urls.py на случайных данных из БД.
+
+    Каждый сценарий возвращает (метод, url, пользователь).
+    """
+
+    def __init__(self, rng):
+        self.random = rng
+        self.max_title = self.max_pk(Title)
+        self.max_review = self.max_pk(Review)
+        self.max_comment = self.max_pk(Comment)
+        self.titles_count = Title.objects.count()
+        self.users_count = User.objects.count()
+        self.popular = list(
+            Title.objects.order_by('-reviews_count')
+            .values_list('pk', 'reviews_count')[:20]
+        )
+        self.genres = list(Genre.objects.values_list('slug', flat=True))
+        self.categories = list(
+            Category.objects.values_list('slug', flat=True)
+        )
+        self.admin = User.objects.filter(
+            Q(role='admin') | Q(is_superuser=True)
+        ).first()
+        self.user = User.objects.filter(role='user').first()
+
+    @staticmethod
+    def max_pk(model):
+        return model.objects.aggregate(value=Max('pk'))['value'] or 0
+
+    def pick(self, model, max_pk):
+        """Случайный существующий объект, ближайший к случайному id"""
+        pk = self.random.randint(1, max(max_pk, 1))
+        return model.objects.filter(pk__gte=pk).order_by('pk').first()
+
+    def page(self, count):
+        """Случайная существующая страница списка из count объектов"""
+        pages = -(-count // settings.REST_FRAMEWORK['PAGE_SIZE'])
+        return self.random.randint(1, max(pages, 1))
+
+    def title(self):
+        return self.pick(Title, self.max_title)
+
+    def review(self):
+        return self.pick(Review, self.max_review)
+
+    def comment(self):
+        return self.pick(Comment, self.max_comment)
+
+    def word(self):
+        title = self.title()
+        return title.name.split()[0] if title else 'a'
+
+    def all(self):
+        if not (self.popular and self.genres and self.categories
+                and self.max_review and self.max_comment):
+            raise CommandError(
+                'Недостаточно данных, запустите generate_data'
+            )
+        scenarios = {
+            'titles-list': lambda: (
+                'get', f'{API}/titles/?page={self.page(self.titles_count)}',
+                None,
+            ),
+            'titles-list-filtered': lambda: (
+                'get', f'{API}/titles/?genre={self.random.choice(self.genres)}'
+                f'&category={self.random.choice(self.categories)}', None,
+            ),
+            'titles-search': lambda: (
+                'get', f'{API}/titles/?name={self.word()[:5]}', None,
+            ),
+            'titles-detail': lambda: (
+                'get', f'{API}/titles/{self.title().pk}/', None,
+            ),
+            'titles-autocomplete': lambda: (
+                'get', f'{API}/titles/autocomplete/?q={self.word()[:2]}',
+                None,
+            ),
+            'genres-list': lambda: ('get', f'{API}/genres/', None),
+            'categories-list': lambda: ('get', f'{API}/categories/', None),
+            'reviews-list': lambda: self.popular_reviews(paginate=True),
+            'reviews-list-cursor': lambda: self.popular_reviews(),
+            'reviews-detail': lambda: (
+                'get', self.review_url(self.review()), None,
+            ),
+            'comments-list': lambda: (
+                'get', self.review_url(self.review()) + 'comments/', None,
+            ),
+            'comments-detail': lambda: (
+                'get', self.comment_url(self.comment()), None,
+            ),
+            'search-reviews': lambda: (
+                'get', f'{API}/search/reviews/?q='
+                f'{self.random.choice(("сюжет", "финал", "шедевр"))}', None,
+            ),
+            'search-comments': lambda: (
+                'get', f'{API}/search/comments/?q=автор', None,
+            ),
+        }
+        if self.admin is not None:
+            scenarios['users-list'] = lambda: (
+                'get', f'{API}/users/?page={self.page(self.users_count)}',
+                self.admin,
+            )
+        if self.user is not None:
+            scenarios['users-me'] = lambda: (
+                'get', f'{API}/users/me/', self.user,
+            )
+        return scenarios
+
+    def writes(self):
+        """Сценарии записи от имени нового пользователя с ролью.
+
+        Возвращают (метод, url, роль, данные) и выполняются
+        в транзакции, которая затем откатывается.
+        """
+        return {
+            'reviews-create': lambda: (
+                'post', f'{API}/titles/{self.title().pk}/reviews/', 'user',
+                {'text': 'Отзыв для замера', 'score': 7},
+            ),
+            'comments-create': lambda: (
+                'post', self.review_url(self.review()) + 'comments/', 'user',
+                {'text': 'Комментарий для замера'},
+            ),
+            'titles-bulk': lambda: (
+                'post', f'{API}/titles/bulk/', 'admin', [
+                    {'name': f'Замер {number}', 'year': 2000,
+                     'description': 'Описание',
+                     'category': self.random.choice(self.categories),
+                     'genre': self.random.sample(self.genres, 1)}
+                    for number in range(BULK_TITLES)
+                ],
+            ),
+        }
+
+    def popular_reviews(self, paginate=False):
+        """Отзывы одного из самых популярных произведений"""
+        pk, count = self.random.choice(self.popular)
+        query = (f'page={self.page(count)}' if paginate
+                 else 'pagination=cursor')
+        return 'get', f'{API}/titles/{pk}/reviews/?{query}', None
+
+    @staticmethod
+    def review_url(review):
+        return f'{API}/titles/{review.title_id}/reviews/{review.pk}/'
+
+    @staticmethod
+    def comment_url(comment):
+        review = comment.review
+        return (f'{API}/titles/{review.title_id}/reviews/'
+                f'{review.pk}/comments/{comment.pk}/')
+
+
+class Command(BaseCommand):
+    help = 'measure latency and queries per request of API endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=100)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--endpoint', action='append', default=[],
+            help='run only these scenarios (repeatable)',
+        )
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='clear the response cache before every request',
+        )
+        parser.add_argument(
+            '--writes', action='store_true',
+            help='also measure create endpoints (rolled back)',
+        )
+        parser.add_argument(
+            '--sweep', type=int, action='append', default=[],
+            help='grow reviews and comments to this many rows with '
+                 'generate_data and measure again (repeatable, cold, '
+                 'the added rows stay in the database)',
+        )
+        parser.add_argument('--output', help='write results to this json')
+        parser.add_argument('--compare', help='previous results json')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        if options['sweep']:
+            self.sweep(rng, options)
+            return
+        results = self.run(rng, options)
+        report = dict(self.header(options), endpoints=results)
+        if options['output']:
+            self.save(options['output'], report)
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def select(self, rng, options, default=()):
+        """Сценарии из --endpoint (или default) на текущих данных"""
+        scenarios = Scenarios(rng)
+        selected = scenarios.all()
+        if options['writes']:
+            selected.update(scenarios.writes())
+        names = options['endpoint'] or default
+        if names:
+            unknown = set(names) - selected.keys()
+            if unknown:
+                raise CommandError(f'Неизвестные сценарии: {unknown}')
+            selected = {name: selected[name] for name in names}
+        return selected, scenarios.writes().keys()
+
+    def run(self, rng, options, default=()):
+        selected, writes = self.select(rng, options, default)
+        results = {}
+        for name, scenario in selected.items():
+            results[name] = self.measure(
+                scenario, options['iterations'], options['warmup'],
+                options['cold'], write=name in writes,
+            )
+            self.report(name, results[name])
+        return results
+
+    def header(self, options):
+        return {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'database': connection.vendor,
+            'rows': {
+                model.__name__: model.objects.count()
+                for model in (User, Title, Review, Comment)
+            },
+            'iterations': options['iterations'],
+            'cold': options['cold'],
+        }
+
+    @staticmethod
+    def save(path, report):
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+    def sweep(self, rng, options):
+        """Замеры при росте таблиц отзывов и комментариев.
+
+        Перед каждым шагом generate_data дописывает отзывы
+        к существующим произведениям и комментарии к отзывам.
+        Время ответа не должно расти вместе с размером таблиц.
+        """
+        options = dict(options, cold=True)
+        steps = []
+        for total in sorted(options['sweep']):
+            self.grow(total, options['seed'])
+            step = self.header(options)
+            self.stdout.write(
+                f'\nОтзывов: {step["rows"]["Review"]}, '
+                f'комментариев: {step["rows"]["Comment"]}'
+            )
+            step['endpoints'] = self.run(rng, options, SWEEP_ENDPOINTS)
+            steps.append(step)
+        self.stdout.write('\nРост p50 относительно первого шага')
+        first, last = steps[0]['endpoints'], steps[-1]['endpoints']
+        for name, result in last.items():
+            if first[name]['p50_ms']:
+                ratio = result['p50_ms'] / first[name]['p50_ms']
+                self.stdout.write(f'{name:24} x{ratio:.2f}')
+        if options['output']:
+            self.save(options['output'], {'sweep': steps})
+
+    def grow(self, total, seed):
+        reviews = max(0, total - Review.objects.count())
+        comments = max(0, total - Comment.objects.count())
+        if not reviews and not comments:
+            return
+        # Новые авторы: у одного произведения не больше отзыва на автора
+        call_command(
+            'generate_data', users=max(1, reviews // 10), categories=0,
+            genres=0, titles=0, reviews=reviews, comments=comments,
+            seed=seed, verbosity=0, stdout=self.stdout,
+        )
+
+    def measure(self, scenario, iterations, warmup, cold, write=False):
+        client = Client()
+        timings, queries, errors = [], [], 0
+        for number in range(warmup + iterations):
+            if write:
+                method, url, role, data = scenario()
+                data = json.dumps(data)
+                headers = {'content_type': 'application/json'}
+            else:
+                method, url, user = scenario()
+                data, headers = None, {}
+            if cold:
+                cache.clear()
+            with transaction.atomic():
+                if write:
+                    user = User.objects.create(
+                        username='benchmark', email='benchmark@yamdb.ru',
+                        role=role,
+                    )
+                if user is not None:
+                    headers['HTTP_AUTHORIZATION'] = (
+                        f'Bearer {access_token_for(user)}'
+                    )
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = getattr(client, method)(url, data, **headers)
+                    elapsed = time.perf_counter() - started
+                if write:
+                    transaction.set_rollback(True)
+            if number < warmup:
+                continue
+            timings.append(elapsed * 1000)
+            queries.append(len(captured))
+            errors += response.status_code >= 400
+        return {
+            'p50_ms': round(percentile(timings, 0.50), 3),
+            'p95_ms': round(percentile(timings, 0.95), 3),
+            'p99_ms': round(percentile(timings, 0.99), 3),
+            'mean_ms': round(sum(timings) / len(timings), 3),
+            'queries_mean': round(sum(queries) / len(queries), 2),
+            'queries_max': max(queries),
+            'errors': errors,
+        }
+
+    def report(self, name, result):
+        self.stdout.write(
+            f'{name:24} p50 {result["p50_ms"]:8.2f} ms  '
+            f'p95 {result["p95_ms"]:8.2f} ms  '
+            f'p99 {result["p99_ms"]:8.2f} ms  '
+            f'queries {result["queries_mean"]:5.1f}  '
+            f'errors {result["errors"]}'
+        )
+
+    def compare(self, path, results):
+        with open(path, encoding='utf-8') as file:
+            previous = json.load(file)['endpoints']
+        self.stdout.write('\nИзменение p95 относительно ' + path)
+        for name, result in results.items():
+            if name not in previous or not previous[name]['p95_ms']:
+                continue
+            ratio = result['p95_ms'] / previous[name]['p95_ms']
+            self.stdout.write(f'{name:24} x{ratio:.2f}')
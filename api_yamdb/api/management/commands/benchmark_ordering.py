@@ -0,0 +1,70 @@
+import time
+
+from api.representations import TitleRepresentation
+from api.utils import TitleFilter
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from reviews.models import Category, Genre, Title
+
+from .benchmark_api import percentile
+
+# Признаки сортировки в плане запроса
+SORT_MARKERS = ('USE TEMP B-TREE FOR ORDER BY', 'Sort Key')
+
+
+class Command(BaseCommand):
+    help = ('Измеряет первую страницу списка произведений при разных '
+            'сортировках и фильтрах')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+
+    def handle(self, *args, **options):
+        category = Category.objects.first()
+        genre = Genre.objects.first()
+        year = Title.objects.values_list('year', flat=True).first()
+        if category is None or genre is None or year is None:
+            raise CommandError('Нет данных: выполните generate_data')
+        cases = [{'ordering': ordering} for ordering in (
+            'year', '-year', 'name', '-name', 'pub_date', '-pub_date',
+            'weighted_rating', '-weighted_rating', 'rating', '-rating',
+        )] + [
+            {'ordering': '-weighted_rating', 'category': category.slug},
+            {'ordering': '-weighted_rating', 'genre': genre.slug},
+            {'ordering': '-rating', 'category': category.slug},
+            {'ordering': 'name', 'year': year},
+            {'ordering': '-pub_date', 'category': category.slug},
+        ]
+        size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        self.stdout.write(f'Произведений: {Title.objects.count()}')
+        # Сортировка по полю без индекса - для сравнения
+        self.report(
+            'score_sum без индекса',
+            Title.objects.order_by('-score_sum', '-id'),
+            size, options['iterations'],
+        )
+        for params in cases:
+            queryset = TitleFilter(params, Title.objects.all()).qs
+            label = '&'.join(f'{key}={value}'
+                             for key, value in params.items())
+            self.report(label, queryset, size, options['iterations'])
+
+    def report(self, label, queryset, size, iterations):
+        plan = queryset[:size].explain()
+        sorts = any(marker in plan for marker in SORT_MARKERS)
+
+        def first_page():
+            representation = TitleRepresentation()
+            return representation.represent(
+                representation.get_values(queryset)[:size]
+            )
+
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            first_page()
+            timings.append((time.perf_counter() - started) * 1000)
+        self.stdout.write(
+            f'{label:40} p50 {percentile(timings, 0.5):8.2f} ms  '
+            f'сортировка: {"да" if sorts else "нет"}'
+        )
@@ -0,0 +1,79 @@
+import time
+
+from api.representations import (CommentRepresentation, ReviewRepresentation,
+                                 TitleRepresentation)
+from api.serializers import (CommentSerializer, ReviewSerializer,
+                             TitleSerializerDetail)
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from rest_framework.renderers import JSONRenderer
+from reviews.models import Review, Title
+
+from .benchmark_api import percentile
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает сериализаторы и представления из .values() '
+            'на страницах списков')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument(
+            '--page-size', type=int, action='append', default=[],
+            help='page sizes to measure (repeatable)',
+        )
+
+    def handle(self, *args, **options):
+        sizes = options['page_size'] or [
+            settings.REST_FRAMEWORK['PAGE_SIZE'], 100
+        ]
+        title = Title.objects.order_by('-reviews_count').first()
+        review = Review.objects.annotate(
+            comments_total=Count('comments')
+        ).order_by('-comments_total').first()
+        if title is None or review is None:
+            raise CommandError('Нет данных: выполните generate_data')
+        cases = (
+            ('titles',
+             Title.objects.select_related('category')
+             .prefetch_related('genre'),
+             TitleSerializerDetail, TitleRepresentation),
+            ('reviews', title.reviews.select_related('author'),
+             ReviewSerializer, ReviewRepresentation),
+            ('comments', review.comments.select_related('author'),
+             CommentSerializer, CommentRepresentation),
+        )
+        renderer = JSONRenderer()
+        for name, queryset, serializer_class, representation_class in cases:
+            for size in sizes:
+                def serialized():
+                    return renderer.render(
+                        serializer_class(queryset[:size], many=True).data
+                    )
+
+                def represented():
+                    representation = representation_class()
+                    return renderer.render(representation.represent(
+                        representation.get_values(queryset)[:size]
+                    ))
+
+                if serialized() != represented():
+                    raise CommandError(f'{name}: ответы различаются')
+                before = self.measure(serialized, options['iterations'])
+                after = self.measure(represented, options['iterations'])
+                self.stdout.write(
+                    f'{name:10} page {size:4}  '
+                    f'serializer p50 {before:7.2f} ms  '
+                    f'values p50 {after:7.2f} ms  '
+                    f'x{before / after:.1f}'
+                )
+
+    @staticmethod
+    def measure(render, iterations):
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            render()
+            timings.append((time.perf_counter() - started) * 1000)
+        return percentile(timings, 0.5)
@@ -0,0 +1,450 @@
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from api.authentication import access_token_for
+from django.conf import settings
+from django.contrib.auth.tokens import default_token_generator
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.db import connection, connections
+from reviews.models import Review, Title
+from users.models import User
+
+from .benchmark_api import percentile
+
+API = '/api/v1'
+
+# Доли действий в профилях нагрузки
+PROFILES = {
+    'browse': {'browse-titles': 6, 'title-detail': 3, 'read-reviews': 1},
+    'read': {'browse-titles': 3, 'title-detail': 2, 'read-reviews': 4,
+             'read-comments': 2},
+    'mixed': {'browse-titles': 4, 'title-detail': 2, 'read-reviews': 4,
+              'read-comments': 2, 'post-review': 2, 'post-comment': 2,
+              'signup': 1},
+    'write': {'post-review': 5, 'post-comment': 4, 'signup': 1},
+}
+
+# Границы корзин гистограммы задержек, мс
+HISTOGRAM_BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+# Строка access-лога nginx или gunicorn в формате combined
+ACCESS_LOG_RE = re.compile(r'"(GET|HEAD) (\S+) HTTP/[\d.]+"')
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class Workload:
+    """Случайные запросы к реальным эндпоинтам на данных из БД"""
+
+    def __init__(self, rng, mix):
+        self.random = rng
+        self.lock = threading.Lock()
+        self.actions = list(mix)
+        self.weights = [mix[action] for action in self.actions]
+        self.titles = list(Title.objects.values_list('pk', 'reviews_count'))
+        self.popular = sorted(
+            self.titles, key=lambda title: -title[1]
+        )[:50]
+        self.reviews = list(
+            Review.objects.order_by('-pk')
+            .values_list('pk', 'title_id')[:1000]
+        )
+        self.users = list(
+            User.objects.filter(role='user')
+            .values_list('username', flat=True)[:1000]
+        )
+        if not self.titles or not self.reviews or not self.users:
+            raise CommandError(
+                'Недостаточно данных, запустите generate_data'
+            )
+
+    def page(self, count):
+        pages = -(-count // settings.REST_FRAMEWORK['PAGE_SIZE'])
+        return self.random.randint(1, max(pages, 1))
+
+    def next(self):
+        with self.lock:
+            action = self.random.choices(self.actions, self.weights)[0]
+            return getattr(self, action.replace('-', '_'))()
+
+    def browse_titles(self):
+        return request('browse-titles', 'GET',
+                       f'{API}/titles/?page={self.page(len(self.titles))}')
+
+    def title_detail(self):
+        pk = self.random.choice(self.titles)[0]
+        return request('title-detail', 'GET', f'{API}/titles/{pk}/')
+
+    def read_reviews(self):
+        pk, count = self.random.choice(self.popular)
+        return request('read-reviews', 'GET',
+                       f'{API}/titles/{pk}/reviews/?page={self.page(count)}')
+
+    def read_comments(self):
+        pk, title_id = self.random.choice(self.reviews)
+        return request('read-comments', 'GET',
+                       f'{API}/titles/{title_id}/reviews/{pk}/comments/')
+
+    def post_review(self):
+        # Популярные произведения и общий пул авторов дают конкурентные
+        # вставки в unique_title_author
+        pk = self.random.choice(self.popular)[0]
+        return request(
+            'post-review', 'POST', f'{API}/titles/{pk}/reviews/',
+            {'text': 'Отзыв под нагрузкой',
+             'score': self.random.randint(1, 10)},
+            self.random.choice(self.users),
+        )
+
+    def post_comment(self):
+        pk, title_id = self.random.choice(self.reviews)
+        return request(
+            'post-comment', 'POST',
+            f'{API}/titles/{title_id}/reviews/{pk}/comments/',
+            {'text': 'Комментарий под нагрузкой'},
+            self.random.choice(self.users),
+        )
+
+    def signup(self):
+        username = f'load_{uuid.uuid4().hex[:12]}'
+        return request('signup', 'POST', f'{API}/auth/signup/',
+                       {'username': username,
+                        'email': f'{username}@yamdb.ru'})
+
+
+def request(action, method, path, data=None, user=None):
+    return {'action': action, 'method': method, 'path': path,
+            'data': data, 'user': user}
+
+
+def read_log(path):
+    """Запросы из записанного лога.
+
+    Поддерживаются json-строки, записанные --record, и строки
+    access-лога в формате combined, из которых берутся GET-запросы.
+    """
+    requests = []
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if line.startswith('{'):
+                requests.append(json.loads(line))
+                continue
+            match = ACCESS_LOG_RE.search(line)
+            if match:
+                requests.append(request('replay', *match.groups()))
+    return requests
+
+
+class Command(BaseCommand):
+    help = 'drive a concurrent mixed workload against the API'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url', help='base url of a running server, for example '
+            'gunicorn; by default the app is started in-process',
+        )
+        parser.add_argument('--profile', choices=PROFILES, default='mixed')
+        parser.add_argument(
+            '--mix', help='custom weights, e.g. browse-titles=5,signup=1',
+        )
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument(
+            '--duration', type=float,
+            help='run for this many seconds instead of --requests',
+        )
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--timeout', type=float, default=30)
+        parser.add_argument('--replay', help='request log to replay')
+        parser.add_argument(
+            '--realtime', action='store_true',
+            help='keep the recorded request offsets while replaying',
+        )
+        parser.add_argument('--record', help='write sent requests here')
+        parser.add_argument('--output', help='write results to this json')
+
+    def handle(self, *args, **options):
+        self.timeout = options['timeout']
+        self.tokens = {}
+        self.lock = threading.Lock()
+        self.results = []
+        self.record = None
+        if options['record']:
+            self.record = open(options['record'], 'w', encoding='utf-8')
+
+        server = None
+        base_url = options['url']
+        if base_url is None:
+            server, base_url = self.start_server()
+        self.base_url = base_url.rstrip('/')
+
+        if options['replay']:
+            planned = read_log(options['replay'])
+            if not planned:
+                raise CommandError('В логе нет запросов')
+            realtime = options['realtime']
+            if realtime:
+                planned.sort(key=lambda item: item.get('t') or 0)
+            source = iter(planned)
+            # Запросы за токеном уже есть в логе
+            self.follow_signup = False
+        else:
+            workload = Workload(
+                random.Random(options['seed']), self.get_mix(options)
+            )
+            source = (workload.next() for _ in itertools.count())
+            realtime = False
+            self.follow_signup = True
+
+        sampler = ConnectionSampler()
+        sampler.start()
+        self.started = time.monotonic()
+        deadline = (self.started + options['duration']
+                    if options['duration'] else None)
+        limit = None if options['replay'] or deadline else options['requests']
+        try:
+            with ThreadPoolExecutor(options['concurrency']) as pool:
+                workers = [
+                    pool.submit(self.worker, source, limit, deadline,
+                                realtime)
+                    for _ in range(options['concurrency'])
+                ]
+                for worker in workers:
+                    worker.result()
+        finally:
+            elapsed = time.monotonic() - self.started
+            sampler.stop()
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+            if self.record is not None:
+                self.record.close()
+
+        report = self.build_report(elapsed, options, sampler.peak)
+        self.print_report(report)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+
+    def get_mix(self, options):
+        if not options['mix']:
+            return PROFILES[options['profile']]
+        mix = {}
+        for item in options['mix'].split(','):
+            action, _, weight = item.partition('=')
+            if not hasattr(Workload, action.replace('-', '_')):
+                raise CommandError(f'Неизвестное действие: {action}')
+            mix[action] = float(weight or 1)
+        return mix
+
+    def start_server(self):
+        """Запускает WSGI-приложение в фоновом потоке на свободном порту"""
+        server = ThreadedWSGIServer(('127.0.0.1', 0), QuietRequestHandler)
+        server.set_app(get_wsgi_application())
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        host, port = server.server_address
+        return server, f'http://{host}:{port}'
+
+    def take(self, source, limit):
+        with self.lock:
+            if limit is not None and len(self.results) >= limit:
+                return None
+            try:
+                planned = next(source)
+            except StopIteration:
+                return None
+            # Место под результат резервируется сразу, чтобы потоки
+            # не выдали больше limit запросов
+            self.results.append(None)
+            return len(self.results) - 1, planned
+
+    def worker(self, source, limit, deadline, realtime):
+        try:
+            while deadline is None or time.monotonic() < deadline:
+                taken = self.take(source, limit)
+                if taken is None:
+                    return
+                index, planned = taken
+                if realtime and planned.get('t') is not None:
+                    delay = self.started + planned['t'] - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                self.results[index] = self.send(planned)
+                if (self.follow_signup and planned['action'] == 'signup'
+                        and self.results[index]['status'] == 200):
+                    result = self.send(request(
+                        'token', 'POST', f'{API}/auth/token/',
+                        {'username': planned['data']['username']},
+                    ))
+                    with self.lock:
+                        self.results.append(result)
+        finally:
+            connections.close_all()
+
+    def authorization(self, username):
+        with self.lock:
+            if username not in self.tokens:
+                user = User.objects.get(username=username)
+                self.tokens[username] = f'Bearer {access_token_for(user)}'
+            return self.tokens[username]
+
+    def send(self, planned):
+        data = planned.get('data')
+        if (planned['path'].endswith('/auth/token/')
+                and 'confirmation_code' not in data):
+            user = User.objects.get(username=data['username'])
+            data = dict(
+                data, confirmation_code=default_token_generator.make_token(
+                    user
+                )
+            )
+        headers = {'Content-Type': 'application/json'}
+        if planned.get('user'):
+            headers['Authorization'] = self.authorization(planned['user'])
+        body = json.dumps(data).encode() if data is not None else None
+        http_request = Request(
+            self.base_url + planned['path'], body, headers,
+            method=planned['method'],
+        )
+        offset = time.monotonic() - self.started
+        try:
+            with urlopen(http_request, timeout=self.timeout) as response:
+                response.read()
+                status = response.status
+        except HTTPError as error:
+            status = error.code
+        except (URLError, OSError):
+            status = 0
+        latency = (time.monotonic() - self.started - offset) * 1000
+        if self.record is not None:
+            recorded = dict(planned, t=round(offset, 3))
+            if recorded['path'].endswith('/auth/token/'):
+                recorded['data'] = {'username': data['username']}
+            with self.lock:
+                self.record.write(json.dumps(recorded, ensure_ascii=False))
+                self.record.write('\n')
+        return {'action': planned['action'], 'status': status,
+                'latency': latency}
+
+    def build_report(self, elapsed, options, peak_connections):
+        results = [result for result in self.results if result is not None]
+        by_action = defaultdict(list)
+        for result in results:
+            by_action[result['action']].append(result)
+        return {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'database': connection.vendor,
+            'target': options['url'] or 'in-process',
+            'profile': ('replay' if options['replay']
+                        else options['mix'] or options['profile']),
+            'concurrency': options['concurrency'],
+            'elapsed_s': round(elapsed, 3),
+            'db_connections_peak': peak_connections,
+            'total': summarize(results, elapsed),
+            'actions': {
+                action: summarize(action_results, elapsed)
+                for action, action_results in sorted(by_action.items())
+            },
+            'histogram': histogram(
+                [result['latency'] for result in results]
+            ),
+        }
+
+    def print_report(self, report):
+        for name, summary in (('total', report['total']),
+                              *report['actions'].items()):
+            self.stdout.write(
+                f'{name:14} {summary["requests"]:7} запросов '
+                f'{summary["rps"]:8.1f} rps  '
+                f'ошибок {summary["error_rate"]:6.2%}  '
+                f'4xx {summary["client_errors"]:5}  '
+                f'p50 {summary["p50_ms"]:8.1f}  '
+                f'p95 {summary["p95_ms"]:8.1f}  '
+                f'p99 {summary["p99_ms"]:8.1f} ms'
+            )
+        if report['db_connections_peak'] is not None:
+            self.stdout.write(
+                f'Пик соединений с БД: {report["db_connections_peak"]}'
+            )
+        widest = max(report['histogram'].values(), default=0) or 1
+        for bucket, count in report['histogram'].items():
+            bar = '#' * round(40 * count / widest)
+            self.stdout.write(f'{bucket:>10} ms {count:7} {bar}')
+
+
+def summarize(results, elapsed):
+    latencies = [result['latency'] for result in results] or [0]
+    errors = sum(
+        result['status'] >= 500 or result['status'] == 0
+        for result in results
+    )
+    return {
+        'requests': len(results),
+        'rps': round(len(results) / elapsed, 2) if elapsed else 0,
+        'errors': errors,
+        'error_rate': round(errors / len(results), 4) if results else 0,
+        'client_errors': sum(
+            400 <= result['status'] < 500 for result in results
+        ),
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'max_ms': round(max(latencies), 3),
+    }
+
+
+def histogram(latencies):
+    """Число запросов по корзинам задержки, ключ - верхняя граница"""
+    buckets = {f'<={bound}': 0 for bound in HISTOGRAM_BOUNDS}
+    buckets[f'>{HISTOGRAM_BOUNDS[-1]}'] = 0
+    for latency in latencies:
+        for bound in HISTOGRAM_BOUNDS:
+            if latency <= bound:
+                buckets[f'<={bound}'] += 1
+                break
+        else:
+            buckets[f'>{HISTOGRAM_BOUNDS[-1]}'] += 1
+    return buckets
+
+
+class ConnectionSampler(threading.Thread):
+    """Раз в секунду замеряет число соединений с БД PostgreSQL"""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.stopped = threading.Event()
+        self.peak = None
+
+    def run(self):
+        if connection.vendor != 'postgresql':
+            return
+        try:
+            while not self.stopped.wait(1):
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        'SELECT count(*) FROM pg_stat_activity '
+                        'WHERE datname = current_database()'
+                    )
+                    self.peak = max(self.peak or 0, cursor.fetchone()[0])
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
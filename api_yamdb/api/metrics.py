@@ -0,0 +1,122 @@
+import os
+import threading
+from bisect import bisect_left
+
+# Границы корзин гистограмм длительности, сек
+DURATION_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+# Границы корзин гистограммы числа запросов к БД
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+HISTOGRAMS = (
+    ('yamdb_request_duration_seconds', 'Время обработки запроса',
+     DURATION_BUCKETS),
+    ('yamdb_view_duration_seconds', 'Время работы представления',
+     DURATION_BUCKETS),
+    ('yamdb_render_duration_seconds', 'Время рендеринга ответа',
+     DURATION_BUCKETS),
+    ('yamdb_db_duration_seconds', 'Время запросов к БД', DURATION_BUCKETS),
+    ('yamdb_db_queries', 'Число запросов к БД', QUERY_BUCKETS),
+)
+
+# Методы, которые попадают в метку method; остальные считаются как other,
+# иначе произвольный метод запроса заводил бы новые ряды метрик
+METHODS = frozenset(
+    ('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS')
+)
+OTHER_METHOD = 'other'
+
+
+class Histogram:
+    """Накопительная гистограмма в формате Prometheus"""
+
+    __slots__ = ('bounds', 'counts', 'sum')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        # Последняя корзина - +Inf
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+def method_label(method):
+    return method if method in METHODS else OTHER_METHOD
+
+
+class Registry:
+    """Метрики запросов по маршрутам в памяти процесса.
+
+    Каждый воркер считает только свои запросы и отдает их с меткой
+    worker - pid процесса; между воркерами метрики не складываются.
+    Поэтому каждый воркер опрашивается отдельной целью Prometheus
+    (свой порт или сокет), а общие значения считает запрос вида
+    sum without (worker). Опрос через общий балансировщик попадает
+    в случайный воркер и видит только его запросы.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.routes = {}
+        self.responses = {}
+
+    def observe(self, route, method, status, values):
+        """values - значения в порядке HISTOGRAMS"""
+        method = method_label(method)
+        key = (route, method)
+        with self.lock:
+            histograms = self.routes.get(key)
+            if histograms is None:
+                histograms = self.routes[key] = [
+                    Histogram(bounds) for _, _, bounds in HISTOGRAMS
+                ]
+            for histogram, value in zip(histograms, values):
+                histogram.observe(value)
+            key = (route, method, status)
+            self.responses[key] = self.responses.get(key, 0) + 1
+
+    def render(self):
+        """Метрики в текстовом формате Prometheus 0.0.4"""
+        with self.lock:
+            routes = {
+                key: [(list(h.counts), h.sum) for h in histograms]
+                for key, histograms in self.routes.items()
+            }
+            responses = dict(self.responses)
+        # pid берется при выводе: воркеры форкаются после импорта модуля
+        worker = f'worker="{os.getpid()}"'
+        lines = [
+            '# HELP yamdb_responses_total Число ответов',
+            '# TYPE yamdb_responses_total counter',
+        ]
+        for (route, method, status), count in sorted(responses.items()):
+            lines.append(
+                f'yamdb_responses_total{{{worker},route="{route}",'
+                f'method="{method}",status="{status}"}} {count}'
+            )
+        for index, (name, help_text, bounds) in enumerate(HISTOGRAMS):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for (route, method), histograms in sorted(routes.items()):
+                counts, total = histograms[index]
+                labels = f'{worker},route="{route}",method="{method}"'
+                cumulative = 0
+                for bound, count in zip(bounds + ('+Inf',), counts):
+                    cumulative += count
+                    lines.append(
+                        f'{name}_bucket{{{labels},le="{bound}"}} '
+                        f'{cumulative}'
+                    )
+                lines.append(f'{name}_sum{{{labels}}} {total}')
+                lines.append(f'{name}_count{{{labels}}} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
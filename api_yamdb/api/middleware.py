@@ -0,0 +1,182 @@
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.urls import Resolver404, resolve
+from rest_framework.exceptions import APIException
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+from .authentication import ClaimsJWTAuthentication
+from .db_router import is_sticky, read_from, stick_to_primary
+from .metrics import registry
+from .profiling import run_profiled
+
+
+class QueryTimer:
+    """execute_wrapper, считающий запросы к БД и их время"""
+
+    __slots__ = ('count', 'duration')
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+class ServerTimingMiddleware:
+    """Время запроса, представления, рендеринга и БД для каждого запроса.
+
+    Значения отдаются в заголовке Server-Timing и накапливаются
+    в гистограммах по имени маршрута (title-list, reviews-detail),
+    которые отдает /api/v1/metrics/. Рендеринг - время от возврата
+    ответа представлением до конца обработки, для ответов без
+    отложенного рендеринга оно входит во время представления.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = QueryTimer()
+        request._view_finished = None
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        finished = time.perf_counter()
+        total = finished - started
+        view_finished = request._view_finished or finished
+        render = finished - view_finished
+        view = view_finished - started
+
+        match = request.resolver_match
+        route = 'unmatched'
+        if match is not None:
+            route = match.url_name or match.view_name
+        registry.observe(
+            route, request.method, response.status_code,
+            (total, view, render, timer.duration, timer.count),
+        )
+        if settings.SERVER_TIMING_HEADER:
+            response['Server-Timing'] = (
+                f'db;dur={timer.duration * 1000:.2f};'
+                f'desc="{timer.count} queries", '
+                f'view;dur={view * 1000:.2f}, '
+                f'render;dur={render * 1000:.2f}, '
+                f'total;dur={total * 1000:.2f}'
+            )
+        return response
+
+    def process_template_response(self, request, response):
+        request._view_finished = time.perf_counter()
+        return response
+
+
+class ProfilingMiddleware:
+    """Профилирует запрос под cProfile по заголовку или выборочно.
+
+    Заголовок PROFILE_HEADER учитывается только от администратора,
+    выборка задается долей запросов маршрута в PROFILE_SAMPLE_RATES.
+    Профили сохраняются в PROFILE_DIR и отдаются /api/v1/profiles/.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.header = 'HTTP_' + settings.PROFILE_HEADER.upper().replace(
+            '-', '_'
+        )
+
+    def __call__(self, request):
+        route = self.profiled_route(request)
+        if route is None:
+            return self.get_response(request)
+        return run_profiled(self.get_response, request, route)
+
+    def profiled_route(self, request):
+        """Имя маршрута, если запрос нужно профилировать"""
+        requested = self.header in request.META
+        if not requested and not settings.PROFILE_SAMPLE_RATES:
+            return None
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+        route = match.url_name or match.view_name
+        if requested:
+            return route if self.is_admin(request) else None
+        if random.random() < settings.PROFILE_SAMPLE_RATES.get(route, 0):
+            return route
+        return None
+
+    @staticmethod
+    def is_admin(request):
+        # Представления DRF аутентифицируют запрос позже, поэтому
+        # токен проверяется здесь тем же классом
+        try:
+            result = ClaimsJWTAuthentication().authenticate(request)
+        except APIException:
+            return False
+        if result is None:
+            return False
+        user = result[0]
+        return user.role == 'admin' or user.is_superuser
+
+
+class ReplicaRoutingMiddleware:
+    """Безопасные запросы читают из реплики, остальные - из основной БД.
+
+    После успешной записи пользователь REPLICA_STICKY_SECONDS читает
+    из основной БД и сразу видит свои изменения: отметка передается
+    в подписанной cookie. Пользователь определяется по user_id
+    из проверенного JWT без запроса к БД.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.authentication = JWTAuthentication()
+
+    def __call__(self, request):
+        if not settings.REPLICA_DATABASES:
+            return self.get_response(request)
+        user_id = self.token_user_id(request)
+        replica = None
+        if (
+            request.method in SAFE_METHODS
+            and not is_sticky(request, user_id)
+        ):
+            replica = random.choice(settings.REPLICA_DATABASES)
+        with read_from(replica):
+            response = self.get_response(request)
+        if (
+            request.method not in SAFE_METHODS
+            and response.status_code < 400
+            and user_id is not None
+        ):
+            stick_to_primary(response, user_id)
+        return response
+
+    def token_user_id(self, request):
+        header = self.authentication.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.authentication.get_raw_token(header)
+        if raw_token is None:
+            return None
+        try:
+            token = self.authentication.get_validated_token(raw_token)
+        except (APIException, TokenError):
+            return None
+        return token.get(api_settings.USER_ID_CLAIM)
@@ -0,0 +1,164 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+# Наибольший id, который примет BIGINT в условии по ключу
+MAX_ID = 2 ** 63 - 1
+
+
+class CountedRows:
+    """Строки .values() для пагинации с подсчетом по исходной выборке.
+
+    Полям из связанных таблиц нужны JOIN, которые Django оставляет
+    и в COUNT(*), поэтому count() считает queryset без них. Страницы
+    берутся срезом строк, курсорная пагинация получает их filter
+    и order_by.
+    """
+
+    def __init__(self, rows, queryset):
+        self.rows = rows
+        self.queryset = queryset
+
+    @property
+    def ordered(self):
+        return self.rows.ordered
+
+    def count(self):
+        return self.queryset.count()
+
+    def filter(self, *args, **kwargs):
+        return self.rows.filter(*args, **kwargs)
+
+    def order_by(self, *field_names):
+        return self.rows.order_by(*field_names)
+
+    def __getitem__(self, key):
+        return self.rows[key]
+
+
+class KeysetPagination(BasePagination):
+    """Курсорная пагинация по паре (pub_date, id).
+
+    Страница выбирается условием по ключу и LIMIT, без COUNT(*) и OFFSET,
+    поэтому время выборки не зависит от глубины листания.
+    """
+
+    page_size = PageNumberPagination.page_size
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        position, reverse = self.decode_cursor(request)
+        if position is None:
+            queryset = queryset.order_by('pub_date', 'id')
+        elif reverse:
+            queryset = queryset.filter(
+                Q(pub_date__lt=position[0])
+                | Q(pub_date=position[0], id__lt=position[1])
+            ).order_by('-pub_date', '-id')
+        else:
+            queryset = queryset.filter(
+                Q(pub_date__gt=position[0])
+                | Q(pub_date=position[0], id__gt=position[1])
+            ).order_by('pub_date', 'id')
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.page = results
+        self.position = position
+        return results
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if self.page:
+            return self.encode_cursor(
+                self.position_of(self.page[-1]), reverse=False
+            )
+        # Пустая страница при листании назад: продолжаем с того же места
+        return self.encode_cursor(self.position, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.page:
+            return self.encode_cursor(
+                self.position_of(self.page[0]), reverse=True
+            )
+        return self.encode_cursor(self.position, reverse=True)
+
+    @staticmethod
+    def position_of(item):
+        """Ключ объекта страницы: модели или строки .values()"""
+        if isinstance(item, dict):
+            return item['pub_date'], item['id']
+        return item.pub_date, item.pk
+
+    def encode_cursor(self, position, reverse):
+        raw = f'{position[0].isoformat()}|{position[1]}|{int(reverse)}'
+        cursor = urlsafe_b64encode(raw.encode()).decode()
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, cursor
+        )
+
+    def decode_cursor(self, request):
+        """Возвращает ((pub_date, id), reverse) или (None, False)"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            raw = urlsafe_b64decode(encoded.encode()).decode()
+            pub_date, pk, reverse = raw.split('|')
+            position = (parse_datetime(pub_date), int(pk))
+        except (BinasciiError, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if position[0] is None or not 0 <= position[1] <= MAX_ID:
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse == '1'
+
+
+class OptionalCursorPagination(PageNumberPagination):
+    """Постраничная пагинация с включаемым курсорным режимом.
+
+    Курсорный режим включается параметром ?pagination=cursor или
+    переданным курсором, в остальных случаях работает как
+    PageNumberPagination.
+    """
+
+    mode_query_param = 'pagination'
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or self.keyset_class.cursor_query_param in request.query_params
+        ):
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
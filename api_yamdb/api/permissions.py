@@ -10,7 +10,7 @@ class AuthorModeratorOrReadOnly(IsAuthenticatedOrReadOnly):
     def has_object_permission(self, request, view, obj):
         return (
             request.method in SAFE_METHODS
-            or obj.author == request.user
+            or obj.author_id == request.user.pk
             or request.user.role in ('moderator', 'admin')
             or request.user.is_superuser
         )
@@ -0,0 +1,108 @@
+import cProfile
+import json
+import os
+import re
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+# Имя профиля: время создания в наносекундах и маршрут
+PROFILE_ID_RE = re.compile(r'\d+-[\w-]+')
+UNSAFE_CHARS_RE = re.compile(r'[^\w-]+')
+
+
+class QueryLog:
+    """execute_wrapper, сохраняющий SQL профилируемого запроса"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql,
+                'params': None if many else repr(params),
+                'duration_ms': (time.perf_counter() - started) * 1000,
+            })
+
+
+def profile_path(profile_id, extension):
+    return os.path.join(settings.PROFILE_DIR, f'{profile_id}.{extension}')
+
+
+def save_profile(profiler, meta, queries):
+    """Сохраняет профиль в .prof, а описание и SQL - в .json рядом.
+
+    Хранится не больше PROFILE_MAX_FILES профилей, самые старые
+    удаляются. Возвращает id профиля.
+    """
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    route = UNSAFE_CHARS_RE.sub('_', meta['route'])
+    profile_id = f'{time.time_ns()}-{route}'
+    profiler.dump_stats(profile_path(profile_id, 'prof'))
+    with open(profile_path(profile_id, 'json'), 'w', encoding='utf-8') as file:
+        json.dump(dict(meta, id=profile_id, queries=queries), file,
+                  ensure_ascii=False)
+    for old in list_profile_ids()[settings.PROFILE_MAX_FILES:]:
+        for extension in ('prof', 'json'):
+            try:
+                os.remove(profile_path(old, extension))
+            except FileNotFoundError:
+                pass
+    return profile_id
+
+
+def list_profile_ids():
+    """id сохраненных профилей, новые первыми"""
+    try:
+        names = os.listdir(settings.PROFILE_DIR)
+    except FileNotFoundError:
+        return []
+    ids = [
+        name[:-len('.prof')] for name in names
+        if name.endswith('.prof')
+        and PROFILE_ID_RE.fullmatch(name[:-len('.prof')])
+    ]
+    return sorted(ids, key=lambda profile_id: int(profile_id.split('-')[0]),
+                  reverse=True)
+
+
+def load_profile_meta(profile_id):
+    """Описание профиля с SQL или None, если профиля нет"""
+    if not PROFILE_ID_RE.fullmatch(profile_id):
+        return None
+    try:
+        with open(profile_path(profile_id, 'json'), encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def run_profiled(get_response, request, route):
+    """Выполняет запрос под cProfile и сохраняет профиль"""
+    profiler = cProfile.Profile()
+    queries = QueryLog()
+    started = time.perf_counter()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(queries))
+        profiler.enable()
+        try:
+            response = get_response(request)
+        finally:
+            profiler.disable()
+    profile_id = save_profile(profiler, {
+        'route': route,
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status': response.status_code,
+        'created': time.time(),
+        'duration_ms': (time.perf_counter() - started) * 1000,
+    }, queries.queries)
+    response['X-Profile-Id'] = profile_id
+    return response
@@ -0,0 +1,143 @@
+from rest_framework import serializers
+from reviews.histogram import median_score, score_percentiles
+from reviews.models import SCORES, GenreTitle, Title
+
+# Поля DRF, через которые проходят значения, чтобы формат ответа
+# совпадал с сериализаторами побайтно
+DATE_TIME = serializers.DateTimeField()
+INTEGER = serializers.IntegerField()
+FLOAT = serializers.FloatField()
+
+
+class ValuesRepresentation:
+    """Представление для чтения, собранное из строк .values().
+
+    Строит те же словари, что и сериализатор чтения, но без объектов
+    моделей и экземпляров полей на каждую строку. values - поля
+    выборки, represent_row - ответ для одной строки.
+    """
+
+    values = ()
+
+    def get_values(self, queryset):
+        return queryset.prefetch_related(None).values(*self.values)
+
+    def represent(self, rows):
+        return [self.represent_row(row) for row in rows]
+
+    def represent_row(self, row):
+        raise NotImplementedError
+
+
+class TitleRepresentation(ValuesRepresentation):
+    """Как TitleSerializerDetail, жанры загружаются одним запросом"""
+
+    values = (
+        'id', 'name', 'year', 'description', 'reviews_count', 'score_sum',
+        'category__name', 'category__slug',
+    )
+
+    def represent(self, rows):
+        rows = list(rows)
+        self.genres = {}
+        for title_id, slug, name in GenreTitle.objects.filter(
+            title_id__in=[row['id'] for row in rows], genre__isnull=False
+        ).order_by('genre_id').values_list(
+            'title_id', 'genre__slug', 'genre__name'
+        ):
+            self.genres.setdefault(title_id, []).append(
+                {'slug': slug, 'name': name}
+            )
+        return super().represent(rows)
+
+    def represent_row(self, row):
+        category = None
+        if row['category__slug'] is not None:
+            category = {
+                'name': row['category__name'],
+                'slug': row['category__slug'],
+            }
+        rating = None
+        if row['reviews_count']:
+            rating = INTEGER.to_representation(
+                row['score_sum'] / row['reviews_count']
+            )
+        return {
+            'id': row['id'],
+            'category': category,
+            'genre': self.genres.get(row['id'], []),
+            'name': row['name'],
+            'year': row['year'],
+            'rating': rating,
+            'description': row['description'],
+        }
+
+
+class TitleHistogramRepresentation(TitleRepresentation):
+    """Как TitleRepresentation, плюс гистограмма, медиана и перцентили
+    оценок"""
+
+    values = TitleRepresentation.values + Title.HISTOGRAM_FIELDS
+
+    def represent_row(self, row):
+        data = super().represent_row(row)
+        histogram = {
+            score: row[field]
+            for score, field in zip(SCORES, Title.HISTOGRAM_FIELDS)
+        }
+        median = median_score(histogram)
+        data['score_histogram'] = {
+            str(score): count for score, count in histogram.items()
+        }
+        data['median_score'] = (
+            None if median is None else FLOAT.to_representation(median)
+        )
+        data['score_percentiles'] = score_percentiles(histogram)
+        return data
+
+
+class TopTitleRepresentation(TitleRepresentation):
+    """Как TitleRepresentation, плюс взвешенный рейтинг"""
+
+    values = TitleRepresentation.values + ('weighted_rating',)
+
+    def represent_row(self, row):
+        data = super().represent_row(row)
+        data['weighted_rating'] = round(row['weighted_rating'], 2)
+        return data
+
+
+class ReviewRepresentation(ValuesRepresentation):
+    """Как ReviewSerializer"""
+
+    values = (
+        'id', 'text', 'author__username', 'score', 'pub_date',
+        'comment_count', 'last_comment_at',
+    )
+
+    def represent_row(self, row):
+        return {
+            'id': row['id'],
+            'text': row['text'],
+            'author': row['author__username'],
+            'score': row['score'],
+            'pub_date': DATE_TIME.to_representation(row['pub_date']),
+            'comment_count': row['comment_count'],
+            'last_comment_at': DATE_TIME.to_representation(
+                row['last_comment_at']
+            ),
+        }
+
+
+class CommentRepresentation(ValuesRepresentation):
+    """Как CommentSerializer"""
+
+    values = ('id', 'text', 'author__username', 'pub_date')
+
+    def represent_row(self, row):
+        return {
+            'id': row['id'],
+            'text': row['text'],
+            'author': row['author__username'],
+            'pub_date': DATE_TIME.to_representation(row['pub_date']),
+        }
@@ -1,5 +1,8 @@
 from rest_framework import serializers
-from reviews.models import Category, Comment, Genre, Review, Title
+from reviews.bulk import resolve_slugs
+from reviews.histogram import median_score, score_percentiles
+from reviews.models import (Category, CategoryStats, Comment, Genre,
+                            GenreStats, Review, Title)
 from users.models import User
 
 
@@ -35,8 +38,14 @@ class ReviewSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Review
-        fields = ('id', 'text', 'author', 'score', 'pub_date')
-        read_only_fields = ('id', 'pub_date', 'title', 'author')
+        fields = (
+            'id', 'text', 'author', 'score', 'pub_date',
+            'comment_count', 'last_comment_at',
+        )
+        read_only_fields = (
+            'id', 'pub_date', 'title', 'author',
+            'comment_count', 'last_comment_at',
+        )
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -128,3 +137,192 @@ class TitleSerializer(serializers.ModelSerializer):
 class TitleSerializerDetail(TitleSerializer):
     category = CategorySerializer()
     genre = GenreSerializer(read_only=True, many=True)
+
+
+class TitleHistogramSerializer(TitleSerializerDetail):
+    """Произведение с гистограммой, медианой и перцентилями оценок"""
+    score_histogram = serializers.SerializerMethodField()
+    median_score = serializers.SerializerMethodField()
+    score_percentiles = serializers.SerializerMethodField()
+
+    class Meta(TitleSerializerDetail.Meta):
+        fields = TitleSerializerDetail.Meta.fields + (
+            'score_histogram', 'median_score', 'score_percentiles',
+        )
+
+    def get_score_histogram(self, obj):
+        return {
+            str(score): count
+            for score, count in obj.score_histogram.items()
+        }
+
+    def get_median_score(self, obj):
+        return median_score(obj.score_histogram)
+
+    def get_score_percentiles(self, obj):
+        return score_percentiles(obj.score_histogram)
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    """Список объектов для массовой записи.
+
+    Ключ Meta.bulk_key не должен повторяться в одном запросе, ошибки
+    возвращаются списком по одной на объект.
+    """
+
+    def to_internal_value(self, data):
+        # Ошибки validate() DRF превращает в non_field_errors, поэтому
+        # общие проверки выполняются здесь и сохраняют форму списка
+        return self.validate_items(super().to_internal_value(data))
+
+    def validate_items(self, attrs):
+        key = self.child.Meta.bulk_key
+        seen, errors = set(), []
+        for item in attrs:
+            value = item.get(key)
+            if value is not None and value in seen:
+                errors.append({key: ['Повторяется в запросе.']})
+            else:
+                errors.append({})
+            seen.add(value)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return attrs
+
+
+class GenreBulkSerializer(GenreSerializer):
+    class Meta(GenreSerializer.Meta):
+        list_serializer_class = BulkListSerializer
+        bulk_key = 'slug'
+        # Существующий slug означает обновление, а не ошибку
+        extra_kwargs = {'slug': {'validators': []}}
+
+
+class CategoryBulkSerializer(CategorySerializer):
+    class Meta(CategorySerializer.Meta):
+        list_serializer_class = BulkListSerializer
+        bulk_key = 'slug'
+        extra_kwargs = {'slug': {'validators': []}}
+
+
+class TitleBulkListSerializer(BulkListSerializer):
+    """Проверяет ссылки всех произведений вместе.
+
+    Жанры, категории и обновляемые произведения загружаются одним
+    запросом на модель, slug заменяются на id.
+    """
+
+    def validate_items(self, attrs):
+        attrs = super().validate_items(attrs)
+        genres = resolve_slugs(
+            Genre, (slug for item in attrs for slug in item['genre'])
+        )
+        categories = resolve_slugs(
+            Category, (item['category'] for item in attrs)
+        )
+        titles = Title.objects.in_bulk(
+            [item['id'] for item in attrs if 'id' in item]
+        )
+        rows, errors = [], []
+        for item in attrs:
+            error = {}
+            missing = [slug for slug in item['genre'] if slug not in genres]
+            if missing:
+                error['genre'] = [
+                    f'Жанр {slug} не найден.' for slug in missing
+                ]
+            if item['category'] not in categories:
+                error['category'] = [
+                    f'Категория {item["category"]} не найдена.'
+                ]
+            if 'id' in item and item['id'] not in titles:
+                error['id'] = ['Произведение не найдено.']
+            errors.append(error)
+            fields = {
+                name: item[name] for name in ('name', 'year', 'description')
+                if name in item
+            }
+            fields['category_id'] = categories.get(item['category'])
+            rows.append({
+                'instance': titles.get(item.get('id')),
+                'fields': fields,
+                'genre_ids': [genres.get(slug) for slug in item['genre']],
+            })
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return rows
+
+
+class TitleBulkSerializer(serializers.ModelSerializer):
+    """Произведение для массовой записи: с id обновляется, без - создается"""
+    id = serializers.IntegerField(required=False)
+    genre = serializers.ListField(
+        child=serializers.SlugField(), allow_empty=False
+    )
+    category = serializers.SlugField()
+
+    class Meta:
+        model = Title
+        fields = ('id', 'category', 'genre', 'name', 'year', 'description')
+        list_serializer_class = TitleBulkListSerializer
+        bulk_key = 'id'
+
+
+class GenreStatsSerializer(serializers.ModelSerializer):
+    """Статистика жанра из таблицы сводок"""
+    slug = serializers.CharField(source='genre.slug')
+    name = serializers.CharField(source='genre.name')
+    rating = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = GenreStats
+        fields = ('slug', 'name', 'titles_count', 'reviews_count', 'rating')
+
+
+class CategoryStatsSerializer(GenreStatsSerializer):
+    slug = serializers.CharField(source='category.slug')
+    name = serializers.CharField(source='category.name')
+
+    class Meta(GenreStatsSerializer.Meta):
+        model = CategoryStats
+
+
+class TitleAutocompleteSerializer(serializers.ModelSerializer):
+    """Краткое представление произведения для подсказок поиска"""
+
+    class Meta:
+        model = Title
+        fields = ('id', 'name', 'year')
+
+
+class TextSearchQuerySerializer(serializers.Serializer):
+    """Параметры полнотекстового поиска по отзывам и комментариям"""
+    q = serializers.CharField()
+    title = serializers.IntegerField(required=False)
+    author = serializers.CharField(required=False)
+    date_from = serializers.DateTimeField(
+        required=False, input_formats=('iso-8601', '%Y-%m-%d')
+    )
+    date_to = serializers.DateTimeField(
+        required=False, input_formats=('iso-8601', '%Y-%m-%d')
+    )
+    limit = serializers.IntegerField(
+        required=False, default=20, min_value=1, max_value=100
+    )
+
+
+class ReviewSearchSerializer(ReviewSerializer):
+    title = serializers.PrimaryKeyRelatedField(read_only=True)
+    rank = serializers.FloatField(read_only=True)
+
+    class Meta(ReviewSerializer.Meta):
+        fields = ReviewSerializer.Meta.fields + ('title', 'rank')
+
+
+class CommentSearchSerializer(CommentSerializer):
+    title = serializers.IntegerField(source='review.title_id', read_only=True)
+    review = serializers.PrimaryKeyRelatedField(read_only=True)
+    rank = serializers.FloatField(read_only=True)
+
+    class Meta(CommentSerializer.Meta):
+        fields = CommentSerializer.Meta.fields + ('title', 'review', 'rank')
@@ -0,0 +1,156 @@
+import threading
+
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+from reviews.models import Category, Comment, Genre, GenreTitle, Review, Title
+from reviews.signals import bulk_changed
+from users.models import User
+
+from .cache import bump_generations
+from .db_router import PRIMARY
+
+# Ресурсы API, ответы которых зависят от модели
+DEPENDENT_RESOURCES = {
+    Title: ('titles',),
+    Review: ('titles',),
+    GenreTitle: ('titles',),
+    Genre: ('genres', 'titles'),
+    Category: ('categories', 'titles'),
+}
+
+# Ресурсы, целиком устаревающие при массовом изменении модели
+BULK_RESOURCES = {
+    Review: ('reviews',),
+    Comment: ('comments',),
+    User: ('users',),
+}
+
+# Отзывы с измененными комментариями, чьи произведения еще не известны
+_pending = threading.local()
+
+
+def bump_on_commit(*resources):
+    """Сбрасывает поколения после фиксации транзакции.
+
+    Иначе параллельный запрос успеет закэшировать старые данные
+    под новым поколением.
+    """
+    transaction.on_commit(lambda: bump_generations(*resources))
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_cached_responses(sender, **kwargs):
+    """Сбрасывает кэш ответов API при изменении связанных моделей"""
+    resources = DEPENDENT_RESOURCES.get(sender)
+    if resources:
+        bump_on_commit(*resources)
+
+
+@receiver(bulk_changed)
+def invalidate_bulk_changes(sender, **kwargs):
+    resources = (
+        DEPENDENT_RESOURCES.get(sender, ()) + BULK_RESOURCES.get(sender, ())
+    )
+    if resources:
+        bump_on_commit(*resources)
+
+
+@receiver(m2m_changed, sender=Title.genre.through)
+def invalidate_title_genres(sender, action, **kwargs):
+    """Изменение жанров через title.genre.set() не вызывает post_save"""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_on_commit('titles')
+
+
+@receiver(pre_save, sender=Review)
+def remember_review_title(sender, instance, **kwargs):
+    """Отзыв, перенесенный в другое произведение, меняет оба списка"""
+    previous = getattr(instance, '_loaded_values', {}).get('title_id')
+    instance._previous_title_id = (
+        previous if isinstance(previous, int) else None
+    )
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_reviews(sender, instance, **kwargs):
+    title_ids = {instance.title_id, getattr(
+        instance, '_previous_title_id', None
+    )} - {None}
+    bump_on_commit(
+        *(f'reviews:{title_id}' for title_id in title_ids),
+        f'comments:{instance.pk}',
+    )
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comments(sender, instance, **kwargs):
+    """Список отзывов показывает число комментариев, поэтому он тоже
+    устаревает. Отзыв обычно уже загружен представлением, иначе его
+    произведение ищется после фиксации вместе с остальными."""
+    if Comment.review.is_cached(instance):
+        bump_on_commit(
+            f'comments:{instance.review_id}',
+            f'reviews:{instance.review.title_id}',
+        )
+        return
+    bump_on_commit(f'comments:{instance.review_id}')
+    review_ids = getattr(_pending, 'review_ids', None)
+    if review_ids is None:
+        review_ids = _pending.review_ids = set()
+    review_ids.add(instance.review_id)
+    transaction.on_commit(bump_pending_reviews)
+
+
+def bump_pending_reviews():
+    """Сбрасывает списки отзывов по накопленным отзывам одним запросом.
+
+    Каскадное удаление отзыва или произведения иначе читало бы отзыв
+    на каждый комментарий. Удаленные отзывы не находятся, их списки
+    сбрасывают обработчики удаления отзыва и произведения. Набор
+    после отката транзакции сбросится при следующей фиксации.
+    """
+    review_ids = getattr(_pending, 'review_ids', None)
+    if not review_ids:
+        return
+    _pending.review_ids = None
+    title_ids = set(
+        Review.objects.using(PRIMARY).filter(pk__in=review_ids)
+        .values_list('title_id', flat=True)
+    )
+    if title_ids:
+        bump_generations(*(f'reviews:{title_id}' for title_id in title_ids))
+
+
+@receiver(pre_save)
+def remember_username(sender, instance, **kwargs):
+    """Отзывы и комментарии показывают только имя автора"""
+    if isinstance(instance, User):
+        claims = getattr(instance, '_loaded_claims', None)
+        instance._username_changed = (
+            claims is None or claims['username'] != instance.username
+        )
+
+
+@receiver(post_save)
+def invalidate_usernames(sender, instance, created, **kwargs):
+    if (
+        isinstance(instance, User) and not created
+        and getattr(instance, '_username_changed', True)
+    ):
+        bump_on_commit('users')
+
+
+@receiver(post_delete)
+def invalidate_deleted_user(sender, instance, **kwargs):
+    if isinstance(instance, User):
+        bump_on_commit('users')
+
+
+@receiver(post_delete, sender=Title)
+def invalidate_title_reviews(sender, instance, **kwargs):
+    bump_on_commit(f'reviews:{instance.pk}')
@@ -0,0 +1,72 @@
+from django.core.cache import cache
+from django.db.models import Count, Sum
+from rest_framework.test import APITestCase
+from reviews.histogram import find_counter_mismatches
+from reviews.models import Category, Review, Title
+from users.models import User
+
+
+def create_user(username, **fields):
+    """Пользователь с почтой по имени"""
+    return User.objects.create(
+        username=username, email=f'{username}@yamdb.ru', **fields
+    )
+
+
+def create_users(count, prefix='user'):
+    return [create_user(f'{prefix}{number}') for number in range(count)]
+
+
+def create_admin(username='admin'):
+    return create_user(username, role='admin')
+
+
+def create_category(name='Фильм', slug='movie', **fields):
+    return Category.objects.create(name=name, slug=slug, **fields)
+
+
+def create_title(name, category, year=2000, genres=(), description='',
+                 **fields):
+    title = Title.objects.create(
+        name=name, year=year, description=description, category=category,
+        **fields
+    )
+    if genres:
+        title.genre.set(genres)
+    return title
+
+
+def create_review(title, author, score, text='Отзыв'):
+    return Review.objects.create(
+        title=title, author=author, text=text, score=score
+    )
+
+
+class YamdbTestCase(APITestCase):
+    """Тест API с пустым кэшем перед каждым тестом.
+
+    Файловый кэш общий для всех тестов запуска: без очистки ответы
+    и поколения ресурсов одного теста достались бы следующему.
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    @staticmethod
+    def review(title, author, score, text='Отзыв'):
+        return create_review(title, author, score, text)
+
+    def assert_title_counters(self):
+        """Счетчики, средняя и гистограмма произведений равны агрегатам
+        по их отзывам"""
+        for title in Title.objects.annotate(
+            expected_count=Count('reviews'),
+            expected_sum=Sum('reviews__score'),
+        ):
+            count, total = title.expected_count, title.expected_sum or 0
+            self.assertEqual(
+                (title.reviews_count, title.score_sum, title.mean_rating),
+                (count, total, total // count if count else 0),
+                title.name,
+            )
+        self.assertEqual(list(find_counter_mismatches(chunk_size=1)), [])
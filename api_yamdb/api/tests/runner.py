@@ -0,0 +1,29 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """Запускает тесты с пустым файловым кэшем во временном каталоге.
+
+    Файловый кэш переживает процесс, поэтому без этого тесты видели бы
+    ответы и поколения ресурсов из прошлых запусков и сервера разработки.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_dir = tempfile.mkdtemp(prefix='yamdb-test-cache-')
+        self.cache_settings = override_settings(CACHES={
+            'default': dict(
+                settings.CACHES['default'], LOCATION=self.cache_dir
+            ),
+        })
+        self.cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.cache_settings.disable()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
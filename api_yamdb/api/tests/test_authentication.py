@@ -0,0 +1,199 @@
+import time
+
+from django.contrib.auth.tokens import default_token_generator
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import AccessToken
+from reviews.models import Review
+from users.cache import clear_user_cache
+from users.models import User
+
+from ..authentication import access_token_for
+from .base import (YamdbTestCase, create_admin, create_category, create_title,
+                   create_user)
+
+
+class ClaimsAuthenticationTests(YamdbTestCase):
+    """Пользователь восстанавливается из claims и прав в общем кэше"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader', bio='Читатель')
+        cls.admin = create_admin('boss')
+        cls.title = create_title('Сталкер', create_category(), year=1979)
+
+    def setUp(self):
+        super().setUp()
+        clear_user_cache()
+
+    def authorize(self, user, token=None):
+        token = token or access_token_for(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def user_queries(self, url, method='get', data=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data)
+        return response, [
+            query['sql'] for query in queries
+            if '"users_user"' in query['sql']
+        ]
+
+    def test_issued_token_carries_claims(self):
+        response = self.client.post('/api/v1/auth/signup/', {
+            'username': 'fresh', 'email': 'fresh@yamdb.ru'
+        })
+        self.assertEqual(response.status_code, 200)
+        user = User.objects.get(username='fresh')
+        response = self.client.post('/api/v1/auth/token/', {
+            'username': 'fresh',
+            'confirmation_code': default_token_generator.make_token(user),
+        })
+        token = AccessToken(response.data['token'])
+        self.assertEqual(token['username'], 'fresh')
+        self.assertEqual(token['role'], 'user')
+        self.assertFalse(token['is_superuser'])
+        self.assertEqual(token['token_version'], 0)
+
+    def assert_claims_query(self, queries):
+        self.assertEqual(len(queries), 1, queries)
+        self.assertIn('"token_version"', queries[0])
+        self.assertNotIn('"password"', queries[0])
+
+    def test_claims_are_read_once(self):
+        """Права читаются при промахе кэша, дальше запросов нет"""
+        self.authorize(self.user)
+        response, queries = self.user_queries('/api/v1/titles/')
+        self.assertEqual(response.status_code, 200)
+        self.assert_claims_query(queries)
+        for url in ('/api/v1/titles/', f'/api/v1/titles/{self.title.pk}/',
+                    f'/api/v1/titles/{self.title.pk}/reviews/'):
+            with self.subTest(url=url):
+                response, queries = self.user_queries(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(queries, [])
+
+    def test_admin_permission_from_claims(self):
+        self.authorize(self.admin)
+        response, queries = self.user_queries(
+            '/api/v1/categories/', 'post', {'name': 'Книга', 'slug': 'book'}
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assert_claims_query(queries)
+        self.authorize(self.user)
+        response = self.client.post(
+            '/api/v1/categories/', {'name': 'Музыка', 'slug': 'music'}
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_profile_is_loaded_once_from_user_cache(self):
+        self.authorize(self.user)
+        response, queries = self.user_queries('/api/v1/users/me/')
+        self.assertEqual(response.data['email'], 'reader@yamdb.ru')
+        self.assertEqual(response.data['bio'], 'Читатель')
+        self.assertEqual(len(queries), 2)
+        response, queries = self.user_queries('/api/v1/users/me/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+
+    def test_profile_update_saves_only_changed_fields(self):
+        self.authorize(self.user)
+        response = self.client.patch('/api/v1/users/me/', {'bio': 'Новое'})
+        self.assertEqual(response.status_code, 200)
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual(user.bio, 'Новое')
+        self.assertEqual(user.email, 'reader@yamdb.ru')
+        response = self.client.get('/api/v1/users/me/')
+        self.assertEqual(response.data['bio'], 'Новое')
+
+    def test_write_uses_token_user_as_author(self):
+        self.authorize(self.user)
+        response = self.client.post(
+            f'/api/v1/titles/{self.title.pk}/reviews/',
+            {'text': 'Шедевр', 'score': 10},
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['author'], 'reader')
+        self.assertTrue(
+            Review.objects.filter(author=self.user, title=self.title).exists()
+        )
+
+    def test_role_change_revokes_token(self):
+        admin = User.objects.get(pk=self.admin.pk)
+        token = access_token_for(admin)
+        self.authorize(admin, token)
+        self.assertEqual(self.client.get('/api/v1/titles/').status_code, 200)
+        admin.role = 'user'
+        admin.save()
+        self.authorize(admin, token)
+        response = self.client.post(
+            '/api/v1/categories/', {'name': 'Книга', 'slug': 'book'}
+        )
+        self.assertEqual(response.status_code, 401)
+        self.authorize(admin)
+        response = self.client.post(
+            '/api/v1/categories/', {'name': 'Книга', 'slug': 'book'}
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_role_change_by_update_ignores_claims(self):
+        """Права берутся из БД, а не из claims токена"""
+        token = access_token_for(self.admin)
+        User.objects.filter(pk=self.admin.pk).update(role='user')
+        self.authorize(self.admin, token)
+        response = self.client.post(
+            '/api/v1/categories/', {'name': 'Книга', 'slug': 'book'}
+        )
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(AUTH_CACHE_TIMEOUT=1)
+    def test_update_applies_after_cache_timeout(self):
+        """update() минует save(), права устаревают не дольше
+        AUTH_CACHE_TIMEOUT"""
+        self.authorize(self.user)
+        self.assertEqual(self.client.get('/api/v1/titles/').status_code, 200)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.client.get('/api/v1/titles/').status_code, 200)
+        time.sleep(1.1)
+        self.assertEqual(self.client.get('/api/v1/titles/').status_code, 401)
+
+    def test_password_change_revokes_tokens(self):
+        user = User.objects.get(pk=self.user.pk)
+        token = access_token_for(user)
+        self.authorize(user, token)
+        self.assertEqual(self.client.get('/api/v1/titles/').status_code, 200)
+        user.set_password('new-password')
+        user.save(update_fields=['password'])
+        self.authorize(user, token)
+        self.assertEqual(self.client.get('/api/v1/titles/').status_code, 401)
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual(user.token_version, 1)
+        self.authorize(user)
+        self.assertEqual(self.client.get('/api/v1/titles/').status_code, 200)
+
+    def test_profile_update_keeps_token(self):
+        user = User.objects.get(pk=self.user.pk)
+        token = access_token_for(user)
+        user.bio = 'Другое'
+        user.save()
+        self.authorize(user, token)
+        self.client.patch('/api/v1/users/me/', {'bio': 'Третье'})
+        response, queries = self.user_queries('/api/v1/titles/')
+        self.assertEqual(response.status_code, 200)
+        self.assert_claims_query(queries)
+        self.assertEqual(User.objects.get(pk=self.user.pk).token_version, 0)
+
+    def test_deleted_user_is_rejected(self):
+        user = User.objects.get(pk=self.user.pk)
+        token = access_token_for(user)
+        self.authorize(user, token)
+        self.assertEqual(self.client.get('/api/v1/titles/').status_code, 200)
+        user.delete()
+        response = self.client.get('/api/v1/titles/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_token_without_claims_loads_user(self):
+        self.authorize(self.user, AccessToken.for_user(self.user))
+        response, queries = self.user_queries('/api/v1/users/me/')
+        self.assertEqual(response.data['username'], 'reader')
+        self.assertEqual(len(queries), 1)
@@ -0,0 +1,156 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from reviews.models import Genre, GenreTitle, Title
+
+from .base import (YamdbTestCase, create_admin, create_category, create_title,
+                   create_user)
+
+
+class BulkUpsertTests(YamdbTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = create_admin()
+        cls.category = create_category()
+        cls.genres = [
+            Genre.objects.create(name=f'Жанр {i}', slug=f'genre-{i}')
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.admin)
+
+    def post(self, resource, items):
+        return self.client.post(
+            f'/api/v1/{resource}/bulk/', items, format='json'
+        )
+
+    @staticmethod
+    def title(number, **fields):
+        return dict({
+            'name': f'Произведение {number}', 'year': 2000,
+            'description': 'Описание', 'category': 'movie',
+            'genre': ['genre-0', 'genre-1'],
+        }, **fields)
+
+    def test_only_admin(self):
+        self.client.force_authenticate(create_user('user'))
+        response = self.post('genres', [{'name': 'Драма', 'slug': 'drama'}])
+        self.assertEqual(response.status_code, 403)
+
+    def test_upsert_genres_by_slug(self):
+        response = self.post('genres', [
+            {'name': 'Драма', 'slug': 'drama'},
+            {'name': 'Новое имя', 'slug': 'genre-0'},
+            {'name': 'Жанр 1', 'slug': 'genre-1'},
+        ])
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data, [
+            {'slug': 'drama', 'status': 'created'},
+            {'slug': 'genre-0', 'status': 'updated'},
+            {'slug': 'genre-1', 'status': 'unchanged'},
+        ])
+        self.assertEqual(Genre.objects.get(slug='genre-0').name, 'Новое имя')
+        self.assertTrue(Genre.objects.filter(slug='drama').exists())
+
+    def test_upsert_categories(self):
+        response = self.post('categories', [
+            {'name': 'Книга', 'slug': 'book'},
+            {'name': 'Кино', 'slug': 'movie'},
+        ])
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(
+            [item['status'] for item in response.data],
+            ['created', 'updated'],
+        )
+
+    def test_duplicate_keys_are_rejected(self):
+        response = self.post('genres', [
+            {'name': 'Драма', 'slug': 'drama'},
+            {'name': 'Драма 2', 'slug': 'drama'},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('slug', response.data[1])
+        self.assertFalse(Genre.objects.filter(slug='drama').exists())
+
+    def test_create_titles(self):
+        response = self.post('titles', [self.title(i) for i in range(3)])
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(
+            [item['status'] for item in response.data], ['created'] * 3
+        )
+        title = Title.objects.get(pk=response.data[0]['id'])
+        self.assertEqual(title.name, 'Произведение 0')
+        self.assertEqual(title.search_name, 'произведение 0')
+        self.assertEqual(title.category, self.category)
+        self.assertEqual(
+            set(title.genre.values_list('slug', flat=True)),
+            {'genre-0', 'genre-1'},
+        )
+
+    def test_update_titles_replaces_genres(self):
+        title = create_title(
+            'Старое', self.category, year=1990, genres=self.genres[:2]
+        )
+        response = self.post('titles', [
+            self.title(0, id=title.pk, name='Новое',
+                       genre=['genre-1', 'genre-2']),
+            self.title(1),
+        ])
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data[0],
+                         {'id': title.pk, 'status': 'updated'})
+        self.assertEqual(response.data[1]['status'], 'created')
+        title.refresh_from_db()
+        self.assertEqual(title.name, 'Новое')
+        self.assertEqual(title.search_name, 'новое')
+        self.assertEqual(
+            set(title.genre.values_list('slug', flat=True)),
+            {'genre-1', 'genre-2'},
+        )
+        self.assertEqual(GenreTitle.objects.count(), 4)
+
+    def test_invalid_titles_write_nothing(self):
+        response = self.post('titles', [
+            self.title(0), self.title(1, year=3000, genre=[]),
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[0], {})
+        self.assertEqual(set(response.data[1]), {'year', 'genre'})
+        self.assertFalse(Title.objects.exists())
+
+    def test_unknown_references_write_nothing(self):
+        response = self.post('titles', [
+            self.title(0),
+            self.title(1, genre=['genre-0', 'unknown'], category='none'),
+            self.title(2, id=10 ** 6),
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[0], {})
+        self.assertEqual(set(response.data[1]), {'genre', 'category'})
+        self.assertIn('id', response.data[2])
+        self.assertFalse(Title.objects.exists())
+
+    def test_not_a_list(self):
+        response = self.post('titles', self.title(0))
+        self.assertEqual(response.status_code, 400)
+
+    def test_query_count_does_not_depend_on_size(self):
+        def queries(items):
+            with CaptureQueriesContext(connection) as captured:
+                response = self.post('genres', items)
+            self.assertEqual(response.status_code, 200)
+            return len(captured)
+
+        small = queries([{'name': 'А', 'slug': 'a'}])
+        large = queries([
+            {'name': f'Б {i}', 'slug': f'b-{i}'} for i in range(50)
+        ])
+        self.assertEqual(small, large)
+
+    def test_thousand_titles(self):
+        response = self.post('titles', [self.title(i) for i in range(1000)])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Title.objects.count(), 1000)
+        self.assertEqual(GenreTitle.objects.count(), 2000)
@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from ..cache import GENERATION_KEY, bump_generations, get_generations
+from ..checks import check_shared_cache
+from .base import YamdbTestCase, create_category
+
+LOCMEM = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+}
+
+
+class ResponseCacheTests(YamdbTestCase):
+    """Кэш ответов и поколения ресурсов"""
+
+    url = '/api/v1/categories/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = create_category()
+
+    def queries(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def other_process_cache(self):
+        """Тот же файловый кэш, открытый отдельным экземпляром бэкенда"""
+        default = settings.CACHES['default']
+        return FileBasedCache(default['LOCATION'], {})
+
+    def test_cached_response(self):
+        self.assertGreater(self.queries(self.url), 0)
+        self.assertEqual(self.queries(self.url), 0)
+
+    def test_query_params_normalized(self):
+        self.queries(self.url, {'search': 'Фильм', 'page': 1})
+        self.assertEqual(
+            self.queries(self.url, {'page': 1, 'search': 'Фильм', 'x': 1}), 0
+        )
+        self.assertGreater(self.queries(self.url, {'search': 'Книга'}), 0)
+
+    def test_bump_invalidates(self):
+        self.queries(self.url)
+        bump_generations('categories')
+        self.assertGreater(self.queries(self.url), 0)
+
+    def test_generations_grow(self):
+        before, = get_generations('categories')
+        bump_generations('categories')
+        after, = get_generations('categories')
+        self.assertGreater(after, before)
+        cache.delete(GENERATION_KEY.format('categories'))
+        self.assertNotEqual(get_generations('categories'), (after,))
+
+    def test_bump_from_other_process(self):
+        response = self.client.get(self.url)
+        self.assertEqual(self.queries(self.url), 0)
+        key = GENERATION_KEY.format('categories')
+        other = self.other_process_cache()
+        other.set(key, other.get(key) + 1, None)
+        self.assertGreater(self.queries(self.url), 0)
+        response = self.client.get(
+            self.url, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(CACHES=LOCMEM)
+    def test_process_local_cache_disables_caching(self):
+        response = self.client.get(self.url)
+        self.assertFalse(response.has_header('ETag'))
+        self.assertGreater(self.queries(self.url), 0)
+        self.assertEqual(
+            [warning.id for warning in check_shared_cache(None)],
+            ['api.W001'],
+        )
+
+    def test_shared_cache_check(self):
+        self.assertEqual(check_shared_cache(None), [])
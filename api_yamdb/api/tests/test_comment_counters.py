@@ -0,0 +1,161 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import Count, Max
+from django.test.utils import CaptureQueriesContext
+from reviews.counters import update_review_counters
+from reviews.models import Comment, Review
+from reviews.signals import add_review_comment
+
+from ..cache import get_generations
+from ..signals import bump_pending_reviews
+from .base import (YamdbTestCase, create_category, create_review, create_title,
+                   create_user)
+
+
+class CommentCounterTests(YamdbTestCase):
+    """Число и дата последнего комментария отзыва"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('user')
+        cls.title = create_title('Солярис', create_category(), year=1972)
+        cls.first, cls.second = (
+            create_review(cls.title, create_user(name), score)
+            for name, score in (('first', 7), ('second', 9))
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def comment(self, review, text='Комментарий'):
+        return Comment.objects.create(review=review, author=self.user,
+                                      text=text)
+
+    def assert_consistent(self):
+        for review in Review.objects.annotate(
+            expected_count=Count('comments'),
+            expected_date=Max('comments__pub_date'),
+        ):
+            self.assertEqual(review.comment_count, review.expected_count)
+            self.assertEqual(review.last_comment_at, review.expected_date)
+
+    def test_create_and_delete(self):
+        first = self.comment(self.first)
+        last = self.comment(self.first)
+        review = Review.objects.get(pk=self.first.pk)
+        self.assertEqual(review.comment_count, 2)
+        self.assertEqual(review.last_comment_at, last.pub_date)
+        last.delete()
+        review = Review.objects.get(pk=self.first.pk)
+        self.assertEqual(review.comment_count, 1)
+        self.assertEqual(review.last_comment_at, first.pub_date)
+        first.delete()
+        self.assert_consistent()
+        self.assertIsNone(
+            Review.objects.get(pk=self.first.pk).last_comment_at
+        )
+
+    def test_older_comment_keeps_last_date(self):
+        # Комментарий, зафиксированный позже более нового
+        last = self.comment(self.first)
+        add_review_comment(self.first.pk, last.pub_date - timedelta(days=1))
+        review = Review.objects.get(pk=self.first.pk)
+        self.assertEqual(review.comment_count, 2)
+        self.assertEqual(review.last_comment_at, last.pub_date)
+
+    def test_moved_comment(self):
+        comment = Comment.objects.get(pk=self.comment(self.first).pk)
+        comment.review = self.second
+        comment.save()
+        self.assert_consistent()
+        comment = Comment.objects.only('text').get(pk=comment.pk)
+        comment.text = 'Правка'
+        comment.save()
+        self.assert_consistent()
+
+    def test_deferred_moved_comment(self):
+        """Без загруженного review_id пересчитываются только два отзыва"""
+        comment = self.comment(self.first)
+        comment = Comment.objects.only('text').get(pk=comment.pk)
+        comment.review_id = self.second.pk
+        with CaptureQueriesContext(connection) as queries:
+            comment.save()
+        self.assert_consistent()
+        updates = [query['sql'] for query in queries
+                   if query['sql'].startswith('UPDATE "reviews_review"')]
+        self.assertEqual(len(updates), 2)
+        for sql in updates:
+            self.assertIn('WHERE "reviews_review"."id" =', sql)
+
+    def test_review_save_keeps_counters(self):
+        review = Review.objects.get(pk=self.first.pk)
+        self.comment(self.first)
+        review.text = 'Новый текст'
+        review.save()
+        self.assertEqual(
+            Review.objects.get(pk=self.first.pk).comment_count, 1
+        )
+
+    def test_api(self):
+        url = f'/api/v1/titles/{self.title.pk}/reviews/'
+        comments_url = f'{url}{self.first.pk}/comments/'
+        response = self.client.post(comments_url, {'text': 'Согласен'})
+        self.assertEqual(response.status_code, 201, response.data)
+        item = next(
+            item for item in self.client.get(url).data['results']
+            if item['id'] == self.first.pk
+        )
+        self.assertEqual(item['comment_count'], 1)
+        self.assertEqual(item['last_comment_at'], response.data['pub_date'])
+        self.client.delete(f'{comments_url}{response.data["id"]}/')
+        data = self.client.get(f'{url}{self.first.pk}/').data
+        self.assertEqual(data['comment_count'], 0)
+        self.assertIsNone(data['last_comment_at'])
+        self.client.patch(
+            f'{url}{self.first.pk}/', {'comment_count': 10}
+        )
+        self.assertEqual(
+            Review.objects.get(pk=self.first.pk).comment_count, 0
+        )
+
+    def test_cascade_does_not_load_reviews(self):
+        """Комментарии удаляемого отзыва не читают его по одному"""
+        for _ in range(3):
+            self.comment(self.first)
+        review = Review.objects.get(pk=self.first.pk)
+        with CaptureQueriesContext(connection) as queries:
+            review.delete()
+        lookups = [
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT')
+            and 'FROM "reviews_review" WHERE' in query['sql']
+        ]
+        self.assertEqual(lookups, [])
+
+    def test_pending_reviews_bumped_at_once(self):
+        for review in (self.first, self.second):
+            self.comment(review)
+        before = get_generations(f'reviews:{self.title.pk}')
+        for comment in Comment.objects.all():
+            comment.delete()
+        with CaptureQueriesContext(connection) as queries:
+            bump_pending_reviews()
+        self.assertEqual(len(queries), 1)
+        self.assertGreater(get_generations(f'reviews:{self.title.pk}'),
+                           before)
+        with CaptureQueriesContext(connection) as queries:
+            bump_pending_reviews()
+        self.assertEqual(len(queries), 0)
+
+    def test_rebuild(self):
+        self.comment(self.first)
+        self.comment(self.second)
+        Review.objects.update(comment_count=5, last_comment_at=None)
+        self.assertEqual(update_review_counters([self.first.pk]), 1)
+        self.assertEqual(
+            Review.objects.get(pk=self.second.pk).comment_count, 5
+        )
+        update_review_counters()
+        self.assert_consistent()
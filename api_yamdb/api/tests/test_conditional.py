@@ -0,0 +1,173 @@
+from contextlib import contextmanager
+from threading import local
+
+from django.core.cache import cache, caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITransactionTestCase
+from rest_framework_simplejwt.tokens import AccessToken
+from reviews.models import Comment, Genre
+from users.models import User
+
+from .base import (YamdbTestCase, create_category, create_review, create_title,
+                   create_user)
+
+
+def create_catalogue(cls):
+    cls.author = create_user('author')
+    cls.category = create_category()
+    cls.genre = Genre.objects.create(name='Драма', slug='drama')
+    cls.title = create_title(
+        'Сталкер', cls.category, year=1979, genres=[cls.genre]
+    )
+    cls.review = create_review(cls.title, cls.author, 9)
+    Comment.objects.create(
+        review=cls.review, author=cls.author, text='Комментарий'
+    )
+
+
+class ConditionalGetTests(YamdbTestCase):
+    """Условные GET-запросы отвечают 304 без выборки данных"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_catalogue(cls)
+
+    def setUp(self):
+        super().setUp()
+        self.urls = (
+            '/api/v1/titles/',
+            f'/api/v1/titles/{self.title.pk}/',
+            f'/api/v1/titles/{self.title.pk}/reviews/',
+            f'/api/v1/titles/{self.title.pk}/reviews/{self.review.pk}/',
+            f'/api/v1/titles/{self.title.pk}/reviews/'
+            f'{self.review.pk}/comments/',
+            '/api/v1/genres/',
+            '/api/v1/categories/',
+        )
+
+    def test_not_modified_without_queries(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.has_header('ETag'))
+                self.assertTrue(response.has_header('Last-Modified'))
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag']
+                    )
+                self.assertEqual(response.status_code, 304)
+                self.assertLessEqual(
+                    len(queries), 1,
+                    '\n'.join(query['sql'] for query in queries)
+                )
+
+    def test_not_modified_authenticated_one_query(self):
+        self.client.force_authenticate(self.author)
+        url = f'/api/v1/titles/{self.title.pk}/reviews/'
+        etag = self.client.get(url)['ETag']
+        self.client.force_authenticate(None)
+        token = AccessToken.for_user(self.author)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertLessEqual(len(queries), 1)
+
+
+@contextmanager
+def other_process():
+    """Изменения через отдельные экземпляры бэкендов кэша, как в другом
+    воркере или в команде manage.py"""
+    handlers = caches._caches
+    caches._caches = local()
+    try:
+        yield
+    finally:
+        caches._caches = handlers
+
+
+class ConditionalGetInvalidationTests(APITransactionTestCase):
+    """Изменения сбрасывают ETag после фиксации транзакции"""
+
+    def setUp(self):
+        cache.clear()
+        create_catalogue(self)
+
+    def test_review_change_invalidates_etag(self):
+        url = f'/api/v1/titles/{self.title.pk}/reviews/'
+        etag = self.client.get(url)['ETag']
+        title_etag = self.client.get(f'/api/v1/titles/{self.title.pk}/')[
+            'ETag'
+        ]
+        self.review.text = 'Новый текст'
+        self.review.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['text'], 'Новый текст')
+        response = self.client.get(
+            f'/api/v1/titles/{self.title.pk}/',
+            HTTP_IF_NONE_MATCH=title_etag
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_comment_change_invalidates_etag(self):
+        url = (f'/api/v1/titles/{self.title.pk}/reviews/'
+               f'{self.review.pk}/comments/')
+        etag = self.client.get(url)['ETag']
+        Comment.objects.create(
+            review=self.review, author=self.author, text='Еще один'
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 2)
+
+    def test_other_title_reviews_keep_etag(self):
+        other = create_title('Солярис', None, year=1972)
+        url = f'/api/v1/titles/{other.pk}/reviews/'
+        etag = self.client.get(url)['ETag']
+        self.review.score = 3
+        self.review.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_change_in_other_process_invalidates_etag(self):
+        url = f'/api/v1/titles/{self.title.pk}/reviews/'
+        etag = self.client.get(url)['ETag']
+        with other_process():
+            self.review.text = 'Правка из команды'
+            self.review.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()['results'][0]['text'], 'Правка из команды'
+        )
+
+    def test_username_change_invalidates_etag(self):
+        urls = (
+            f'/api/v1/titles/{self.title.pk}/reviews/',
+            f'/api/v1/titles/{self.title.pk}/reviews/'
+            f'{self.review.pk}/comments/',
+        )
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        author = User.objects.get(pk=self.author.pk)
+        author.username = 'renamed'
+        with other_process():
+            author.save()
+        for url, etag in zip(urls, etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['results'][0]['author'],
+                             'renamed')
+
+    def test_profile_change_keeps_etag(self):
+        url = f'/api/v1/titles/{self.title.pk}/reviews/'
+        etag = self.client.get(url)['ETag']
+        author = User.objects.get(pk=self.author.pk)
+        author.bio = 'Новая биография'
+        author.role = 'moderator'
+        author.save()
+        create_user('newcomer')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
@@ -0,0 +1,95 @@
+from io import StringIO
+
+from django.core.management import call_command
+from reviews.models import Review, Title
+
+from .base import YamdbTestCase, create_category, create_title, create_users
+
+
+class TitleCounterTests(YamdbTestCase):
+    """Число отзывов и сумма оценок произведения"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = create_users(3)
+        category = create_category()
+        cls.first, cls.second = (
+            create_title(name, category) for name in ('Первое', 'Второе')
+        )
+
+    def counters(self, title):
+        title = Title.objects.get(pk=title.pk)
+        return title.reviews_count, title.score_sum
+
+    def test_create(self):
+        self.review(self.first, self.users[0], 7)
+        self.review(self.first, self.users[1], 4)
+        self.assertEqual(self.counters(self.first), (2, 11))
+        self.assertEqual(self.counters(self.second), (0, 0))
+
+    def test_score_update(self):
+        review = self.review(self.first, self.users[0], 7)
+        review.score = 2
+        review.save()
+        review = Review.objects.get(pk=review.pk)
+        review.text = 'Без смены оценки'
+        review.save()
+        self.assertEqual(self.counters(self.first), (1, 2))
+
+    def test_delete(self):
+        self.review(self.first, self.users[0], 7)
+        self.review(self.first, self.users[1], 5).delete()
+        self.assertEqual(self.counters(self.first), (1, 7))
+        Review.objects.get(author=self.users[0]).delete()
+        self.assertEqual(self.counters(self.first), (0, 0))
+
+    def test_move_to_other_title(self):
+        review = self.review(self.first, self.users[0], 9)
+        self.review(self.second, self.users[1], 3)
+        review = Review.objects.get(pk=review.pk)
+        review.title = self.second
+        review.score = 8
+        review.save()
+        self.assertEqual(self.counters(self.first), (0, 0))
+        self.assertEqual(self.counters(self.second), (2, 11))
+        self.assert_title_counters()
+
+    def test_deferred_review_save(self):
+        """Без исходных значений счетчики пересчитываются по отзывам"""
+        self.review(self.first, self.users[0], 9)
+        review = Review.objects.only('text').get()
+        review.text = 'Правка'
+        review.save()
+        self.assert_title_counters()
+
+    def test_deferred_review_move(self):
+        """Исходное произведение отзыва без title_id берется из БД"""
+        self.review(self.first, self.users[0], 9)
+        review = Review.objects.only('text').get()
+        review.title_id = self.second.pk
+        review.save()
+        self.assertEqual(self.counters(self.first), (0, 0))
+        self.assertEqual(self.counters(self.second), (1, 9))
+
+    def test_stale_title_save_keeps_counters(self):
+        title = Title.objects.get(pk=self.first.pk)
+        self.review(self.first, self.users[0], 6)
+        title.name = 'Новое название'
+        title.save()
+        self.assertEqual(self.counters(self.first), (1, 6))
+
+    def test_rating_in_api(self):
+        for user, score in zip(self.users, (10, 7, 6)):
+            self.review(self.first, user, score)
+        data = self.client.get(f'/api/v1/titles/{self.first.pk}/').data
+        self.assertEqual(data['rating'], 7)
+        data = self.client.get(f'/api/v1/titles/{self.second.pk}/').data
+        self.assertIsNone(data['rating'])
+
+    def test_update_ratings_command(self):
+        self.review(self.first, self.users[0], 8)
+        Title.objects.update(reviews_count=5, score_sum=40)
+        out = StringIO()
+        call_command('update_ratings', stdout=out)
+        self.assertIn('Обновлено произведений: 2', out.getvalue())
+        self.assert_title_counters()
@@ -0,0 +1,117 @@
+import re
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from reviews.models import Comment, Genre, Review
+
+from .base import YamdbTestCase, create_category, create_title, create_users
+
+# Таблицы, полный просмотр которых недопустим ни в одном запросе
+LARGE_TABLES = {
+    'reviews_review', 'reviews_comment', 'reviews_genretitle', 'users_user',
+}
+
+SQLITE_SCAN_RE = re.compile(r'\bSCAN (?:TABLE )?(\w+)')
+POSTGRESQL_SCAN_RE = re.compile(r'Seq Scan on (\w+)')
+
+
+def full_scans(sql):
+    """Таблицы, которые план запроса просматривает целиком"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # Без seq scan планировщик выберет индекс, если он есть,
+            # поэтому Seq Scan в плане означает отсутствие индекса
+            cursor.execute('SET enable_seqscan = off')
+            cursor.execute(f'EXPLAIN {sql}')
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+            cursor.execute('RESET enable_seqscan')
+            return set(POSTGRESQL_SCAN_RE.findall(plan)), plan
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        plan = '\n'.join(row[-1] for row in cursor.fetchall())
+        return set(SQLITE_SCAN_RE.findall(plan)), plan
+
+
+class ExplainIndexTests(YamdbTestCase):
+    """Основные запросы эндпоинтов не просматривают большие таблицы"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = create_category()
+        genres = [
+            Genre.objects.create(name=f'Жанр {i}', slug=f'genre-{i}')
+            for i in range(5)
+        ]
+        users = create_users(20)
+        titles = [
+            create_title(
+                f'Произведение {i}', cls.category if i % 2 else None,
+                year=1950 + i, genres=genres[i % 5:i % 5 + 2],
+            )
+            for i in range(30)
+        ]
+        Review.objects.bulk_create(
+            Review(title=title, author=user, text=f'Отзыв {user.pk}',
+                   score=user.pk % 10 + 1)
+            for title in titles for user in users[:10]
+        )
+        reviews = Review.objects.all()
+        Comment.objects.bulk_create(
+            Comment(review=review, author=user, text='Комментарий')
+            for review in reviews[:50] for user in users[:5]
+        )
+        cls.title = titles[0]
+        # ANALYZE не выполняем: без статистики SQLite оценивает таблицы
+        # как большие и выбирает план, как на продовых объемах
+        cls.review = cls.title.reviews.first()
+
+    def assert_no_full_scans(self, url, tables=LARGE_TABLES):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        for query in queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            scanned, plan = full_scans(sql)
+            self.assertFalse(
+                scanned & set(tables),
+                f'{url}: полный просмотр таблицы\n{sql}\n{plan}'
+            )
+
+    def test_titles(self):
+        self.assert_no_full_scans('/api/v1/titles/')
+        self.assert_no_full_scans(f'/api/v1/titles/{self.title.pk}/')
+
+    def test_filtered_titles(self):
+        tables = LARGE_TABLES | {'reviews_title'}
+        for query in ('year=1960', 'category=movie', 'genre=genre-1',
+                      'name=ведение 1', 'year=1960&category=movie'):
+            with self.subTest(query=query):
+                self.assert_no_full_scans(f'/api/v1/titles/?{query}', tables)
+
+    def test_autocomplete(self):
+        self.assert_no_full_scans(
+            '/api/v1/titles/autocomplete/?q=произв',
+            LARGE_TABLES | {'reviews_title'}
+        )
+
+    def test_reviews(self):
+        base = f'/api/v1/titles/{self.title.pk}/reviews/'
+        self.assert_no_full_scans(base)
+        self.assert_no_full_scans(f'{base}?page=2')
+        self.assert_no_full_scans(f'{base}?pagination=cursor')
+        self.assert_no_full_scans(f'{base}{self.review.pk}/')
+
+    def test_comments(self):
+        base = (f'/api/v1/titles/{self.title.pk}/reviews/'
+                f'{self.review.pk}/comments/')
+        self.assert_no_full_scans(base)
+        self.assert_no_full_scans(f'{base}?pagination=cursor')
+        comment = self.review.comments.first()
+        self.assert_no_full_scans(f'{base}{comment.pk}/')
+
+    def test_text_search(self):
+        self.assert_no_full_scans('/api/v1/search/reviews/?q=отзыв')
+        self.assert_no_full_scans(
+            f'/api/v1/search/comments/?q=комментарий&title={self.title.pk}'
+        )
@@ -0,0 +1,96 @@
+import csv
+import io
+import json
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from reviews.models import Genre
+
+from .base import (YamdbTestCase, create_admin, create_category, create_review,
+                   create_title, create_user)
+
+URL = '/api/v1/titles/export/'
+
+
+class ExportTests(YamdbTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = create_admin()
+        category = create_category()
+        genres = [
+            Genre.objects.create(name=f'Жанр {i}', slug=f'genre-{i}')
+            for i in range(2)
+        ]
+        cls.titles = []
+        for number in range(7):
+            cls.titles.append(create_title(
+                f'Произведение "{number}"', category if number % 2 else None,
+                year=2000 + number, genres=genres[:number % 3],
+                description='Строка\nвторая',
+            ))
+        create_review(cls.titles[0], cls.admin, 8)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.admin)
+
+    def export(self, **params):
+        response = self.client.get(URL, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_only_admin(self):
+        self.client.force_authenticate(create_user('user'))
+        self.assertEqual(self.client.get(URL).status_code, 403)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(URL).status_code, 401)
+
+    def test_ndjson_matches_api(self):
+        response, content = self.export()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(len(rows), len(self.titles))
+        for row in rows:
+            detail = self.client.get(f'/api/v1/titles/{row["id"]}/').data
+            self.assertEqual(row['name'], detail['name'])
+            self.assertEqual(row['rating'], detail['rating'])
+            self.assertEqual(
+                row['genre'], [genre['slug'] for genre in detail['genre']]
+            )
+            self.assertEqual(
+                row['category'],
+                detail['category'] and detail['category']['slug'],
+            )
+
+    def test_csv(self):
+        response, content = self.export(type='csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('titles.csv', response['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(len(rows), len(self.titles))
+        self.assertEqual(rows[0]['name'], 'Произведение "0"')
+        self.assertEqual(rows[0]['description'], 'Строка\nвторая')
+        self.assertEqual(rows[0]['rating'], '8')
+        self.assertEqual(rows[2]['genre'], 'genre-0,genre-1')
+        self.assertEqual(rows[2]['category'], '')
+
+    def test_filters(self):
+        _, content = self.export(category='movie')
+        self.assertEqual(len(content.splitlines()), 3)
+
+    def test_unknown_type(self):
+        self.assertEqual(self.client.get(URL, {'type': 'xml'}).status_code,
+                         400)
+
+    @override_settings(EXPORT_CHUNK_SIZE=3)
+    def test_one_genre_query_per_chunk(self):
+        with CaptureQueriesContext(connection) as captured:
+            self.export()
+        genre_queries = [
+            query for query in captured
+            if 'reviews_genretitle' in query['sql']
+        ]
+        # 7 произведений пачками по 3
+        self.assertEqual(len(genre_queries), 3)
@@ -0,0 +1,147 @@
+from unittest import mock
+
+from django.db import IntegrityError
+from django.db.models import Sum
+from reviews.genre_masks import assign_genre_masks
+from reviews.models import Genre, GenreTitle, Title
+
+from .base import YamdbTestCase, create_admin, create_category, create_title
+
+
+class GenreMaskTests(YamdbTestCase):
+    """Маски жанров произведений и фильтр по нескольким жанрам"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie = create_category()
+        cls.book = create_category('Книга', 'book')
+        cls.genres = {
+            slug: Genre.objects.create(name=slug, slug=slug)
+            for slug in ('scifi', 'comedy', 'drama', 'thriller')
+        }
+        cls.titles = {}
+        for name, year, category, genres in (
+            ('Солярис', 1972, cls.movie, ('scifi', 'drama')),
+            ('Кин-дза-дза', 1986, cls.movie, ('scifi', 'comedy')),
+            ('Пикник', 1972, cls.book, ('scifi', 'comedy', 'drama')),
+            ('Шерлок', 1980, cls.movie, ('thriller',)),
+        ):
+            cls.titles[name] = create_title(
+                name, category, year=year,
+                genres=[cls.genres[slug] for slug in genres],
+            )
+
+    def assert_masks(self):
+        for title in Title.objects.all():
+            expected = GenreTitle.objects.filter(title=title).aggregate(
+                mask=Sum('genre__mask')
+            )['mask'] or 0
+            self.assertEqual(title.genre_mask, expected, title.name)
+
+    def names(self, **params):
+        response = self.client.get('/api/v1/titles/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return sorted(item['name'] for item in response.data['results'])
+
+    def test_genres_get_distinct_bits(self):
+        masks = list(Genre.objects.values_list('mask', flat=True))
+        self.assertEqual(sorted(masks), [1, 2, 4, 8])
+        self.assert_masks()
+
+    def test_masks_follow_genre_changes(self):
+        title = self.titles['Солярис']
+        title.genre.remove(self.genres['drama'])
+        title.genre.add(self.genres['thriller'])
+        self.genres['comedy'].titles.add(title)
+        self.assert_masks()
+        link = GenreTitle.objects.get(title=title, genre__slug='scifi')
+        link.title = self.titles['Шерлок']
+        link.save()
+        self.assert_masks()
+        title.genre.clear()
+        self.assert_masks()
+
+    def test_deleted_genre_bit_is_reused(self):
+        comedy = Genre.objects.get(slug='comedy')
+        comedy.delete()
+        self.assert_masks()
+        self.assertEqual(
+            Genre.objects.create(name='Аниме', slug='anime').mask, comedy.mask
+        )
+        self.assertEqual(self.names(genre='anime'), [])
+
+    def test_taken_bit_is_retried(self):
+        """Бит, занятый параллельным запросом, выдается заново"""
+        taken = self.genres['scifi'].mask
+        with mock.patch(
+            'reviews.genre_masks.free_masks',
+            side_effect=[iter([taken]), iter([taken]), iter([64])],
+        ):
+            genre = Genre.objects.create(name='Аниме', slug='anime')
+        self.assertEqual(genre.mask, 64)
+        self.assertEqual(Genre.objects.get(slug='anime').mask, 64)
+
+    def test_duplicate_slug_is_not_retried(self):
+        with mock.patch('reviews.genre_masks.free_masks',
+                        side_effect=[iter([64])]):
+            with self.assertRaises(IntegrityError):
+                Genre.objects.create(name='Повтор', slug='scifi')
+
+    def test_any_genre(self):
+        self.assertEqual(
+            self.names(genre='comedy,thriller'),
+            ['Кин-дза-дза', 'Пикник', 'Шерлок'],
+        )
+        self.assertEqual(self.names(genre='drama'), ['Пикник', 'Солярис'])
+        self.assertEqual(self.names(genre='drama,unknown'),
+                         ['Пикник', 'Солярис'])
+
+    def test_all_genres(self):
+        self.assertEqual(
+            self.names(genre='scifi,comedy', genre_match='all'),
+            ['Кин-дза-дза', 'Пикник'],
+        )
+        self.assertEqual(
+            self.names(genre='scifi,comedy,drama', genre_match='all'),
+            ['Пикник'],
+        )
+        self.assertEqual(
+            self.names(genre='scifi,unknown', genre_match='all'), []
+        )
+
+    def test_combined_with_other_filters(self):
+        self.assertEqual(
+            self.names(genre='scifi,drama', genre_match='all',
+                       category='movie', year=1972),
+            ['Солярис'],
+        )
+        response = self.client.get(
+            '/api/v1/titles/', {'genre': 'scifi', 'genre_match': 'some'}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_genres_without_bit(self):
+        Genre.objects.filter(slug__in=('comedy', 'drama')).update(mask=None)
+        self.assertEqual(
+            self.names(genre='scifi,comedy,drama', genre_match='all'),
+            ['Пикник'],
+        )
+        self.assertEqual(assign_genre_masks(), 2)
+        self.assert_masks()
+
+    def test_bulk_upsert(self):
+        self.client.force_authenticate(create_admin())
+        response = self.client.post('/api/v1/genres/bulk/', [
+            {'name': 'Аниме', 'slug': 'anime'},
+        ], format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(Genre.objects.get(slug='anime').mask, 16)
+        response = self.client.post('/api/v1/titles/bulk/', [
+            {'name': 'Акира', 'year': 1988, 'description': 'Описание',
+             'category': 'movie', 'genre': ['anime', 'scifi']},
+        ], format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assert_masks()
+        self.assertEqual(
+            self.names(genre='anime,scifi', genre_match='all'), ['Акира']
+        )
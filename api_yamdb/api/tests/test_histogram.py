@@ -0,0 +1,109 @@
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase
+from reviews.histogram import (median_score, score_percentile,
+                               score_percentiles)
+from reviews.models import SCORES, Review, Title
+
+from .base import YamdbTestCase, create_category, create_title, create_users
+
+
+def histogram(*scores):
+    result = dict.fromkeys(SCORES, 0)
+    for score in scores:
+        result[score] += 1
+    return result
+
+
+class MedianTests(SimpleTestCase):
+    def test_median(self):
+        self.assertIsNone(median_score(histogram()))
+        self.assertEqual(median_score(histogram(7)), 7)
+        self.assertEqual(median_score(histogram(2, 9, 10)), 9)
+        self.assertEqual(median_score(histogram(1, 4, 5, 10)), 4.5)
+
+    def test_percentile(self):
+        scores = histogram(*range(1, 11))
+        self.assertEqual(score_percentile(scores, 0.9), 9)
+        self.assertEqual(score_percentile(scores, 0), 1)
+        self.assertEqual(score_percentile(scores, 1), 10)
+        self.assertIsNone(score_percentile(histogram(), 0.5))
+        self.assertEqual(score_percentiles(histogram()),
+                         {'25': None, '75': None, '90': None})
+
+
+class ScoreHistogramTests(YamdbTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = create_users(4)
+        category = create_category()
+        cls.first, cls.second = (
+            create_title(name, category) for name in ('Первое', 'Второе')
+        )
+
+    def test_incremental_updates(self):
+        reviews = [
+            self.review(self.first, self.users[0], 8),
+            self.review(self.first, self.users[1], 8),
+            self.review(self.first, self.users[2], 3),
+        ]
+        self.assertEqual(
+            Title.objects.get(pk=self.first.pk).score_histogram,
+            histogram(8, 8, 3),
+        )
+        review = Review.objects.get(pk=reviews[1].pk)
+        review.score = 10
+        review.save()
+        self.assert_title_counters()
+        review.title = self.second
+        review.save()
+        Review.objects.get(pk=reviews[0].pk).delete()
+        self.assert_title_counters()
+        self.assertEqual(
+            Title.objects.get(pk=self.second.pk).score_histogram,
+            histogram(10),
+        )
+
+    def test_detail(self):
+        for user, score in zip(self.users, (2, 9, 7, 10)):
+            self.review(self.first, user, score)
+        data = self.client.get(f'/api/v1/titles/{self.first.pk}/').data
+        self.assertEqual(data['score_histogram'], {
+            str(score): count
+            for score, count in histogram(2, 9, 7, 10).items()
+        })
+        self.assertEqual(data['median_score'], 8)
+        self.assertEqual(data['score_percentiles'],
+                         {'25': 2, '75': 9, '90': 10})
+        data = self.client.get(f'/api/v1/titles/{self.second.pk}/').data
+        self.assertEqual(data['score_histogram'], {
+            str(score): 0 for score in SCORES
+        })
+        self.assertIsNone(data['median_score'])
+        self.assertIsNone(data['score_percentiles']['90'])
+
+    def test_list_opt_in(self):
+        self.review(self.first, self.users[0], 6)
+        item = self.client.get('/api/v1/titles/').data['results'][0]
+        self.assertNotIn('score_histogram', item)
+        item = self.client.get(
+            '/api/v1/titles/', {'include': 'score_histogram'}
+        ).data['results'][0]
+        self.assertEqual(item['score_histogram']['6'], 1)
+        self.assertEqual(item['median_score'], 6)
+        self.assertEqual(item['score_percentiles']['25'], 6)
+
+    def test_check_and_rebuild_commands(self):
+        self.review(self.first, self.users[0], 5)
+        Title.objects.filter(pk=self.first.pk).update(scores_5=0, scores_1=2)
+        with self.assertRaisesMessage(CommandError, 'Расхождений: 1'):
+            call_command('check_counters', stdout=StringIO())
+        call_command('check_counters', '--fix', stdout=StringIO())
+        self.assert_title_counters()
+
+        Title.objects.update(scores_10=3)
+        call_command('update_ratings', stdout=StringIO())
+        out = StringIO()
+        call_command('check_counters', stdout=out)
+        self.assertIn('Расхождений нет', out.getvalue())
@@ -0,0 +1,79 @@
+import os
+import re
+
+from django.test import override_settings
+
+from ..metrics import registry
+from .base import (YamdbTestCase, create_admin, create_category, create_title,
+                   create_user)
+
+SERVER_TIMING_RE = re.compile(
+    r'db;dur=[\d.]+;desc="(\d+) queries", view;dur=[\d.]+, '
+    r'render;dur=[\d.]+, total;dur=[\d.]+'
+)
+
+
+class MetricsTests(YamdbTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = create_admin()
+        cls.title = create_title('Сталкер', create_category(), year=1979)
+
+    def setUp(self):
+        super().setUp()
+        registry.clear()
+
+    def test_server_timing_header(self):
+        response = self.client.get('/api/v1/titles/')
+        match = SERVER_TIMING_RE.fullmatch(response['Server-Timing'])
+        self.assertIsNotNone(match, response['Server-Timing'])
+        self.assertGreater(int(match.group(1)), 0)
+
+    @override_settings(SERVER_TIMING_HEADER=False)
+    def test_header_can_be_disabled(self):
+        response = self.client.get('/api/v1/titles/')
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    def test_metrics_by_route(self):
+        for _ in range(3):
+            self.client.get('/api/v1/titles/')
+        self.client.get(f'/api/v1/titles/{self.title.pk}/')
+        self.client.get('/api/v1/titles/0/')
+        self.client.force_authenticate(self.admin)
+        response = self.client.get('/api/v1/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        text = response.content.decode()
+        worker = f'worker="{os.getpid()}"'
+        self.assertIn(
+            f'yamdb_responses_total{{{worker},route="title-list",'
+            f'method="GET",status="200"}} 3', text
+        )
+        self.assertIn(
+            f'yamdb_responses_total{{{worker},route="title-detail",'
+            f'method="GET",status="404"}} 1', text
+        )
+        self.assertIn(
+            f'yamdb_request_duration_seconds_count{{{worker},'
+            f'route="title-list",method="GET"}} 3', text
+        )
+        self.assertIn(
+            f'yamdb_db_queries_bucket{{{worker},route="title-list",'
+            f'method="GET",le="+Inf"}} 3', text
+        )
+
+    def test_unknown_methods_share_label(self):
+        for method in ('PROPFIND', 'BREW'):
+            self.client.generic(method, '/api/v1/titles/')
+        self.client.force_authenticate(self.admin)
+        text = self.client.get('/api/v1/metrics/').content.decode()
+        self.assertIn(
+            f'yamdb_responses_total{{worker="{os.getpid()}",'
+            f'route="title-list",method="other",status="401"}} 2', text
+        )
+        self.assertNotIn('PROPFIND', text)
+
+    def test_metrics_only_for_admin(self):
+        self.assertEqual(self.client.get('/api/v1/metrics/').status_code, 401)
+        self.client.force_authenticate(create_user('user'))
+        self.assertEqual(self.client.get('/api/v1/metrics/').status_code, 403)
@@ -0,0 +1,111 @@
+from django.db import connection
+from reviews.models import Genre, Title
+
+from ..utils import TitleFilter
+from .base import (YamdbTestCase, create_category, create_title, create_user,
+                   create_users)
+
+
+class TitleOrderingTests(YamdbTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie = create_category()
+        cls.book = create_category('Книга', 'book')
+        cls.drama = Genre.objects.create(name='Драма', slug='drama')
+        cls.titles = {}
+        for name, year, category in (
+            ('Бета', 1990, cls.movie),
+            ('Альфа', 2010, cls.book),
+            ('Гамма', 2000, cls.movie),
+            ('Дельта', 2000, cls.movie),
+        ):
+            cls.titles[name] = create_title(name, category, year=year)
+        cls.titles['Гамма'].genre.set([cls.drama])
+        cls.titles['Бета'].genre.set([cls.drama])
+        user = create_user('user')
+        for name, score in (('Бета', 9), ('Дельта', 3)):
+            cls.review(cls.titles[name], user, score)
+
+    def names(self, **params):
+        response = self.client.get('/api/v1/titles/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [item['name'] for item in response.data['results']]
+
+    def test_orderings(self):
+        self.assertEqual(
+            self.names(ordering='name'), ['Альфа', 'Бета', 'Гамма', 'Дельта']
+        )
+        self.assertEqual(
+            self.names(ordering='-year'), ['Альфа', 'Дельта', 'Гамма', 'Бета']
+        )
+        self.assertEqual(
+            self.names(ordering='year'), ['Бета', 'Гамма', 'Дельта', 'Альфа']
+        )
+        self.assertEqual(
+            self.names(ordering='-rating'),
+            ['Бета', 'Дельта', 'Гамма', 'Альфа'],
+        )
+        # Без отзывов rating 0, как и weighted_rating
+        self.assertEqual(
+            self.names(ordering='rating'),
+            ['Альфа', 'Гамма', 'Дельта', 'Бета'],
+        )
+        self.assertEqual(
+            self.names(ordering='-weighted_rating'),
+            ['Бета', 'Дельта', 'Гамма', 'Альфа'],
+        )
+
+    def test_rating_is_displayed_mean(self):
+        """rating - средняя оценка, weighted_rating учитывает число отзывов"""
+        for user in create_users(5, 'critic'):
+            self.review(self.titles['Альфа'], user, 8)
+        self.assertEqual(self.names(ordering='-rating')[:2], ['Бета', 'Альфа'])
+        self.assertEqual(
+            self.names(ordering='-weighted_rating')[:2], ['Альфа', 'Бета']
+        )
+
+    def test_newest_first(self):
+        title = Title.objects.get(pk=self.titles['Бета'].pk)
+        title.description = 'Обновлено'
+        title.save()
+        self.assertEqual(self.names(ordering='-pub_date')[0], 'Бета')
+
+    def test_several_fields(self):
+        self.assertEqual(
+            self.names(ordering='year,-rating'),
+            ['Бета', 'Дельта', 'Гамма', 'Альфа'],
+        )
+
+    def test_combines_with_filters(self):
+        self.assertEqual(
+            self.names(ordering='-name', category='movie'),
+            ['Дельта', 'Гамма', 'Бета'],
+        )
+        self.assertEqual(
+            self.names(ordering='-weighted_rating', genre='drama'),
+            ['Бета', 'Гамма'],
+        )
+
+    def test_unknown_field(self):
+        response = self.client.get(
+            '/api/v1/titles/', {'ordering': 'description'}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_cached_per_ordering(self):
+        self.assertEqual(self.names(ordering='name')[0], 'Альфа')
+        self.assertEqual(self.names(ordering='-name')[0], 'Дельта')
+
+    def test_ordering_uses_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('план проверяется на SQLite')
+        for ordering in ('name', '-year', '-pub_date', '-weighted_rating',
+                         'rating', '-rating'):
+            plan = TitleFilter(
+                {'ordering': ordering}, Title.objects.all()
+            ).qs[:5].explain()
+            self.assertNotIn('TEMP B-TREE', plan, ordering)
+        plan = TitleFilter(
+            {'ordering': '-rating', 'category': 'movie'}, Title.objects.all()
+        ).qs[:5].explain()
+        self.assertNotIn('TEMP B-TREE', plan)
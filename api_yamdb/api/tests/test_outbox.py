@@ -0,0 +1,119 @@
+from datetime import timedelta
+from io import StringIO
+from smtplib import SMTPException
+
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from users.models import OutgoingEmail
+from users.outbox import deliver_outbox, enqueue_email
+
+
+class CountingBackend(EmailBackend):
+    """Считает открытия соединения"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.opened = 0
+
+    def open(self):
+        self.opened += 1
+
+
+class FailingBackend(EmailBackend):
+    def send_messages(self, messages):
+        raise SMTPException('Сервер недоступен')
+
+
+class SignupOutboxTests(APITestCase):
+    def test_signup_queues_email_without_sending(self):
+        response = self.client.post(
+            '/api/v1/auth/signup/',
+            {'username': 'reader', 'email': 'reader@yamdb.ru'},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mail.outbox, [])
+        email = OutgoingEmail.objects.get()
+        self.assertEqual(email.recipient, 'reader@yamdb.ru')
+        self.assertEqual(email.status, OutgoingEmail.PENDING)
+
+        self.assertEqual(deliver_outbox(), (1, 0))
+        self.assertEqual(mail.outbox[0].to, ['reader@yamdb.ru'])
+        code = mail.outbox[0].body.split()[-1]
+        response = self.client.post(
+            '/api/v1/auth/token/',
+            {'username': 'reader', 'confirmation_code': code},
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_invalid_signup_queues_nothing(self):
+        response = self.client.post(
+            '/api/v1/auth/signup/', {'username': 'me', 'email': 'me@ya.ru'}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(OutgoingEmail.objects.exists())
+
+
+@override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=3, EMAIL_OUTBOX_RETRY_DELAY=60)
+class DeliverOutboxTests(TestCase):
+    def queue(self, count):
+        for i in range(count):
+            enqueue_email('Тема', f'Письмо {i}', f'user{i}@yamdb.ru')
+
+    def test_batch_is_sent_over_one_connection(self):
+        self.queue(3)
+        backend = CountingBackend()
+        self.assertEqual(deliver_outbox(connection=backend), (3, 0))
+        self.assertEqual(backend.opened, 1)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(
+            OutgoingEmail.objects.exclude(status=OutgoingEmail.SENT).exists()
+        )
+        self.assertEqual(deliver_outbox(), (0, 0))
+
+    def test_batch_size(self):
+        self.queue(5)
+        self.assertEqual(deliver_outbox(batch_size=2), (2, 0))
+        self.assertEqual(
+            OutgoingEmail.objects.filter(
+                status=OutgoingEmail.PENDING
+            ).count(),
+            3,
+        )
+
+    def test_failed_email_is_retried_with_backoff(self):
+        self.queue(1)
+        started = timezone.now()
+        self.assertEqual(deliver_outbox(connection=FailingBackend()), (0, 1))
+        email = OutgoingEmail.objects.get()
+        self.assertEqual(email.status, OutgoingEmail.PENDING)
+        self.assertEqual(email.attempts, 1)
+        self.assertIn('Сервер недоступен', email.last_error)
+        self.assertGreaterEqual(
+            email.next_attempt_at, started + timedelta(seconds=60)
+        )
+        # Пока пауза не прошла, письмо не отправляется
+        self.assertEqual(deliver_outbox(), (0, 0))
+
+        OutgoingEmail.objects.update(next_attempt_at=timezone.now())
+        deliver_outbox(connection=FailingBackend())
+        email.refresh_from_db()
+        self.assertGreaterEqual(
+            email.next_attempt_at, started + timedelta(seconds=120)
+        )
+
+        OutgoingEmail.objects.update(next_attempt_at=timezone.now())
+        deliver_outbox(connection=FailingBackend())
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutgoingEmail.FAILED)
+        self.assertEqual(email.attempts, 3)
+
+    def test_command_drains_outbox(self):
+        self.queue(5)
+        out = StringIO()
+        call_command('send_outbox', batch_size=2, stdout=out)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertIn('Отправлено писем: 5', out.getvalue())
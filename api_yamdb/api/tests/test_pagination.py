@@ -0,0 +1,130 @@
+from base64 import urlsafe_b64encode
+from datetime import timedelta
+from urllib.parse import parse_qs, urlsplit
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from reviews.models import Comment, Review
+
+from .base import (YamdbTestCase, create_category, create_review,
+                   create_title, create_users)
+
+
+def cursor(raw):
+    return urlsafe_b64encode(raw.encode()).decode()
+
+
+class KeysetPaginationTests(YamdbTestCase):
+    """Курсорный режим отзывов и комментариев и постраничный режим"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.title = create_title('Солярис', create_category(), year=1972)
+        authors = create_users(12)
+        for number, author in enumerate(authors):
+            create_review(cls.title, author, 5, text=f'Отзыв {number}')
+        # Половина отзывов с одинаковой датой: порядок решает id
+        now = timezone.now()
+        reviews = list(Review.objects.order_by('pk'))
+        for number, review in enumerate(reviews):
+            Review.objects.filter(pk=review.pk).update(
+                pub_date=now if number % 2 else now - timedelta(
+                    minutes=number
+                )
+            )
+        cls.review = reviews[0]
+        for number in range(7):
+            Comment.objects.create(
+                review=cls.review, author=authors[number],
+                text=f'Комментарий {number}',
+            )
+        cls.url = f'/api/v1/titles/{cls.title.pk}/reviews/'
+
+    def get(self, url, params=None, status=200):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status, response.data)
+        return response.data
+
+    def ids(self, page):
+        return [item['id'] for item in page['results']]
+
+    def expected(self):
+        return list(
+            self.title.reviews.order_by('pub_date', 'id')
+            .values_list('id', flat=True)
+        )
+
+    def test_forward_with_ties(self):
+        page = self.get(self.url, {'pagination': 'cursor'})
+        self.assertIsNone(page['previous'])
+        self.assertNotIn('count', page)
+        ids = self.ids(page)
+        while page['next']:
+            page = self.get(page['next'])
+            ids += self.ids(page)
+        self.assertEqual(ids, self.expected())
+        self.assertEqual(len(page['results']), 2)
+
+    def test_backward(self):
+        pages = [self.get(self.url, {'pagination': 'cursor'})]
+        while pages[-1]['next']:
+            pages.append(self.get(pages[-1]['next']))
+        page = pages[-1]
+        for expected in reversed(pages[:-1]):
+            page = self.get(page['previous'])
+            self.assertEqual(self.ids(page), self.ids(expected))
+        self.assertIsNone(page['previous'])
+        self.assertEqual(self.ids(self.get(page['next'])),
+                         self.ids(pages[1]))
+
+    def test_cursor_param_enables_mode(self):
+        first = self.get(self.url, {'pagination': 'cursor'})
+        cursor_value = parse_qs(urlsplit(first['next']).query)['cursor']
+        page = self.get(self.url, {'cursor': cursor_value[0]})
+        self.assertEqual(self.ids(page), self.expected()[5:10])
+
+    def test_invalid_cursor(self):
+        for value in (
+            'garbage',
+            '!!!',
+            cursor('2020-01-01T00:00:00|1'),
+            cursor('not-a-date|1|0'),
+            cursor('2020-13-01T00:00:00|1|0'),
+            cursor('2020-01-01T00:00:00|abc|0'),
+            cursor(f'2020-01-01T00:00:00|{10 ** 30}|0'),
+            cursor(f'2020-01-01T00:00:00|-{10 ** 30}|1'),
+        ):
+            with self.subTest(cursor=value):
+                self.get(self.url, {'cursor': value}, status=404)
+
+    def test_page_number_mode(self):
+        first = self.get(self.url)
+        self.assertEqual(first['count'], 12)
+        self.assertIsNone(first['previous'])
+        self.assertIn('page=2', first['next'])
+        last = self.get(self.url, {'page': 3})
+        self.assertIsNone(last['next'])
+        self.assertEqual(len(last['results']), 2)
+        self.get(self.url, {'page': 4}, status=404)
+
+    def test_count_without_joins(self):
+        """COUNT(*) страниц не тянет JOIN полей автора из .values()"""
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get(self.url)['count'], 12)
+        counts = [query['sql'] for query in queries
+                  if 'COUNT(*)' in query['sql']]
+        self.assertEqual(len(counts), 1, counts)
+        self.assertNotIn('JOIN', counts[0])
+
+    def test_comments(self):
+        url = f'{self.url}{self.review.pk}/comments/'
+        page = self.get(url, {'pagination': 'cursor'})
+        ids = self.ids(page)
+        page = self.get(page['next'])
+        self.assertIsNone(page['next'])
+        self.assertEqual(
+            ids + self.ids(page),
+            list(self.review.comments.order_by('pub_date', 'id')
+                 .values_list('id', flat=True)),
+        )
@@ -0,0 +1,92 @@
+import pstats
+import shutil
+import tempfile
+
+from django.test import override_settings
+
+from ..authentication import access_token_for
+from ..profiling import list_profile_ids, profile_path
+from .base import (YamdbTestCase, create_admin, create_category, create_title,
+                   create_user)
+
+
+class ProfilingTests(YamdbTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = create_admin()
+        cls.user = create_user('user')
+        create_title('Сталкер', create_category(), year=1979)
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings = override_settings(PROFILE_DIR=directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def get(self, url, user=None, profile=False):
+        headers = {}
+        if user is not None:
+            headers['HTTP_AUTHORIZATION'] = f'Bearer {access_token_for(user)}'
+        if profile:
+            headers['HTTP_X_PROFILE'] = '1'
+        return self.client.get(url, **headers)
+
+    def test_admin_header(self):
+        response = self.get('/api/v1/titles/', self.admin, profile=True)
+        self.assertEqual(response.status_code, 200)
+        profile_id = response['X-Profile-Id']
+        self.assertEqual(list_profile_ids(), [profile_id])
+        stats = pstats.Stats(profile_path(profile_id, 'prof'))
+        self.assertGreater(stats.total_calls, 0)
+
+    def test_header_ignored_without_admin(self):
+        for user in (None, self.user):
+            response = self.get('/api/v1/titles/', user, profile=True)
+            self.assertFalse(response.has_header('X-Profile-Id'))
+        self.assertEqual(list_profile_ids(), [])
+
+    @override_settings(PROFILE_SAMPLE_RATES={'title-list': 1.0})
+    def test_sampling_by_route(self):
+        self.assertTrue(self.get('/api/v1/titles/').has_header('X-Profile-Id'))
+        self.assertFalse(
+            self.get('/api/v1/genres/').has_header('X-Profile-Id')
+        )
+
+    @override_settings(PROFILE_SAMPLE_RATES={'title-list': 1.0},
+                       PROFILE_MAX_FILES=2)
+    def test_ring_is_bounded(self):
+        ids = [self.get('/api/v1/titles/')['X-Profile-Id'] for _ in range(4)]
+        self.assertEqual(list_profile_ids(), ids[:-3:-1])
+
+    def test_endpoints(self):
+        profile_id = self.get(
+            '/api/v1/titles/', self.admin, profile=True
+        )['X-Profile-Id']
+        self.client.force_authenticate(self.admin)
+        profiles = self.client.get('/api/v1/profiles/').data
+        self.assertEqual(len(profiles), 1)
+        self.assertEqual(profiles[0]['id'], profile_id)
+        self.assertEqual(profiles[0]['route'], 'title-list')
+        self.assertGreater(profiles[0]['queries'], 0)
+
+        response = self.client.get(f'/api/v1/profiles/{profile_id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f'{profile_id}.prof',
+                      response['Content-Disposition'])
+        b''.join(response.streaming_content)
+
+        queries = self.client.get(f'/api/v1/profiles/{profile_id}/sql/').data
+        self.assertTrue(
+            any('reviews_title' in query['sql'] for query in queries)
+        )
+        self.assertEqual(
+            self.client.get('/api/v1/profiles/1-missing/').status_code, 404
+        )
+
+    def test_endpoints_only_for_admin(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(
+            self.client.get('/api/v1/profiles/').status_code, 403
+        )
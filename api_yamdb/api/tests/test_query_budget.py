@@ -0,0 +1,252 @@
+from django.core import mail
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from reviews.models import Category, Comment, Genre
+from users.cache import clear_user_cache
+from users.outbox import deliver_outbox
+
+from ..authentication import access_token_for
+from .base import (YamdbTestCase, create_admin, create_category, create_review,
+                   create_title, create_user, create_users)
+
+
+class QueryBudgetTests(YamdbTestCase):
+    """Число запросов каждого эндпоинта фиксировано и не растет с данными.
+
+    При превышении бюджета в сообщении выводятся все выполненные запросы.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = create_admin()
+        cls.user = create_user('user')
+        cls.category = create_category()
+        cls.genres = [
+            Genre.objects.create(name=f'Жанр {i}', slug=f'genre-{i}')
+            for i in range(3)
+        ]
+        cls.title = cls.create_title('Сталкер')
+        cls.review = create_review(cls.title, cls.user, 8, 'Отзыв о фильме')
+        cls.comment = Comment.objects.create(
+            review=cls.review, author=cls.admin, text='Комментарий к фильму'
+        )
+
+    @classmethod
+    def create_title(cls, name):
+        return create_title(name, cls.category, year=1979, genres=cls.genres)
+
+    def add_titles(self):
+        for i in range(5):
+            self.create_title(f'Произведение {i}')
+
+    def add_reviews(self):
+        for i in range(5):
+            create_review(
+                self.title, create_user(f'reviewer{i}'), i + 1,
+                'Отзыв о фильме',
+            )
+
+    def add_comments(self):
+        for i in range(5):
+            Comment.objects.create(
+                review=self.review, author=create_user(f'commenter{i}'),
+                text='Комментарий к фильму'
+            )
+
+    def add_users(self):
+        create_users(5, 'extra')
+
+    def add_genres(self):
+        for i in range(5):
+            Genre.objects.create(name=f'Новый {i}', slug=f'new-{i}')
+
+    def add_categories(self):
+        for i in range(5):
+            Category.objects.create(name=f'Новая {i}', slug=f'new-{i}')
+
+    def request(self, method, url, data=None, user=None, token=False):
+        """Запрос от user: с token - по настоящему токену доступа"""
+        if token:
+            self.client.force_authenticate(None)
+            self.client.credentials(
+                HTTP_AUTHORIZATION=f'Bearer {access_token_for(user)}'
+            )
+        else:
+            self.client.credentials()
+            self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data)
+        return response, queries
+
+    def assert_budget(self, budget, method, url, data=None, user=None,
+                      status=200, token=False):
+        response, queries = self.request(method, url, data, user, token)
+        self.assertEqual(
+            response.status_code, status,
+            f'{method.upper()} {url}: {getattr(response, "data", "")}'
+        )
+        self.assertLessEqual(
+            len(queries), budget, self.report(method, url, budget, queries)
+        )
+        return response
+
+    def assert_constant_budget(self, budget, url, grow, user=None):
+        """Бюджет списка не меняется при заполнении страницы"""
+        self.assert_budget(budget, 'get', url, user=user)
+        cache.clear()
+        small = len(self.request('get', url, user=user)[1])
+        grow()
+        cache.clear()
+        response, queries = self.request('get', url, user=user)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            len(queries), small, self.report('get', url, small, queries)
+        )
+
+    @staticmethod
+    def report(method, url, budget, queries):
+        sql = '\n'.join(
+            f'{number}. {query["sql"]}'
+            for number, query in enumerate(queries, 1)
+        )
+        return (f'{method.upper()} {url}: {len(queries)} запросов '
+                f'при бюджете {budget}\n{sql}')
+
+    def test_titles(self):
+        self.assert_constant_budget(3, '/api/v1/titles/', self.add_titles)
+        self.assert_budget(2, 'get', f'/api/v1/titles/{self.title.pk}/')
+        self.assert_budget(1, 'get', '/api/v1/titles/autocomplete/?q=ст')
+        # Сводки категории и жанров и маска жанров: по одному UPDATE
+        response = self.assert_budget(
+            11, 'post', '/api/v1/titles/',
+            {'name': 'Солярис', 'year': 1972, 'description': 'Драма',
+             'category': 'movie', 'genre': ['genre-0', 'genre-1']},
+            user=self.admin, status=201,
+        )
+        title_url = f'/api/v1/titles/{response.data["id"]}/'
+        # По UPDATE сводки и маски на каждый убранный и на добавленные
+        # жанры
+        self.assert_budget(
+            16, 'patch', title_url, {'genre': ['genre-2']}, user=self.admin
+        )
+        # Сводки жанров и категории удаленного произведения пересчитываются
+        self.assert_budget(13, 'delete', title_url, user=self.admin,
+                           status=204)
+
+    def test_genres_and_categories(self):
+        for resource, grow in (('genres', self.add_genres),
+                               ('categories', self.add_categories)):
+            url = f'/api/v1/{resource}/'
+            self.assert_constant_budget(2, url, grow)
+            self.assert_budget(2, 'get', f'{url}?search=Нов')
+            # Пустая сводка нового жанра или категории и у жанра -
+            # выбор свободного бита маски и точка сохранения для
+            # повторной попытки, если бит занят параллельно
+            self.assert_budget(
+                6 if resource == 'genres' else 3, 'post', url,
+                {'name': 'Аниме', 'slug': 'anime'},
+                user=self.admin, status=201,
+            )
+            # Сводка удаляется каскадом: SELECT и DELETE, бит жанра
+            # снимается с произведений
+            self.assert_budget(6 if resource == 'genres' else 5,
+                               'delete', f'{url}anime/',
+                               user=self.admin, status=204)
+
+    def test_reviews(self):
+        url = f'/api/v1/titles/{self.title.pk}/reviews/'
+        self.assert_constant_budget(3, url, self.add_reviews)
+        self.assert_budget(2, 'get', f'{url}?pagination=cursor')
+        self.assert_budget(2, 'get', f'{url}{self.review.pk}/')
+        # Два UPDATE сводок жанров и категории произведения
+        response = self.assert_budget(
+            6, 'post', url, {'text': 'Шедевр', 'score': 10},
+            user=self.admin, status=201,
+        )
+        review_url = f'{url}{response.data["id"]}/'
+        self.assert_budget(6, 'patch', review_url, {'score': 9},
+                           user=self.admin)
+        self.assert_budget(7, 'delete', review_url, user=self.admin,
+                           status=204)
+
+    def test_comments(self):
+        url = (f'/api/v1/titles/{self.title.pk}/reviews/'
+               f'{self.review.pk}/comments/')
+        self.assert_constant_budget(3, url, self.add_comments)
+        self.assert_budget(2, 'get', f'{url}?pagination=cursor')
+        self.assert_budget(2, 'get', f'{url}{self.comment.pk}/')
+        # UPDATE счетчиков отзыва
+        response = self.assert_budget(
+            3, 'post', url, {'text': 'Согласен'}, user=self.user,
+            status=201,
+        )
+        comment_url = f'{url}{response.data["id"]}/'
+        self.assert_budget(3, 'patch', comment_url, {'text': 'Не согласен'},
+                           user=self.user)
+        self.assert_budget(4, 'delete', comment_url, user=self.user,
+                           status=204)
+
+    def test_users(self):
+        self.assert_constant_budget(
+            2, '/api/v1/users/', self.add_users, user=self.admin
+        )
+        self.assert_budget(1, 'get', '/api/v1/users/user/', user=self.admin)
+        self.assert_budget(
+            3, 'post', '/api/v1/users/',
+            {'username': 'new', 'email': 'new@yamdb.ru'},
+            user=self.admin, status=201,
+        )
+        self.assert_budget(2, 'patch', '/api/v1/users/new/',
+                           {'bio': 'Био'}, user=self.admin)
+        self.assert_budget(7, 'delete', '/api/v1/users/new/',
+                           user=self.admin, status=204)
+        self.assert_budget(0, 'get', '/api/v1/users/me/', user=self.user)
+        self.assert_budget(1, 'patch', '/api/v1/users/me/',
+                           {'bio': 'Био'}, user=self.user)
+
+    def test_token_authentication(self):
+        """По токену бюджеты те же, что с force_authenticate.
+
+        Права читаются из БД один раз, дальше берутся из общего кэша.
+        """
+        clear_user_cache()
+        self.assert_budget(
+            2, 'get', '/api/v1/users/me/', user=self.user, token=True
+        )
+        self.assert_budget(
+            0, 'get', '/api/v1/users/me/', user=self.user, token=True
+        )
+        url = (f'/api/v1/titles/{self.title.pk}/reviews/'
+               f'{self.review.pk}/comments/')
+        self.assert_budget(
+            3, 'post', url, {'text': 'Согласен'}, user=self.user,
+            status=201, token=True,
+        )
+        self.assert_budget(
+            2, 'get', '/api/v1/users/me/', user=self.admin, token=True
+        )
+        self.assert_budget(
+            1, 'get', '/api/v1/users/user/', user=self.admin, token=True
+        )
+
+    def test_auth(self):
+        # Два запроса - SAVEPOINT и RELEASE внутри транзакции теста
+        self.assert_budget(
+            7, 'post', '/api/v1/auth/signup/',
+            {'username': 'signup', 'email': 'signup@yamdb.ru'},
+        )
+        deliver_outbox()
+        code = mail.outbox[-1].body.split()[-1]
+        self.assert_budget(
+            1, 'post', '/api/v1/auth/token/',
+            {'username': 'signup', 'confirmation_code': code},
+        )
+
+    def test_text_search(self):
+        self.assert_constant_budget(
+            1, '/api/v1/search/reviews/?q=отзыв', self.add_reviews
+        )
+        self.assert_constant_budget(
+            1, '/api/v1/search/comments/?q=комментарий', self.add_comments
+        )
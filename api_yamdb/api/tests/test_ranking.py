@@ -0,0 +1,129 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from reviews.models import Genre, RatingPrior, Review, Title
+
+from .base import YamdbTestCase, create_category, create_title, create_users
+
+
+@override_settings(RANKING_MIN_REVIEWS=2)
+class TopTitlesTests(YamdbTestCase):
+    """Взвешенный рейтинг и список лучших произведений"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = create_users(4)
+        cls.movie = create_category()
+        cls.book = create_category('Книга', 'book')
+        cls.drama = Genre.objects.create(name='Драма', slug='drama')
+        cls.titles = [
+            create_title(
+                f'Произведение {i}', cls.movie if i % 2 else cls.book,
+                year=2000 + i,
+            )
+            for i in range(4)
+        ]
+        cls.titles[1].genre.set([cls.drama])
+
+    def expected(self, title, weight=2):
+        """Рейтинг по отзывам и сохраненной средней"""
+        prior = RatingPrior.objects.first()
+        mean = prior.mean if prior else 5.5
+        scores = list(title.reviews.values_list('score', flat=True))
+        if not scores:
+            return 0
+        return (sum(scores) + mean * weight) / (len(scores) + weight)
+
+    def assert_ratings(self):
+        for title in Title.objects.all():
+            self.assertAlmostEqual(
+                title.weighted_rating, self.expected(title), msg=title.name
+            )
+        self.assert_title_counters()
+
+    def top(self, **params):
+        response = self.client.get('/api/v1/titles/top/', params)
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data]
+
+    def test_many_good_reviews_beat_single_perfect(self):
+        first, second, third = self.titles[:3]
+        self.review(first, self.users[0], 10)
+        for user in self.users:
+            self.review(second, user, 9)
+            self.review(third, user, 3)
+        call_command('rebuild_ranking', stdout=StringIO())
+        self.assertEqual(self.top(), [second.pk, first.pk, third.pk])
+
+    def test_incremental_updates(self):
+        first, second = self.titles[:2]
+        reviews = [
+            self.review(first, self.users[0], 10),
+            self.review(first, self.users[1], 3),
+            self.review(second, self.users[0], 7),
+        ]
+        self.assert_ratings()
+        call_command('rebuild_ranking', stdout=StringIO())
+        self.assertAlmostEqual(RatingPrior.objects.get().mean, 20 / 3)
+        self.assert_ratings()
+
+        review = Review.objects.get(pk=reviews[1].pk)
+        review.score = 5
+        review.save()
+        review.title = second
+        review.save()
+        Review.objects.get(pk=reviews[0].pk).delete()
+        self.assert_ratings()
+        self.assertEqual(Title.objects.get(pk=first.pk).weighted_rating, 0)
+        self.assertEqual(self.top(), [second.pk])
+
+    def test_title_save_keeps_rating(self):
+        title = Title.objects.get(pk=self.titles[0].pk)
+        self.review(title, self.users[0], 8)
+        title.name = 'Новое название'
+        title.save()
+        self.assert_ratings()
+
+    def test_filters_and_limit(self):
+        for number, title in enumerate(self.titles):
+            self.review(title, self.users[0], number + 1)
+        self.assertEqual(
+            self.top(), [title.pk for title in reversed(self.titles)]
+        )
+        self.assertEqual(self.top(limit=2), [self.titles[3].pk,
+                                             self.titles[2].pk])
+        self.assertEqual(self.top(category='movie'), [self.titles[3].pk,
+                                                      self.titles[1].pk])
+        self.assertEqual(self.top(genre='drama'), [self.titles[1].pk])
+        self.assertEqual(self.top(year=2002), [self.titles[2].pk])
+
+    def test_representation(self):
+        self.review(self.titles[1], self.users[0], 8)
+        response = self.client.get('/api/v1/titles/top/')
+        self.assertEqual(response.data, [{
+            'id': self.titles[1].pk,
+            'category': {'name': 'Фильм', 'slug': 'movie'},
+            'genre': [{'slug': 'drama', 'name': 'Драма'}],
+            'name': 'Произведение 1',
+            'year': 2001,
+            'rating': 8,
+            'description': '',
+            'weighted_rating': 6.33,
+        }])
+
+    def test_queries_do_not_depend_on_catalogue_size(self):
+        for title in self.titles:
+            self.review(title, self.users[0], 5)
+        with CaptureQueriesContext(connection) as queries:
+            self.top(limit=2)
+        self.assertEqual(len(queries), 2)
+
+    def test_rebuild_without_reviews(self):
+        RatingPrior.objects.create(mean=9)
+        out = StringIO()
+        call_command('rebuild_ranking', stdout=out)
+        self.assertIn('обновлено произведений: 4', out.getvalue())
+        self.assertFalse(RatingPrior.objects.exists())
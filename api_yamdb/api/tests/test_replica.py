@@ -0,0 +1,141 @@
+import time
+from unittest import skipUnless
+
+from django.conf import settings
+from django.http import HttpResponse, SimpleCookie
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from reviews.models import Review, Title
+
+from ..authentication import access_token_for
+from ..db_router import (STICKY_COOKIE, ReplicaRouter, read_from,
+                         replica_may_lag)
+from ..middleware import ReplicaRoutingMiddleware
+from .base import YamdbTestCase, create_category, create_title, create_user
+
+
+@override_settings(REPLICA_DATABASES=['replica'])
+class ReplicaRoutingMiddlewareTests(YamdbTestCase):
+    """Выбор БД для чтения без настоящей реплики"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('user')
+        cls.other = create_user('other')
+
+    def setUp(self):
+        super().setUp()
+        self.factory = RequestFactory()
+        # Cookie клиента, запросы могут обслуживать разные воркеры
+        self.cookies = SimpleCookie()
+
+    def alias(self, method='get', user=None, status=200):
+        """БД, из которой читало бы представление"""
+        used = []
+
+        def view(request):
+            used.append(ReplicaRouter().db_for_read(Title))
+            return HttpResponse(status=status)
+
+        headers = {}
+        if user is not None:
+            headers['HTTP_AUTHORIZATION'] = f'Bearer {access_token_for(user)}'
+        request = getattr(self.factory, method)('/api/v1/titles/', **headers)
+        request.COOKIES = {
+            name: morsel.value for name, morsel in self.cookies.items()
+        }
+        response = ReplicaRoutingMiddleware(view)(request)
+        self.cookies.update(response.cookies)
+        return used[0]
+
+    def test_safe_methods_read_from_replica(self):
+        self.assertEqual(self.alias(), 'replica')
+        self.assertEqual(self.alias(user=self.user), 'replica')
+        self.assertEqual(self.alias('head'), 'replica')
+
+    def test_writes_read_from_primary(self):
+        self.assertEqual(self.alias('post', self.user, 201), 'default')
+        self.assertEqual(self.alias('delete', status=401), 'default')
+
+    def test_reads_stick_to_primary_after_write(self):
+        self.alias('post', self.user, 201)
+        self.assertEqual(self.alias(user=self.user), 'default')
+        self.assertEqual(self.alias(user=self.other), 'replica')
+        self.assertEqual(self.alias(), 'replica')
+
+    def test_sticky_cookie_is_bound_to_user(self):
+        self.alias('post', self.user, 201)
+        self.assertTrue(self.cookies[STICKY_COOKIE]['httponly'])
+        self.assertEqual(self.alias(user=self.other), 'replica')
+        self.cookies[STICKY_COOKIE] = str(self.other.pk)
+        self.assertEqual(self.alias(user=self.other), 'replica')
+
+    @override_settings(REPLICA_STICKY_SECONDS=1)
+    def test_stickiness_expires(self):
+        self.alias('post', self.user, 201)
+        time.sleep(1.1)
+        self.assertEqual(self.alias(user=self.user), 'replica')
+
+    def test_failed_write_does_not_stick(self):
+        self.alias('post', self.user, 400)
+        self.assertEqual(self.alias(user=self.user), 'replica')
+
+    @override_settings(REPLICA_DATABASES=[])
+    def test_without_replicas(self):
+        self.assertEqual(self.alias(), 'default')
+
+    def test_outside_requests_primary(self):
+        self.assertEqual(ReplicaRouter().db_for_read(Title), 'default')
+
+
+class ReplicaLagTests(SimpleTestCase):
+    def test_recent_changes_on_replica(self):
+        recent = (time.time_ns(),)
+        old = (time.time_ns() - 3600 * 10 ** 9,)
+        self.assertFalse(replica_may_lag(recent))
+        with read_from('replica'):
+            self.assertTrue(replica_may_lag(recent))
+            self.assertFalse(replica_may_lag(old))
+
+
+@skipUnless('replica' in settings.DATABASES,
+            'реплика не настроена: задайте DB_REPLICA_NAME')
+class ReplicaDatabaseTests(YamdbTestCase):
+    """Две SQLite-базы вместо основной БД и реплики.
+
+    Запуск: DB_REPLICA_NAME=/tmp/replica.sqlite3 python manage.py test
+    api.tests.test_replica. Реплика не получает записей, поэтому
+    по ответам видно, из какой БД шло чтение.
+    """
+
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def setUpTestData(cls):
+        category = create_category(pk=1)
+        title = create_title('Сталкер', category, year=1979, pk=1)
+        cls.user = create_user('user')
+        # Строки копируются в реплику как при репликации, без сигналов
+        for obj in (category, title, cls.user):
+            type(obj).objects.using('replica').bulk_create([obj])
+
+    def reviews(self, user=None):
+        if user is None:
+            self.client.credentials()
+        else:
+            self.client.credentials(
+                HTTP_AUTHORIZATION=f'Bearer {access_token_for(user)}'
+            )
+        return self.client.get('/api/v1/titles/1/reviews/').data['results']
+
+    def test_user_reads_own_write(self):
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {access_token_for(self.user)}'
+        )
+        response = self.client.post(
+            '/api/v1/titles/1/reviews/', {'text': 'Шедевр', 'score': 10}
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Review.objects.using('default').exists())
+        self.assertEqual(len(self.reviews(self.user)), 1)
+        # Реплика еще не получила отзыв
+        self.assertEqual(self.reviews(), [])
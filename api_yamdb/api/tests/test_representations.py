@@ -0,0 +1,105 @@
+from rest_framework.renderers import JSONRenderer
+from reviews.models import Comment, Genre, Review, Title
+
+from ..serializers import (CommentSerializer, ReviewSerializer,
+                           TitleHistogramSerializer, TitleSerializerDetail)
+from .base import (YamdbTestCase, create_category, create_review, create_title,
+                   create_user, create_users)
+
+
+class RepresentationTests(YamdbTestCase):
+    """Ответы без сериализаторов совпадают с сериализаторами побайтно"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        category = create_category()
+        genres = [
+            Genre.objects.create(name=f'Жанр {i}', slug=f'genre-{i}')
+            for i in range(3)
+        ]
+        for number in range(4):
+            create_title(
+                f'Произведение «{number}»', category if number % 2 else None,
+                year=1990 + number, genres=genres[number % 3:],
+                description='Описание',
+            )
+        cls.title = Title.objects.first()
+        for number, author in enumerate(create_users(7, 'reviewer')):
+            create_review(cls.title, author, number + 1, f'Отзыв {number}')
+        cls.review = Review.objects.first()
+        for number in range(3):
+            Comment.objects.create(
+                review=cls.review, author=cls.author,
+                text=f'Комментарий {number}',
+            )
+
+    @staticmethod
+    def render(data):
+        return JSONRenderer().render(data)
+
+    def assert_same(self, url, serializer_class, objects):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        data = response.data
+        if 'results' in data:
+            data = data['results']
+        many = isinstance(objects, list)
+        self.assertEqual(
+            self.render(data),
+            self.render(serializer_class(objects, many=many).data),
+        )
+
+    def test_titles(self):
+        self.assert_same(
+            '/api/v1/titles/', TitleSerializerDetail,
+            list(Title.objects.all()[:5]),
+        )
+        self.assert_same(
+            '/api/v1/titles/?include=score_histogram',
+            TitleHistogramSerializer, list(Title.objects.all()[:5]),
+        )
+        for title in Title.objects.all():
+            with self.subTest(title=title.pk):
+                self.assert_same(
+                    f'/api/v1/titles/{title.pk}/', TitleHistogramSerializer,
+                    title,
+                )
+
+    def test_reviews(self):
+        url = f'/api/v1/titles/{self.title.pk}/reviews/'
+        self.assert_same(
+            url, ReviewSerializer, list(self.title.reviews.all()[:5])
+        )
+        # Счетчики комментариев в cls.review устарели
+        self.assert_same(
+            f'{url}{self.review.pk}/', ReviewSerializer,
+            Review.objects.get(pk=self.review.pk),
+        )
+
+    def test_comments(self):
+        url = (f'/api/v1/titles/{self.title.pk}/reviews/'
+               f'{self.review.pk}/comments/')
+        self.assert_same(
+            url, CommentSerializer, list(self.review.comments.all())
+        )
+        comment = self.review.comments.first()
+        self.assert_same(f'{url}{comment.pk}/', CommentSerializer, comment)
+
+    def test_cursor_pagination(self):
+        url = f'/api/v1/titles/{self.title.pk}/reviews/?pagination=cursor'
+        first = self.client.get(url).data
+        second = self.client.get(first['next']).data
+        self.assertEqual(
+            [review['id'] for review in first['results'] + second['results']],
+            list(
+                self.title.reviews.order_by('pub_date', 'id')
+                .values_list('id', flat=True)
+            ),
+        )
+        back = self.client.get(second['previous']).data
+        self.assertEqual(back['results'], first['results'])
+
+    def test_missing_object(self):
+        response = self.client.get('/api/v1/titles/0/')
+        self.assertEqual(response.status_code, 404)
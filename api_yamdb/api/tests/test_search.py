@@ -0,0 +1,204 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from reviews import search
+from reviews.models import Comment, Review, Title
+
+from ..views import AUTOCOMPLETE_LIMIT, AUTOCOMPLETE_MAX_LIMIT
+from .base import (YamdbTestCase, create_category, create_review, create_title,
+                   create_user)
+
+
+class TitleNameSearchTests(YamdbTestCase):
+    """Поиск по названию и подсказки без учета регистра"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = create_category()
+        for name in ('Ёлки', 'ЗЕЛЁНАЯ МИЛЯ', 'Солярис', 'соло', 'Пикник'):
+            create_title(name, cls.category)
+
+    def names(self, value):
+        response = self.client.get('/api/v1/titles/', {'name': value})
+        self.assertEqual(response.status_code, 200, response.data)
+        return sorted(item['name'] for item in response.data['results'])
+
+    def suggestions(self, **params):
+        response = self.client.get('/api/v1/titles/autocomplete/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [item['name'] for item in response.data]
+
+    def test_case_insensitive_cyrillic(self):
+        for value, expected in (
+            ('ёлк', ['Ёлки']),
+            ('ЕЛКИ', ['Ёлки']),
+            ('зеленая', ['ЗЕЛЁНАЯ МИЛЯ']),
+            ('ЛЯР', ['Солярис']),
+            ('сол', ['Солярис', 'соло']),
+            ('ки', ['Ёлки']),
+            ('матрица', []),
+        ):
+            with self.subTest(value=value):
+                self.assertEqual(self.names(value), expected)
+
+    def test_fallback_without_trigram_index(self):
+        """Без триграмм FTS5 поиск идет по подстроке search_name"""
+        with mock.patch.object(search, 'SQLITE_TRIGRAM', False):
+            queryset = search.filter_titles_by_name(
+                Title.objects.all(), 'Зелёная'
+            )
+            self.assertNotIn(search.TITLE_FTS_TABLE, str(queryset.query))
+            self.assertEqual(
+                [title.name for title in queryset], ['ЗЕЛЁНАЯ МИЛЯ']
+            )
+            self.assertEqual(self.names('ЁЛК'), ['Ёлки'])
+
+    def test_postgresql_uses_search_name(self):
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            name_query = str(search.filter_titles_by_name(
+                Title.objects.all(), 'Соляр'
+            ).query)
+            prefix_query = str(search.autocomplete_titles(
+                Title.objects.all(), 'Сол', 5
+            ).query)
+        self.assertIn('"search_name" LIKE', name_query)
+        self.assertIn('%соляр%', name_query)
+        self.assertNotIn(search.TITLE_FTS_TABLE, name_query)
+        self.assertIn('"search_name" LIKE сол%', prefix_query)
+
+    def test_autocomplete_prefix_and_order(self):
+        self.assertEqual(self.suggestions(q='СОЛ'), ['соло', 'Солярис'])
+        self.assertEqual(self.suggestions(q='  ёл'), ['Ёлки'])
+        self.assertEqual(self.suggestions(q='ляр'), [])
+        self.assertEqual(self.suggestions(q=''), [])
+
+    def test_autocomplete_limit(self):
+        Title.objects.bulk_create(
+            Title(name=f'Тест {number:02}', search_name=f'тест {number:02}',
+                  year=2000, description='', category=self.category)
+            for number in range(AUTOCOMPLETE_MAX_LIMIT + 10)
+        )
+        self.assertEqual(len(self.suggestions(q='тест')), AUTOCOMPLETE_LIMIT)
+        suggestions = self.suggestions(q='тест', limit=1000)
+        self.assertEqual(len(suggestions), AUTOCOMPLETE_MAX_LIMIT)
+        self.assertEqual(suggestions, sorted(suggestions))
+        self.assertEqual(len(self.suggestions(q='тест', limit=0)), 1)
+        self.assertEqual(len(self.suggestions(q='тест', limit='много')),
+                         AUTOCOMPLETE_LIMIT)
+
+
+class TextSearchTests(YamdbTestCase):
+    """Полнотекстовый поиск по отзывам и комментариям"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = create_category()
+        cls.first, cls.second = (
+            create_title(name, category) for name in ('Солярис', 'Сталкер')
+        )
+        cls.alice, cls.bob = (create_user(name) for name in ('alice', 'bob'))
+        cls.dense = create_review(
+            cls.first, cls.alice, 9, 'Станция, станция и снова станция'
+        )
+        cls.sparse = create_review(
+            cls.first, cls.bob, 6,
+            'Долгий фильм про океан, память, людей и одну станцию '
+            'на орбите далекой планеты',
+        )
+        cls.other = create_review(
+            cls.second, cls.alice, 8, 'Зона, станция и сталкер'
+        )
+        create_review(cls.second, cls.bob, 7, 'Ничего общего')
+        now = timezone.now()
+        Review.objects.filter(pk=cls.other.pk).update(
+            pub_date=now - timedelta(days=30)
+        )
+        cls.comment = Comment.objects.create(
+            review=cls.other, author=cls.bob, text='Станция мне понравилась'
+        )
+        Comment.objects.create(
+            review=cls.dense, author=cls.alice, text='Согласен про станцию'
+        )
+
+    def search(self, resource='reviews', status=200, **params):
+        response = self.client.get(f'/api/v1/search/{resource}/', params)
+        self.assertEqual(response.status_code, status, response.data)
+        return response.data
+
+    def ids(self, resource='reviews', **params):
+        return [item['id'] for item in self.search(resource, **params)]
+
+    def test_ranked_results(self):
+        results = self.search(q='станция')
+        self.assertEqual(
+            [item['id'] for item in results], [self.dense.pk, self.other.pk]
+        )
+        ranks = [item['rank'] for item in results]
+        self.assertEqual(ranks, sorted(ranks, reverse=True))
+        self.assertGreater(ranks[0], ranks[-1])
+
+    def test_all_words_required(self):
+        self.assertEqual(self.ids(q='станция сталкер'), [self.other.pk])
+        self.assertEqual(self.ids(q='СТАЛКЕР'), [self.other.pk])
+        self.assertEqual(self.ids(q='!!!'), [])
+
+    def test_filters(self):
+        today = timezone.now().date()
+        for params, expected in (
+            ({'title': self.second.pk}, [self.other.pk]),
+            ({'author': 'bob'}, []),
+            ({'author': 'alice', 'title': self.first.pk}, [self.dense.pk]),
+            ({'date_from': str(today - timedelta(days=1))}, [self.dense.pk]),
+            ({'date_to': str(today - timedelta(days=7))}, [self.other.pk]),
+            ({'date_from': str(today - timedelta(days=60)),
+              'date_to': timezone.now().isoformat()},
+             [self.dense.pk, self.other.pk]),
+            ({'limit': 1}, [self.dense.pk]),
+        ):
+            with self.subTest(params=params):
+                self.assertEqual(self.ids(q='станция', **params), expected)
+
+    @override_settings(TEXT_SEARCH_CANDIDATES=1)
+    def test_ranks_only_newest_candidates(self):
+        """Ранжируются не все совпадения, а ограниченное число новых"""
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.ids(q='станция'), [self.other.pk])
+        self.assertIn('LIMIT 1)', queries[-1]['sql'])
+        # Фильтры применяются до отбора кандидатов
+        self.assertEqual(
+            self.ids(q='станция', title=self.first.pk), [self.dense.pk]
+        )
+
+    def test_invalid_params(self):
+        for params in (
+            {},
+            {'q': 'станция', 'date_from': '2020-13-01'},
+            {'q': 'станция', 'date_to': 'вчера'},
+            {'q': 'станция', 'title': 'Солярис'},
+            {'q': 'станция', 'limit': 101},
+            {'q': 'станция', 'limit': 0},
+        ):
+            with self.subTest(params=params):
+                self.search(status=400, **params)
+
+    def test_comments(self):
+        results = self.search('comments', q='станция', title=self.second.pk)
+        self.assertEqual([item['id'] for item in results],
+                         [self.comment.pk])
+        self.assertEqual(results[0]['review'], self.other.pk)
+        self.assertEqual(results[0]['title'], self.second.pk)
+        self.assertEqual(
+            self.ids('comments', q='понравилась', author='alice'), []
+        )
+
+    def test_index_follows_edits(self):
+        review = Review.objects.get(pk=self.sparse.pk)
+        review.text = 'Станция станция'
+        review.save()
+        self.assertIn(self.sparse.pk, self.ids(q='станция'))
+        review.delete()
+        self.assertNotIn(self.sparse.pk, self.ids(q='станцию'))
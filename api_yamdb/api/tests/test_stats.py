@@ -0,0 +1,196 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Avg, Count
+from django.test.utils import CaptureQueriesContext
+from reviews.models import (Category, CategoryStats, Genre, GenreStats,
+                            GenreTitle, Review, Title)
+from reviews.stats import refresh_titles_stats
+
+from .base import (YamdbTestCase, create_admin, create_category,
+                   create_title, create_users)
+
+
+class StatsTests(YamdbTestCase):
+    """Сводки обновляются по изменениям и совпадают с расчетом по отзывам"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = create_admin()
+        cls.users = create_users(3)
+        cls.movie = create_category()
+        cls.book = create_category('Книга', 'book')
+        cls.genres = [
+            Genre.objects.create(name=f'Жанр {i}', slug=f'genre-{i}')
+            for i in range(3)
+        ]
+
+    def assert_consistent(self):
+        """Сводки равны агрегатам по отзывам и связям"""
+        for genre in Genre.objects.all():
+            stats = GenreStats.objects.get(genre=genre)
+            titles = Title.objects.filter(genre=genre)
+            reviews = Review.objects.filter(title__genre=genre)
+            self.assert_stats(stats, titles, reviews, genre.slug)
+        for category in Category.objects.all():
+            stats = CategoryStats.objects.get(category=category)
+            titles = Title.objects.filter(category=category)
+            reviews = Review.objects.filter(title__category=category)
+            self.assert_stats(stats, titles, reviews, category.slug)
+
+    def assert_stats(self, stats, titles, reviews, slug):
+        expected = reviews.aggregate(count=Count('pk'), avg=Avg('score'))
+        self.assertEqual(
+            (stats.titles_count, stats.reviews_count),
+            (titles.count(), expected['count']),
+            slug,
+        )
+        if expected['avg'] is None:
+            self.assertIsNone(stats.rating, slug)
+        else:
+            self.assertAlmostEqual(stats.rating, expected['avg'], msg=slug)
+
+    def test_incremental_updates(self):
+        first = create_title('Первое', self.movie, genres=self.genres[:2])
+        second = create_title('Второе', self.book, genres=self.genres[1:])
+        reviews = [
+            self.review(first, self.users[0], 8),
+            self.review(first, self.users[1], 4),
+            self.review(second, self.users[0], 10),
+        ]
+        self.assert_consistent()
+
+        review = Review.objects.get(pk=reviews[1].pk)
+        review.score = 6
+        review.save()
+        review.title = second
+        review.save()
+        self.assert_consistent()
+
+        title = Title.objects.get(pk=first.pk)
+        title.category = self.book
+        title.save()
+        title.genre.set(self.genres[2:])
+        self.assert_consistent()
+
+        Review.objects.get(pk=reviews[0].pk).delete()
+        GenreTitle.objects.create(title=second, genre=self.genres[0])
+        second.genre.remove(self.genres[1])
+        self.assert_consistent()
+
+        Title.objects.get(pk=second.pk).delete()
+        self.assert_consistent()
+
+        Genre.objects.create(name='Новый', slug='new')
+        first.genre.clear()
+        self.assert_consistent()
+
+    def test_moved_genre_link(self):
+        """Перенос связи меняет только сводки старого и нового жанра"""
+        first = create_title('Первое', self.movie, genres=self.genres[:1])
+        second = create_title('Второе', self.book, genres=self.genres[1:2])
+        self.review(first, self.users[0], 8)
+        self.review(second, self.users[1], 3)
+        link = GenreTitle.objects.get(title=first)
+        link.genre = self.genres[2]
+        with CaptureQueriesContext(connection) as queries:
+            link.save()
+        self.assert_consistent()
+        updates = [query['sql'] for query in queries
+                   if query['sql'].startswith('UPDATE')]
+        self.assertTrue(updates)
+        for sql in updates:
+            self.assertIn('WHERE', sql)
+        link = GenreTitle.objects.only('pk').get(pk=link.pk)
+        link.title_id = second.pk
+        link.save()
+        self.assert_consistent()
+        self.assertEqual(Title.objects.get(pk=first.pk).genre_mask, 0)
+        self.assertEqual(
+            Title.objects.get(pk=second.pk).genre_mask,
+            self.genres[1].mask + self.genres[2].mask,
+        )
+
+    def test_bulk_upsert_refreshes_stats(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.post('/api/v1/titles/bulk/', [
+            {'name': f'Пачка {i}', 'year': 2000, 'description': 'Описание',
+             'category': 'movie', 'genre': ['genre-0', 'genre-2']}
+            for i in range(3)
+        ], format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assert_consistent()
+
+    def test_bulk_update_refreshes_affected_groups(self):
+        """Пересчитываются только старые и новые группы произведений"""
+        moved = create_title('Первое', self.movie, genres=self.genres[:2])
+        self.review(moved, self.users[0], 9)
+        self.review(create_title('Второе', self.movie, genres=self.genres[:1]),
+                    self.users[1], 4)
+        self.client.force_authenticate(self.admin)
+        with mock.patch('reviews.signals.rebuild_stats') as rebuild, \
+                mock.patch('reviews.signals.refresh_titles_stats',
+                           wraps=refresh_titles_stats) as refresh:
+            response = self.client.post('/api/v1/titles/bulk/', [
+                {'id': moved.pk, 'name': 'Первое', 'year': 2000,
+                 'description': 'Описание', 'category': 'book',
+                 'genre': ['genre-2']},
+            ], format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        rebuild.assert_not_called()
+        refresh.assert_called_once()
+        self.assertEqual(
+            set(refresh.call_args[0][1]),
+            {genre.pk for genre in self.genres[:2]},
+        )
+        self.assertEqual(set(refresh.call_args[0][2]), {self.movie.pk})
+        self.assert_consistent()
+
+    def test_deferred_title_category_change(self):
+        title = create_title('Первое', self.movie, genres=self.genres[:1])
+        self.review(title, self.users[0], 6)
+        title = Title.objects.only('name').get(pk=title.pk)
+        title.category_id = self.book.pk
+        with mock.patch('reviews.signals.refresh_category_stats') as refresh:
+            title.save()
+        refresh.assert_not_called()
+        self.assert_consistent()
+
+    def test_ranking_rebuild_keeps_stats(self):
+        self.review(create_title('Первое', self.movie, genres=self.genres),
+                    self.users[0], 7)
+        with mock.patch('reviews.signals.rebuild_stats') as rebuild, \
+                mock.patch('reviews.signals.rebuild_genre_masks') as masks:
+            call_command('rebuild_ranking', stdout=StringIO())
+        rebuild.assert_not_called()
+        masks.assert_not_called()
+
+    def test_rebuild_command(self):
+        title = create_title('Первое', self.movie, genres=self.genres)
+        self.review(title, self.users[0], 7)
+        GenreStats.objects.all().delete()
+        CategoryStats.objects.update(titles_count=100)
+        out = StringIO()
+        call_command('rebuild_stats', stdout=out)
+        self.assertIn('Обновлено строк статистики: 5', out.getvalue())
+        self.assert_consistent()
+
+    def test_endpoint(self):
+        title = create_title('Первое', self.movie, genres=self.genres[:1])
+        self.review(title, self.users[0], 7)
+        self.review(title, self.users[1], 8)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/v1/stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(response.data['genres'][0], {
+            'slug': 'genre-0', 'name': 'Жанр 0', 'titles_count': 1,
+            'reviews_count': 2, 'rating': 7.5,
+        })
+        self.assertEqual(response.data['genres'][1]['rating'], None)
+        self.assertEqual(
+            [item['slug'] for item in response.data['categories']],
+            ['movie', 'book'],
+        )
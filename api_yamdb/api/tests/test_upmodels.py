@@ -0,0 +1,154 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError
+from reviews.models import (Category, CategoryStats, Comment, Genre,
+                            GenreStats, GenreTitle, Review, Title)
+from reviews.signals import bulk_changed
+from users.models import User
+
+from .base import YamdbTestCase, create_title, create_user
+
+CSV_FILES = {
+    'users.csv': (
+        'id,username,email,role,bio,first_name,last_name\n'
+        '10,alice,alice@yamdb.ru,user,,,\n'
+        '11,bob,bob@yamdb.ru,moderator,,,\n'
+        '12,carol,carol@yamdb.ru,user,,,\n'
+    ),
+    'category.csv': (
+        'id,name,slug\n'
+        '1,Фильм,movie\n'
+        '2,Книга,book\n'
+    ),
+    'genre.csv': (
+        'id,name,slug\n'
+        '1,Драма,drama\n'
+        '2,Комедия,comedy\n'
+    ),
+    'titles.csv': (
+        'id,name,year,category\n'
+        '20,Солярис,1972,1\n'
+        '21,Пикник,1972,2\n'
+        '22,Кин-дза-дза,1986,1\n'
+    ),
+    'genre_title.csv': (
+        'id,title_id,genre_id\n'
+        '1,20,1\n'
+        '2,21,1\n'
+        '3,21,2\n'
+        '4,22,2\n'
+    ),
+    'review.csv': (
+        'id,title_id,text,author,score,pub_date\n'
+        '30,20,Шедевр,10,10,2020-01-01T00:00:00Z\n'
+        '31,20,Скучно,11,4,2020-01-02T00:00:00Z\n'
+        '32,21,Хорошо,12,8,2020-01-03T00:00:00Z\n'
+    ),
+    'comments.csv': (
+        'id,review_id,text,author,pub_date\n'
+        '40,30,Согласен,11,2020-01-04T00:00:00Z\n'
+        '41,30,Нет,12,2020-01-05T00:00:00Z\n'
+    ),
+}
+
+
+class UpmodelsTests(YamdbTestCase):
+    """Загрузка csv командой upmodels"""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.data_dir = directory.name
+        for filename, content in CSV_FILES.items():
+            with open(os.path.join(self.data_dir, filename), 'w',
+                      encoding='utf-8') as file:
+                file.write(content)
+
+    def load(self, *args, **options):
+        out = StringIO()
+        call_command(
+            'upmodels', '--data-dir', self.data_dir, *args, stdout=out,
+            **options
+        )
+        return out.getvalue()
+
+    def test_import(self):
+        out = self.load()
+        self.assertIn('titles: 3 строк', out)
+        for model, count in ((User, 3), (Category, 2), (Genre, 2),
+                             (Title, 3), (GenreTitle, 4), (Review, 3),
+                             (Comment, 2)):
+            self.assertEqual(model.objects.count(), count, model.__name__)
+
+    def test_counters_rebuilt(self):
+        self.load()
+        title = Title.objects.get(pk=20)
+        self.assertEqual((title.reviews_count, title.score_sum), (2, 14))
+        self.assertEqual(title.scores_10, 1)
+        self.assertGreater(title.weighted_rating, 0)
+        self.assertEqual(Review.objects.get(pk=30).comment_count, 2)
+        drama = GenreStats.objects.get(genre_id=1)
+        self.assertEqual(
+            (drama.titles_count, drama.reviews_count, drama.score_sum),
+            (2, 3, 22),
+        )
+        self.assertEqual(CategoryStats.objects.get(category_id=2)
+                         .reviews_count, 1)
+        self.assertEqual(
+            Title.objects.get(pk=21).genre_mask,
+            sum(Genre.objects.values_list('mask', flat=True)),
+        )
+
+    def test_bulk_changed_sent(self):
+        senders = []
+
+        def receiver(sender, **kwargs):
+            senders.append(sender)
+
+        bulk_changed.connect(receiver)
+        self.addCleanup(bulk_changed.disconnect, receiver)
+        self.load()
+        self.assertEqual(
+            set(senders),
+            {User, Category, Genre, Title, GenreTitle, Review, Comment},
+        )
+
+    def test_batch_size(self):
+        out = self.load('--batch-size', '2', verbosity=2)
+        self.assertIn('titles: 2\n', out)
+        self.assertIn('titles: 3\n', out)
+        self.assertEqual(Title.objects.count(), 3)
+        with self.assertRaises(CommandError):
+            self.load('--batch-size', '0')
+
+    def test_sequences_reset(self):
+        self.load()
+        title = create_title('Новое', Category.objects.get(pk=1))
+        self.assertGreater(title.pk, 22)
+        user = create_user('dave')
+        self.assertGreater(user.pk, 12)
+
+    def test_truncate(self):
+        self.load()
+        Review.objects.filter(pk=32).delete()
+        Genre.objects.create(name='Лишний', slug='extra')
+        self.load('--truncate')
+        self.assertEqual(Review.objects.count(), 3)
+        self.assertFalse(Genre.objects.filter(slug='extra').exists())
+        self.assertEqual(GenreStats.objects.count(), 2)
+        self.assertEqual(Title.objects.get(pk=21).reviews_count, 1)
+
+    def test_duplicate_ids_without_truncate(self):
+        self.load()
+        with self.assertRaises(IntegrityError):
+            self.load()
+
+    def test_missing_file(self):
+        os.remove(os.path.join(self.data_dir, 'genre.csv'))
+        with self.assertRaisesMessage(CommandError, 'genre.csv'):
+            self.load()
+        self.assertFalse(User.objects.exists())
@@ -2,7 +2,8 @@ from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
 from .views import (CategoryViewSet, CommentViewSet, GenreViewSet,
-                    ReviewViewSet, TitleViewSet, UserAuthViewSet,
+                    MetricsView, ProfileViewSet, ReviewViewSet, StatsView,
+                    TextSearchViewSet, TitleViewSet, UserAuthViewSet,
                     UserProfileViewSet, UserVerifyToken, UserViewSet)
 
 router = DefaultRouter()
@@ -27,9 +28,15 @@ router.register(
     basename='comments'
 )
 
+router.register(r'search', TextSearchViewSet, basename='search')
+
+router.register(r'profiles', ProfileViewSet, basename='profiles')
+
 urlpatterns = [
     path('v1/users/me/', UserProfileViewSet.as_view()),
     path('v1/', include(router.urls)),
     path('v1/auth/signup/', UserAuthViewSet.as_view()),
     path('v1/auth/token/', UserVerifyToken.as_view()),
+    path('v1/metrics/', MetricsView.as_view(), name='metrics'),
+    path('v1/stats/', StatsView.as_view(), name='stats'),
 ]
@@ -1,6 +1,19 @@
+from http import HTTPStatus
+
 import django_filters
+from django.conf import settings
+from django.db import transaction
+from django_filters.constants import EMPTY_VALUES
 from rest_framework import mixins, viewsets
+from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
+from rest_framework.response import Response
+from reviews.bulk import upsert_by_slug
+from reviews.genre_masks import filter_titles_by_genres
 from reviews.models import Title
+from reviews.search import filter_titles_by_name
+
+from .pagination import CountedRows
 
 
 class ListCreateDestroy(mixins.ListModelMixin,
@@ -10,13 +23,137 @@ class ListCreateDestroy(mixins.ListModelMixin,
     pass
 
 
+class BulkUpsertMixin:
+    """Массовое создание и обновление через POST списка на .../bulk/.
+
+    Объекты проверяются вместе и записываются одной транзакцией,
+    в ответе - результат для каждого объекта в порядке запроса.
+    По умолчанию объекты создаются или обновляются по slug.
+    """
+
+    bulk_serializer_class = None
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        if not isinstance(request.data, list):
+            return Response(
+                {'detail': 'Ожидается список объектов.'},
+                status=HTTPStatus.BAD_REQUEST
+            )
+        if len(request.data) > settings.BULK_MAX_ITEMS:
+            return Response(
+                {'detail': f'Не больше {settings.BULK_MAX_ITEMS} объектов '
+                           'за запрос.'},
+                status=HTTPStatus.BAD_REQUEST
+            )
+        serializer = self.bulk_serializer_class(data=request.data, many=True)
+        with transaction.atomic():
+            serializer.is_valid(raise_exception=True)
+            results = self.perform_bulk_upsert(serializer.validated_data)
+        return Response(results)
+
+    def perform_bulk_upsert(self, rows):
+        statuses = upsert_by_slug(self.queryset.model, rows)
+        return [
+            {'slug': row['slug'], 'status': status}
+            for row, status in zip(rows, statuses)
+        ]
+
+
+class ValuesReadMixin:
+    """list и retrieve из строк .values() без сериализаторов DRF.
+
+    representation_class собирает ответ того же вида, что и
+    сериализатор чтения; запись по-прежнему идет через сериализаторы.
+    """
+
+    representation_class = None
+
+    def get_representation(self):
+        return self.representation_class()
+
+    def get_read_queryset(self, representation):
+        return representation.get_values(
+            self.filter_queryset(self.get_queryset())
+        )
+
+    def list(self, request, *args, **kwargs):
+        representation = self.get_representation()
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = representation.get_values(queryset)
+        page = self.paginate_queryset(CountedRows(rows, queryset))
+        if page is not None:
+            return self.get_paginated_response(
+                representation.represent(page)
+            )
+        return Response(representation.represent(rows))
+
+    def retrieve(self, request, *args, **kwargs):
+        representation = self.get_representation()
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = get_object_or_404(
+            self.get_read_queryset(representation),
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        )
+        self.check_object_permissions(request, row)
+        return Response(representation.represent([row])[0])
+
+
+class IndexedOrderingFilter(django_filters.OrderingFilter):
+    """Сортировка с добавлением id в направлении последнего поля.
+
+    id делает порядок однозначным для пагинации, а одно направление
+    всех полей позволяет читать индекс (поле, id) и в прямом,
+    и в обратном порядке.
+    """
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        ordering = [self.get_ordering_value(param) for param in value]
+        ordering.append('-id' if ordering[-1].startswith('-') else 'id')
+        return qs.order_by(*ordering)
+
+
 class TitleFilter(django_filters.FilterSet):
-    genre = django_filters.CharFilter(field_name='genre__slug')
+    # Несколько жанров через запятую: genre_match=all - все сразу,
+    # any (по умолчанию) - любой из них
+    genre = django_filters.CharFilter(method='filter_genre')
+    genre_match = django_filters.ChoiceFilter(
+        choices=(('any', 'any'), ('all', 'all')), method='filter_nothing'
+    )
     category = django_filters.CharFilter(field_name='category__slug')
 
-    name = django_filters.CharFilter(field_name='name', lookup_expr='contains')
+    name = django_filters.CharFilter(method='filter_name')
     year = django_filters.NumberFilter(field_name='year')
+    # rating - показанная средняя оценка, weighted_rating - взвешенный
+    # рейтинг; у произведений без отзывов оба равны 0
+    ordering = IndexedOrderingFilter(fields=(
+        ('year', 'year'),
+        ('name', 'name'),
+        ('pub_date', 'pub_date'),
+        ('mean_rating', 'rating'),
+        ('weighted_rating', 'weighted_rating'),
+    ))
+
+    def filter_genre(self, queryset, name, value):
+        """Проверка по маске жанров произведения, без JOIN"""
+        slugs = [slug for slug in value.split(',') if slug]
+        if not slugs:
+            return queryset
+        return filter_titles_by_genres(
+            queryset, slugs,
+            match_all=self.form.cleaned_data.get('genre_match') == 'all',
+        )
+
+    def filter_nothing(self, queryset, name, value):
+        """Параметр учитывается другим фильтром"""
+        return queryset
+
+    def filter_name(self, queryset, name, value):
+        """Поиск по подстроке без учета регистра через индекс"""
+        return filter_titles_by_name(queryset, value)
 
     class Meta:
         model = Title
-        fields = ('genre', 'category', 'name', 'year')
+        fields = ('genre', 'genre_match', 'category', 'name', 'year')
@@ -1,32 +1,63 @@
 from http import HTTPStatus
 
-from django.db.models import Avg
+from django.conf import settings
 from django.contrib.auth.tokens import default_token_generator
-from django.core.mail import send_mail
+from django.db import transaction
+from django.http import (FileResponse, Http404, HttpResponse,
+                         StreamingHttpResponse)
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters, generics, viewsets
+from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
-from reviews.models import Category, Genre, Review, Title
+from reviews.bulk import upsert_titles
+from reviews.export import EXPORT_FORMATS, export_titles
+from reviews.models import (Category, CategoryStats, Comment, Genre,
+                            GenreStats, Review, Title)
+from reviews.search import autocomplete_titles, text_search
 from users.models import User
-
-from .permissions import (AuthorModeratorOrReadOnly,
-                          IsAdminOrSuperUser,
-                          IsAdminOrReadOnly)
-from .serializers import (CategorySerializer, CommentSerializer,
-                          GenreSerializer, ReviewSerializer,
-                          SelfUserSerializer, TitleSerializer,
+from users.outbox import enqueue_email
+
+from .authentication import access_token_for
+from .cache import CachedResponseMixin, ConditionalGetMixin
+from .metrics import registry
+from .pagination import OptionalCursorPagination
+from .permissions import (AuthorModeratorOrReadOnly, IsAdminOrReadOnly,
+                          IsAdminOrSuperUser)
+from .profiling import list_profile_ids, load_profile_meta, profile_path
+from .representations import (CommentRepresentation, ReviewRepresentation,
+                              TitleHistogramRepresentation,
+                              TitleRepresentation, TopTitleRepresentation)
+from .serializers import (CategoryBulkSerializer, CategorySerializer,
+                          CategoryStatsSerializer, CommentSearchSerializer,
+                          CommentSerializer, GenreBulkSerializer,
+                          GenreSerializer, GenreStatsSerializer,
+                          ReviewSearchSerializer, ReviewSerializer,
+                          SelfUserSerializer, TextSearchQuerySerializer,
+                          TitleAutocompleteSerializer, TitleBulkSerializer,
+                          TitleHistogramSerializer, TitleSerializer,
                           TitleSerializerDetail, TokenSerializer,
                           UserSerializer)
-from .utils import ListCreateDestroy, TitleFilter
+from .utils import (BulkUpsertMixin, ListCreateDestroy, TitleFilter,
+                    ValuesReadMixin)
+
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 50
+TOP_LIMIT = 10
+TOP_MAX_LIMIT = 100
 
 
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(ConditionalGetMixin, ValuesReadMixin,
+                    viewsets.ModelViewSet):
     serializer_class = ReviewSerializer
+    representation_class = ReviewRepresentation
     permission_classes = (AuthorModeratorOrReadOnly,)
+    pagination_class = OptionalCursorPagination
+
+    def get_cache_resources(self):
+        return ('users', 'reviews', f'reviews:{self.kwargs["title_id"]}')
 
     def get_title(self):
         return get_object_or_404(Title, pk=self.kwargs['title_id'])
@@ -38,9 +69,15 @@ class ReviewViewSet(viewsets.ModelViewSet):
         serializer.save(author=self.request.user, title_id=self.get_title().pk)
 
 
-class CommentViewSet(viewsets.ModelViewSet):
+class CommentViewSet(ConditionalGetMixin, ValuesReadMixin,
+                     viewsets.ModelViewSet):
     serializer_class = CommentSerializer
+    representation_class = CommentRepresentation
     permission_classes = (AuthorModeratorOrReadOnly,)
+    pagination_class = OptionalCursorPagination
+
+    def get_cache_resources(self):
+        return ('users', 'comments', f'comments:{self.kwargs["review_id"]}')
 
     def get_review(self):
         return get_object_or_404(
@@ -53,10 +90,7 @@ class CommentViewSet(viewsets.ModelViewSet):
         return self.get_review().comments.select_related('author', 'review')
 
     def perform_create(self, serializer):
-        serializer.save(
-            author=self.request.user,
-            review_id=self.get_review().pk
-        )
+        serializer.save(author=self.request.user, review=self.get_review())
 
 
 class UserViewSet(viewsets.ModelViewSet):
@@ -107,26 +141,28 @@ class UserAuthViewSet(generics.CreateAPIView):
         email = request.data.get('email')
         username = request.data.get('username')
         # Проверка на то, что пользователь уже зарегистрирован
-        user = User.objects.filter(username=username, email=email)
-        if not user.exists():
+        user = User.objects.filter(username=username, email=email).first()
+        serializer = None
+        if user is None:
             serializer = UserSerializer(data=request.data)
             if not serializer.is_valid():
                 return Response(
                     serializer.errors,
                     status=HTTPStatus.BAD_REQUEST
                 )
-            serializer.save()
-            user = get_object_or_404(User, username=username, email=email)
-        else:
-            user = user[0]
-        confirmation_code = default_token_generator.make_token(user)
-        send_mail(
-            'Код подтверждения',
-            f'Ваш токен: {confirmation_code}',
-            'auth@yamdb.com',
-            [email],
-            fail_silently=False,
-        )
+        # Пользователь и письмо с кодом сохраняются вместе, отправкой
+        # занимается команда send_outbox. Проверки выполнены до начала
+        # транзакции: в SQLite транзакция, начатая чтением, не может
+        # дождаться блокировки на запись при конкурентных регистрациях
+        with transaction.atomic():
+            if serializer is not None:
+                user = serializer.save()
+            confirmation_code = default_token_generator.make_token(user)
+            enqueue_email(
+                'Код подтверждения',
+                f'Ваш токен: {confirmation_code}',
+                email,
+            )
         return Response(
             {'username': username, 'email': email},
             status=HTTPStatus.OK
@@ -149,7 +185,7 @@ class UserVerifyToken(generics.CreateAPIView):
 
         if default_token_generator.check_token(user, confirmation_code):
             return Response(
-                {'token': str(RefreshToken.for_user(user).access_token)},
+                {'token': str(access_token_for(user))},
                 status=HTTPStatus.OK
             )
         return Response(
@@ -158,44 +194,237 @@ class UserVerifyToken(generics.CreateAPIView):
         )
 
 
-class GenreViewSet(ListCreateDestroy):
+class StatsView(APIView):
+    """Число произведений, отзывов и средняя оценка по жанрам и категориям.
+
+    Читается из таблиц сводок, которые поддерживает reviews.stats,
+    поэтому стоимость зависит от числа групп, а не отзывов.
+    """
+    permission_classes = (AllowAny,)
+
+    def get(self, request):
+        return Response({
+            'genres': GenreStatsSerializer(
+                GenreStats.objects.select_related('genre'), many=True
+            ).data,
+            'categories': CategoryStatsSerializer(
+                CategoryStats.objects.select_related('category'), many=True
+            ).data,
+        })
+
+
+class MetricsView(APIView):
+    """Метрики запросов по маршрутам в формате Prometheus"""
+    permission_classes = (IsAdminOrSuperUser,)
+
+    def get(self, request):
+        return HttpResponse(
+            registry.render(),
+            content_type='text/plain; version=0.0.4; charset=utf-8'
+        )
+
+
+class ProfileViewSet(viewsets.ViewSet):
+    """Сохраненные профили запросов: список, файл .prof и SQL"""
+    permission_classes = (IsAdminOrSuperUser,)
+    lookup_value_regex = r'\d+-[\w-]+'
+
+    def get_meta(self, pk):
+        meta = load_profile_meta(pk)
+        if meta is None:
+            raise Http404
+        return meta
+
+    def list(self, request):
+        profiles = []
+        for profile_id in list_profile_ids():
+            meta = load_profile_meta(profile_id)
+            if meta is not None:
+                meta['queries'] = len(meta['queries'])
+                profiles.append(meta)
+        return Response(profiles)
+
+    def retrieve(self, request, pk=None):
+        """Профиль для pstats или snakeviz"""
+        self.get_meta(pk)
+        try:
+            file = open(profile_path(pk, 'prof'), 'rb')
+        except FileNotFoundError:
+            raise Http404
+        return FileResponse(file, as_attachment=True, filename=f'{pk}.prof')
+
+    @action(detail=True)
+    def sql(self, request, pk=None):
+        return Response(self.get_meta(pk)['queries'])
+
+
+class GenreViewSet(ConditionalGetMixin, CachedResponseMixin,
+                   BulkUpsertMixin, ListCreateDestroy):
     """Viewset для модели Genre"""
+    cache_resources = ('genres',)
     queryset = Genre.objects.all()
     serializer_class = GenreSerializer
+    bulk_serializer_class = GenreBulkSerializer
     filter_backends = [filters.SearchFilter]
     search_fields = ('name',)
     lookup_field = 'slug'
     permission_classes = (IsAdminOrReadOnly,)
 
 
-class TitleViewSet(viewsets.ModelViewSet):
+class TitleViewSet(ConditionalGetMixin, CachedResponseMixin,
+                   BulkUpsertMixin, ValuesReadMixin, viewsets.ModelViewSet):
     """Viewset для модели Title"""
+    cache_resources = ('titles',)
     queryset = Title.objects.all()
     serializer_class = TitleSerializer
+    representation_class = TitleRepresentation
+    bulk_serializer_class = TitleBulkSerializer
     filter_backends = (DjangoFilterBackend,)
     lookup_field = 'id'
     filterset_class = TitleFilter
     permission_classes = (IsAdminOrReadOnly,)
 
     def get_serializer_class(self):
-        if self.action in ('retrieve', 'list'):
+        if self.action == 'retrieve' or self.includes_histogram():
+            return TitleHistogramSerializer
+        if self.action == 'list':
             return TitleSerializerDetail
         return TitleSerializer
 
+    def includes_histogram(self):
+        """Гистограмма оценок в списке - по ?include=score_histogram"""
+        return self.action == 'list' and 'score_histogram' in (
+            self.request.query_params.get('include', '').split(',')
+        )
+
+    def get_representation(self):
+        if self.action == 'retrieve' or self.includes_histogram():
+            return TitleHistogramRepresentation()
+        return super().get_representation()
+
+    def get_cache_params(self):
+        return super().get_cache_params() | {'include'}
+
     def get_queryset(self):
-        if self.action in ('retrieve', 'list'):
-            return Title.objects.select_related('category') \
-                .prefetch_related('genre') \
-                .annotate(rating=Avg('reviews__score'))
         return Title.objects.select_related(
             'category').prefetch_related('genre')
 
+    @action(detail=False, pagination_class=None)
+    def autocomplete(self, request):
+        """Подсказки названий по префиксу ?q= без учета регистра"""
+        try:
+            limit = int(request.query_params.get('limit', AUTOCOMPLETE_LIMIT))
+        except ValueError:
+            limit = AUTOCOMPLETE_LIMIT
+        limit = min(max(limit, 1), AUTOCOMPLETE_MAX_LIMIT)
+        titles = autocomplete_titles(
+            Title.objects.only('id', 'name', 'year'),
+            request.query_params.get('q', ''),
+            limit,
+        )
+        return Response(TitleAutocompleteSerializer(titles, many=True).data)
+
+    @action(detail=False, pagination_class=None)
+    def top(self, request):
+        """Лучшие произведения по взвешенному рейтингу, ?limit= до 100.
+
+        Поддерживает фильтры списка произведений. Рейтинг хранится
+        в произведении и проиндексирован, поэтому читаются только
+        первые limit строк индекса, а не весь каталог.
+        """
+        try:
+            limit = int(request.query_params.get('limit', TOP_LIMIT))
+        except ValueError:
+            limit = TOP_LIMIT
+        limit = min(max(limit, 1), TOP_MAX_LIMIT)
+        titles = self.filter_queryset(
+            Title.objects.filter(weighted_rating__gt=0)
+        ).order_by('-weighted_rating', '-pk')
+        representation = TopTitleRepresentation()
+        return Response(representation.represent(
+            representation.get_values(titles)[:limit]
+        ))
+
+    @action(detail=False, pagination_class=None,
+            permission_classes=(IsAdminOrSuperUser,))
+    def export(self, request):
+        """Выгрузка всего каталога потоком в NDJSON или CSV (?type=csv).
+
+        Поддерживает те же фильтры, что и список произведений.
+        """
+        export_format = request.query_params.get('type', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {'type': [f'Допустимые значения: '
+                          f'{", ".join(EXPORT_FORMATS)}.']},
+                status=HTTPStatus.BAD_REQUEST
+            )
+        content, content_type = export_titles(
+            self.filter_queryset(Title.objects.all()),
+            export_format,
+            settings.EXPORT_CHUNK_SIZE,
+        )
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename="titles.{export_format}"'
+        )
+        return response
+
+    def perform_bulk_upsert(self, rows):
+        return [
+            {'id': title.pk, 'status': status}
+            for title, status in upsert_titles(rows)
+        ]
+
 
-class CategoryViewSet(ListCreateDestroy):
+class CategoryViewSet(ConditionalGetMixin, CachedResponseMixin,
+                      BulkUpsertMixin, ListCreateDestroy):
     """Viewset для модели Category"""
+    cache_resources = ('categories',)
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    bulk_serializer_class = CategoryBulkSerializer
     filter_backends = [filters.SearchFilter]
     search_fields = ('name',)
     lookup_field = 'slug'
     permission_classes = (IsAdminOrReadOnly,)
+
+
+class TextSearchViewSet(viewsets.GenericViewSet):
+    """Полнотекстовый поиск по отзывам и комментариям"""
+    permission_classes = (AllowAny,)
+    pagination_class = None
+
+    def search(self, queryset, serializer_class, title_lookup):
+        params = TextSearchQuerySerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        params = params.validated_data
+        filters = {}
+        if 'title' in params:
+            filters[title_lookup] = params['title']
+        if 'author' in params:
+            filters['author__username'] = params['author']
+        if 'date_from' in params:
+            filters['pub_date__gte'] = params['date_from']
+        if 'date_to' in params:
+            filters['pub_date__lte'] = params['date_to']
+        queryset = text_search(queryset.filter(**filters), params['q'])
+        return Response(
+            serializer_class(queryset[:params['limit']], many=True).data
+        )
+
+    @action(detail=False)
+    def reviews(self, request):
+        return self.search(
+            Review.objects.select_related('author'),
+            ReviewSearchSerializer,
+            'title_id',
+        )
+
+    @action(detail=False)
+    def comments(self, request):
+        return self.search(
+            Comment.objects.select_related('author', 'review'),
+            CommentSearchSerializer,
+            'review__title_id',
+        )
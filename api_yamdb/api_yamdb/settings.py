@@ -1,4 +1,5 @@
 import os
+import tempfile
 from datetime import timedelta
 
 from dotenv import load_dotenv
@@ -37,6 +38,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.ServerTimingMiddleware',
+    'api.middleware.ProfilingMiddleware',
+    'api.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -80,6 +84,89 @@ DATABASES = {
     }
 }
 
+# Реплика только для чтения включается переменной DB_REPLICA_HOST
+# (для SQLite - DB_REPLICA_NAME), остальные параметры - как у основной БД
+if os.getenv('DB_REPLICA_HOST') or os.getenv('DB_REPLICA_NAME'):
+    DATABASES['replica'] = dict(
+        DATABASES['default'],
+        NAME=os.getenv('DB_REPLICA_NAME', default=DATABASES['default']['NAME']),
+        HOST=os.getenv('DB_REPLICA_HOST', default=DATABASES['default']['HOST']),
+        PORT=os.getenv('DB_REPLICA_PORT', default=DATABASES['default']['PORT']),
+    )
+
+# Алиасы реплик, на которые уходят чтения безопасных запросов API
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != 'default']
+
+DATABASE_ROUTERS = ['api.db_router.ReplicaRouter']
+
+# Сколько секунд после записи пользователь читает из основной БД,
+# оно же - допустимое отставание реплики
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', default=5))
+
+# Email
+
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
+
+# Очередь писем: размер пачки, число попыток и пауза перед первым
+# повтором, сек (дальше пауза удваивается)
+EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv('EMAIL_OUTBOX_BATCH_SIZE', default=100))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv('EMAIL_OUTBOX_MAX_ATTEMPTS', default=5))
+EMAIL_OUTBOX_RETRY_DELAY = int(os.getenv('EMAIL_OUTBOX_RETRY_DELAY', default=60))
+
+# Cache
+
+# Кэш общий для всех процессов: в нем поколения ресурсов для кэша ответов
+# и ETag. Файловый кэш общий для воркеров и команд на одном сервере, для
+# нескольких серверов нужен Redis или Memcached. С кэшем в памяти процесса
+# (LocMemCache) кэш ответов и ETag отключаются
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=os.path.join(tempfile.gettempdir(), 'yamdb-cache')),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', default=10000)),
+        },
+    }
+}
+
+# Время жизни закэшированных ответов API, сек
+API_CACHE_TIMEOUT = int(os.getenv('API_CACHE_TIMEOUT', default=300))
+
+# Наибольшее число объектов в запросе массовой записи
+BULK_MAX_ITEMS = int(os.getenv('BULK_MAX_ITEMS', default=5000))
+
+# Сколько отзывов весит средняя оценка каталога во взвешенном рейтинге
+RANKING_MIN_REVIEWS = int(os.getenv('RANKING_MIN_REVIEWS', default=10))
+
+# Число произведений, читаемых из курсора за раз при выгрузке каталога
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', default=2000))
+
+# Отдавать ли время БД, представления и рендеринга в заголовке Server-Timing
+SERVER_TIMING_HEADER = os.getenv('SERVER_TIMING_HEADER', default='True') == 'True'
+
+# Профилирование запросов: заголовок администратора, доли выборки по
+# маршрутам ("title-list:0.01,reviews-list:0.05") и кольцо .prof-файлов
+PROFILE_HEADER = os.getenv('PROFILE_HEADER', default='X-Profile')
+PROFILE_SAMPLE_RATES = {
+    route: float(rate)
+    for route, rate in (
+        item.split(':') for item in os.getenv('PROFILE_SAMPLE_RATES', default='').split(',') if item
+    )
+}
+PROFILE_DIR = os.getenv('PROFILE_DIR', default=os.path.join(tempfile.gettempdir(), 'yamdb-profiles'))
+PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES', default=20))
+
+# Время жизни пользователя в кэше процесса, сек
+USER_CACHE_TIMEOUT = int(os.getenv('USER_CACHE_TIMEOUT', default=30))
+# Время жизни версии токенов и прав пользователя в общем кэше, сек:
+# столько действуют права после изменения в обход save()
+AUTH_CACHE_TIMEOUT = int(os.getenv('AUTH_CACHE_TIMEOUT', default=10))
+
+# Конфигурация PostgreSQL для полнотекстового поиска по отзывам
+FULL_TEXT_SEARCH_CONFIG = os.getenv('FULL_TEXT_SEARCH_CONFIG', default='russian')
+# Сколько самых новых совпадений ранжирует полнотекстовый поиск
+TEXT_SEARCH_CANDIDATES = int(os.getenv('TEXT_SEARCH_CANDIDATES', default=1000))
+
 # Password validation
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -99,12 +186,15 @@ AUTH_PASSWORD_VALIDATORS = [
 
 AUTH_USER_MODEL = 'users.User'
 
+# Тесты работают с отдельным файловым кэшем в каждом запуске
+TEST_RUNNER = 'api.tests.runner.TestRunner'
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        os.getenv('JWT_AUTHENTICATION', default='api.authentication.ClaimsJWTAuthentication'),
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 5,
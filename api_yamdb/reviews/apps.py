@@ -3,3 +3,12 @@ from django.apps import AppConfig
 
 class ReviewsConfig(AppConfig):
     name = 'reviews'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+
+        from . import signals  # noqa: F401
+        from .genre_masks import install_genre_masks
+        from .search import install_search_indexes
+        post_migrate.connect(install_search_indexes, sender=self)
+        post_migrate.connect(install_genre_masks, sender=self)
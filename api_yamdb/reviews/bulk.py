@@ -0,0 +1,231 @@
+import csv
+import io
+from itertools import islice
+
+from django.apps import apps
+from django.core.management.color import no_style
+from django.db import connection
+
+from .models import GenreTitle, Title
+from .signals import bulk_changed
+
+COPY_NULL = '\\N'
+
+
+def use_copy():
+    """COPY доступен только на PostgreSQL"""
+    return connection.vendor == 'postgresql'
+
+
+def insert_objects(model, objects, batch_size, copy=False, progress=None):
+    """Вставляет объекты из итератора пачками по batch_size.
+
+    Итератор читается лениво, поэтому в памяти одновременно находится
+    не больше одной пачки. progress вызывается с числом вставленных строк
+    после каждой пачки. Возвращает общее число строк.
+    """
+    objects = iter(objects)
+    inserted = 0
+    while True:
+        batch = list(islice(objects, batch_size))
+        if not batch:
+            return inserted
+        if copy:
+            copy_objects(model, batch)
+        else:
+            model.objects.bulk_create(batch)
+        inserted += len(batch)
+        if progress is not None:
+            progress(inserted)
+
+
+def copy_objects(model, batch):
+    """Вставляет пачку объектов через COPY ... FROM STDIN"""
+    fields = model._meta.concrete_fields
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for obj in batch:
+        values = []
+        for field in fields:
+            value = field.get_db_prep_save(
+                field.pre_save(obj, add=True), connection
+            )
+            values.append(COPY_NULL if value is None else value)
+        writer.writerow(values)
+    buffer.seek(0)
+    quote = connection.ops.quote_name
+    sql = "COPY {} ({}) FROM STDIN WITH (FORMAT csv, NULL '{}')".format(
+        quote(model._meta.db_table),
+        ', '.join(quote(field.column) for field in fields),
+        COPY_NULL,
+    )
+    with connection.cursor() as cursor:
+        cursor.copy_expert(sql, buffer)
+
+
+def referencing_models(models):
+    """Модели и все модели, ссылающиеся на них внешними ключами"""
+    found = set(models)
+    candidates = apps.get_models(include_auto_created=True)
+    changed = True
+    while changed:
+        changed = False
+        for model in candidates:
+            if model not in found and any(
+                field.related_model in found
+                for field in model._meta.concrete_fields
+                if field.is_relation
+            ):
+                found.add(model)
+                changed = True
+    return found
+
+
+def truncate_tables(models):
+    """Удаляет все строки моделей без сигналов.
+
+    Строки, ссылающиеся на них (сводки, журнал админки, связи
+    пользователей с группами), удаляются тоже. На PostgreSQL это
+    TRUNCATE, на SQLite - DELETE.
+    """
+    tables = sorted(
+        model._meta.db_table for model in referencing_models(models)
+    )
+    statements = connection.ops.sql_flush(no_style(), tables, ())
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def reset_sequences(models):
+    """Сдвигает последовательности pk после вставки явных id"""
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def update_objects(model, objects, field_names, batch_size=None):
+    """bulk_update, который заполняет поля через pre_save.
+
+    Сам bulk_update pre_save не вызывает, и без этого не обновились бы
+    auto_now-поля и производные поля вроде search_name.
+    """
+    fields = [model._meta.get_field(name) for name in field_names]
+    for obj in objects:
+        for field in fields:
+            setattr(obj, field.attname, field.pre_save(obj, add=False))
+    model.objects.bulk_update(objects, field_names, batch_size)
+
+
+def create_objects(model, objects, batch_size=None):
+    """bulk_create, после которого у объектов заполнены pk.
+
+    Бэкенды, которые не возвращают id из пакетной вставки (SQLite),
+    сохраняют объекты по одному.
+    """
+    if connection.features.can_return_ids_from_bulk_insert:
+        model.objects.bulk_create(objects, batch_size)
+        return
+    for obj in objects:
+        obj.save(force_insert=True)
+
+
+def resolve_slugs(model, slugs):
+    """Словарь slug -> id для всех найденных slug одним запросом"""
+    return dict(
+        model.objects.filter(slug__in=set(slugs)).values_list('slug', 'id')
+    )
+
+
+def upsert_by_slug(model, rows):
+    """Создает и обновляет объекты по slug.
+
+    Возвращает статус каждой строки: created, updated или unchanged.
+    """
+    existing = model.objects.in_bulk(
+        [row['slug'] for row in rows], field_name='slug'
+    )
+    created, updated, statuses = [], [], []
+    for row in rows:
+        obj = existing.get(row['slug'])
+        if obj is None:
+            created.append(model(**row))
+            statuses.append('created')
+            continue
+        changed = {
+            name for name, value in row.items() if getattr(obj, name) != value
+        }
+        if not changed:
+            statuses.append('unchanged')
+            continue
+        for name in changed:
+            setattr(obj, name, row[name])
+        updated.append(obj)
+        statuses.append('updated')
+    model.objects.bulk_create(created)
+    if updated:
+        update_objects(model, updated, sorted(
+            {name for row in rows for name in row} - {'slug'}
+        ))
+    if created or updated:
+        bulk_changed.send(sender=model)
+    return statuses
+
+
+def upsert_titles(rows):
+    """Создает и обновляет произведения вместе с жанрами.
+
+    Строка содержит instance (существующее произведение или None),
+    fields - значения полей Title и genre_ids. Связи с жанрами
+    у обновленных произведений заменяются: лишние удаляются,
+    недостающие добавляются.
+    Возвращает пары (произведение, статус).
+    """
+    created, updated, results = [], [], []
+    category_ids = set()
+    for row in rows:
+        title = row['instance']
+        if title is None:
+            title = Title(**row['fields'])
+            created.append(title)
+            results.append((title, 'created'))
+            continue
+        category_ids.add(
+            getattr(title, '_loaded_values', {}).get('category_id')
+        )
+        for name, value in row['fields'].items():
+            setattr(title, name, value)
+        updated.append(title)
+        results.append((title, 'updated'))
+    create_objects(Title, created)
+    if updated:
+        update_objects(Title, updated, (
+            'name', 'search_name', 'year', 'description', 'category',
+            'pub_date',
+        ))
+
+    wanted = {
+        (title.pk, genre_id)
+        for (title, _), row in zip(results, rows)
+        for genre_id in row['genre_ids']
+    }
+    current = {
+        (title_id, genre_id): pk
+        for pk, title_id, genre_id in GenreTitle.objects.filter(
+            title__in=updated
+        ).values_list('pk', 'title_id', 'genre_id')
+    } if updated else {}
+    removed = [pk for pair, pk in current.items() if pair not in wanted]
+    if removed:
+        GenreTitle.objects.filter(pk__in=removed).delete()
+    GenreTitle.objects.bulk_create(
+        GenreTitle(title_id=title_id, genre_id=genre_id)
+        for title_id, genre_id in wanted - current.keys()
+    )
+    bulk_changed.send(
+        sender=Title, pks=[title.pk for title, _ in results],
+        genre_ids={genre_id for _, genre_id in current},
+        category_ids=category_ids - {None},
+    )
+    return results
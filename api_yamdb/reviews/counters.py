@@ -0,0 +1,88 @@
+from django.db.models import (Count, IntegerField, Max, OuterRef, Q,
+                              Subquery, Sum)
+from django.db.models.functions import Coalesce
+
+from .models import SCORES, Comment, Review, Title
+from .ranking import update_weighted_ratings
+
+# Поля произведения, которые пересчитывает update_title_counters
+TITLE_COUNTER_FIELDS = (
+    'reviews_count', 'score_sum', 'weighted_rating', 'mean_rating',
+) + Title.HISTOGRAM_FIELDS
+
+
+def review_aggregate(aggregate):
+    """Подзапрос с агрегатом по отзывам текущего произведения"""
+    return Coalesce(
+        Subquery(
+            Review.objects.filter(title=OuterRef('pk'))
+            .order_by()
+            .values('title')
+            .annotate(value=aggregate)
+            .values('value'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def update_title_counters(title_ids=None):
+    """Пересчитывает количество отзывов, сумму и гистограмму оценок.
+
+    Без аргументов пересчитывает весь каталог, иначе только
+    произведения с переданными id. Взвешенный рейтинг считается
+    от сохраненной средней оценки каталога. Возвращает число
+    обновленных строк.
+    """
+    titles = Title.objects.all()
+    if title_ids is not None:
+        titles = titles.filter(pk__in=title_ids)
+    updated = titles.update(
+        reviews_count=review_aggregate(Count('pk')),
+        score_sum=review_aggregate(Sum('score')),
+        **{
+            f'scores_{score}': review_aggregate(
+                Count('pk', filter=Q(score=score))
+            )
+            for score in SCORES
+        }
+    )
+    if updated:
+        update_weighted_ratings(titles)
+    return updated
+
+
+def last_comment_date():
+    """Подзапрос с датой последнего комментария текущего отзыва"""
+    return Subquery(
+        Comment.objects.filter(review=OuterRef('pk'))
+        .order_by()
+        .values('review')
+        .annotate(value=Max('pub_date'))
+        .values('value')
+    )
+
+
+def update_review_counters(review_ids=None):
+    """Пересчитывает число и дату последнего комментария отзывов.
+
+    Без аргументов пересчитывает все отзывы. Возвращает число
+    обновленных строк.
+    """
+    reviews = Review.objects.all()
+    if review_ids is not None:
+        reviews = reviews.filter(pk__in=review_ids)
+    return reviews.update(
+        comment_count=Coalesce(
+            Subquery(
+                Comment.objects.filter(review=OuterRef('pk'))
+                .order_by()
+                .values('review')
+                .annotate(value=Count('pk'))
+                .values('value'),
+                output_field=IntegerField(),
+            ),
+            0,
+        ),
+        last_comment_at=last_comment_date(),
+    )
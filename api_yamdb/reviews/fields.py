@@ -0,0 +1,27 @@
+from django.db import models
+
+from .search import normalize
+
+
+class SearchNameField(models.CharField):
+    """Нормализованная копия поля source для поиска без учета регистра.
+
+    Значение вычисляется в pre_save, поэтому заполняется и при
+    bulk_create, и при загрузке через COPY.
+    """
+
+    def __init__(self, *args, source=None, **kwargs):
+        self.source = source
+        kwargs.setdefault('editable', False)
+        kwargs.setdefault('default', '')
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['source'] = self.source
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        value = normalize(getattr(model_instance, self.source))
+        setattr(model_instance, self.attname, value)
+        return value
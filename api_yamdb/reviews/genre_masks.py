@@ -0,0 +1,117 @@
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import BigIntegerField, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Genre, GenreTitle, Title
+
+# Знаковый BIGINT вмещает 63 жанра, остальные фильтруются через JOIN
+MASK_BITS = 63
+
+
+def free_masks():
+    """Незанятые биты жанров по возрастанию.
+
+    Бит удаленного жанра снова свободен: при удалении он снимается
+    со всех произведений.
+    """
+    used = set(
+        Genre.objects.filter(mask__isnull=False)
+        .values_list('mask', flat=True)
+    )
+    return (1 << bit for bit in range(MASK_BITS) if 1 << bit not in used)
+
+
+def assign_genre_masks():
+    """Выдает свободные биты жанрам без бита и обновляет их произведения.
+
+    Возвращает число жанров, получивших бит.
+    """
+    genres = list(Genre.objects.filter(mask__isnull=True).order_by('pk'))
+    if not genres:
+        return 0
+    assigned = []
+    for genre, mask in zip(genres, free_masks()):
+        genre.mask = mask
+        assigned.append(genre)
+    if assigned:
+        Genre.objects.bulk_update(assigned, ['mask'])
+        rebuild_genre_masks(GenreTitle.objects.filter(
+            genre__in=assigned
+        ).values('title_id'))
+    return len(assigned)
+
+
+def rebuild_genre_masks(title_ids=None):
+    """Пересчитывает маски жанров произведений одним UPDATE.
+
+    Биты жанров различны, а пара (произведение, жанр) уникальна,
+    поэтому побитовое ИЛИ равно сумме - она есть и в SQLite.
+    Без аргументов пересчитывает весь каталог.
+    """
+    titles = Title.objects.all()
+    if title_ids is not None:
+        titles = titles.filter(pk__in=title_ids)
+    return titles.update(genre_mask=Coalesce(
+        Subquery(
+            GenreTitle.objects.filter(title=OuterRef('pk'))
+            .order_by()
+            .values('title')
+            .annotate(mask=Sum('genre__mask'))
+            .values('mask'),
+            output_field=BigIntegerField(),
+        ),
+        0,
+    ))
+
+
+def clear_genre_mask(mask):
+    """Снимает бит удаленного жанра с произведений"""
+    if mask is not None:
+        Title.objects.annotate(
+            has_genre=F('genre_mask').bitand(mask)
+        ).filter(has_genre=mask).update(
+            genre_mask=F('genre_mask').bitand(~mask)
+        )
+
+
+def filter_titles_by_genres(queryset, slugs, match_all=False):
+    """Произведения со всеми (match_all) или любым из жанров slugs.
+
+    Любой из жанров - один подзапрос к индексу GenreTitle по жанру.
+    Все жанры - подзапрос по самому редкому жанру, остальные
+    проверяются по маске в строке произведения, без JOIN на каждый
+    жанр. Повторяющихся строк в обоих случаях нет.
+    """
+    slugs = set(slugs)
+    if not match_all:
+        return queryset.filter(pk__in=GenreTitle.objects.filter(
+            genre__slug__in=slugs
+        ).values('title_id'))
+    genres = list(
+        Genre.objects.filter(slug__in=slugs)
+        .values_list('pk', 'mask', 'stats__titles_count')
+        .order_by('stats__titles_count', 'pk')
+    )
+    if len(genres) < len(slugs):
+        return queryset.none()
+    (rarest, _, _), rest = genres[0], genres[1:]
+    queryset = queryset.filter(pk__in=GenreTitle.objects.filter(
+        genre_id=rarest
+    ).values('title_id'))
+    mask = sum(value for _, value, _ in rest if value is not None)
+    if mask:
+        queryset = queryset.annotate(
+            genre_match=F('genre_mask').bitand(mask)
+        ).filter(genre_match=mask)
+    for genre_id, value, _ in rest:
+        if value is None:
+            queryset = queryset.filter(pk__in=GenreTitle.objects.filter(
+                genre_id=genre_id
+            ).values('title_id'))
+    return queryset
+
+
+def install_genre_masks(using=DEFAULT_DB_ALIAS, **kwargs):
+    """Выдает биты жанрам, созданным до появления масок"""
+    if using == DEFAULT_DB_ALIAS:
+        assign_genre_masks()
@@ -0,0 +1,93 @@
+import math
+
+from django.db.models import Count, F
+
+from .models import SCORES, Review, Title
+
+# Перцентили оценок в ответе API, в процентах
+PERCENTILES = (25, 75, 90)
+
+
+def histogram_changes(added=None, removed=None):
+    """F()-выражения гистограммы после добавления и удаления оценок"""
+    changes = {}
+    for score, sign in ((added, 1), (removed, -1)):
+        if score is not None:
+            field = f'scores_{score}'
+            changes[field] = changes.get(field, F(field)) + sign
+    return changes
+
+
+def score_at_rank(histogram, rank):
+    """Оценка на месте rank (с 1) в отсортированном списке оценок"""
+    seen = 0
+    for score in SCORES:
+        seen += histogram[score]
+        if seen >= rank:
+            return score
+    return None
+
+
+def score_percentile(histogram, fraction):
+    """Перцентиль оценок методом ближайшего ранга, None без отзывов"""
+    total = sum(histogram.values())
+    if not total:
+        return None
+    return score_at_rank(histogram, max(1, math.ceil(total * fraction)))
+
+
+def score_percentiles(histogram):
+    """Перцентили PERCENTILES с ключами-строками, как в гистограмме"""
+    return {
+        str(percent): score_percentile(histogram, percent / 100)
+        for percent in PERCENTILES
+    }
+
+
+def median_score(histogram):
+    """Медиана оценок: при четном числе - среднее двух средних"""
+    total = sum(histogram.values())
+    if not total:
+        return None
+    return (
+        score_at_rank(histogram, (total + 1) // 2)
+        + score_at_rank(histogram, total // 2 + 1)
+    ) / 2
+
+
+def find_counter_mismatches(chunk_size=1000):
+    """Произведения, счетчики которых расходятся с отзывами.
+
+    Отзывы читаются одним сгруппированным запросом на пачку из
+    chunk_size произведений. Возвращает итератор
+    (id, сохраненные, фактические), где значения - кортеж
+    (reviews_count, score_sum, гистограмма).
+    """
+    fields = ('pk', 'reviews_count', 'score_sum') + Title.HISTOGRAM_FIELDS
+    titles = Title.objects.order_by('pk').values_list(*fields)
+    last_pk = 0
+    while True:
+        chunk = list(titles.filter(pk__gt=last_pk)[:chunk_size])
+        if not chunk:
+            return
+        last_pk = chunk[-1][0]
+        actual = {}
+        for title_id, score, count in Review.objects.filter(
+            title_id__gte=chunk[0][0], title_id__lte=last_pk
+        ).order_by().values_list('title_id', 'score').annotate(
+            count=Count('pk')
+        ):
+            actual.setdefault(title_id, dict.fromkeys(SCORES, 0))[
+                score
+            ] = count
+        for row in chunk:
+            stored_histogram = dict(zip(SCORES, row[3:]))
+            histogram = actual.get(row[0], dict.fromkeys(SCORES, 0))
+            expected = (
+                sum(histogram.values()),
+                sum(score * count for score, count in histogram.items()),
+                histogram,
+            )
+            stored = (row[1], row[2], stored_histogram)
+            if stored != expected:
+                yield row[0], stored, expected
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from reviews.counters import TITLE_COUNTER_FIELDS, update_title_counters
+from reviews.histogram import find_counter_mismatches
+from reviews.models import Title
+from reviews.signals import bulk_changed
+
+
+class Command(BaseCommand):
+    help = ('compare stored review counters and score histograms of titles '
+            'with their reviews')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix', action='store_true',
+            help='recompute counters of mismatched titles',
+        )
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        """Выводит произведения с расхождениями, с --fix пересчитывает их"""
+        mismatched = []
+        for title_id, stored, actual in find_counter_mismatches(
+            options['chunk_size']
+        ):
+            mismatched.append(title_id)
+            self.stdout.write(
+                f'Произведение {title_id}: сохранено {stored}, '
+                f'по отзывам {actual}'
+            )
+        if not mismatched:
+            self.stdout.write('Расхождений нет')
+            return
+        if not options['fix']:
+            raise CommandError(f'Расхождений: {len(mismatched)}')
+        update_title_counters(mismatched)
+        bulk_changed.send(
+            sender=Title, pks=mismatched, fields=TITLE_COUNTER_FIELDS
+        )
+        self.stdout.write(f'Исправлено произведений: {len(mismatched)}')
@@ -0,0 +1,221 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from reviews.bulk import insert_objects, reset_sequences, use_copy
+from reviews.counters import update_title_counters
+from reviews.models import (Category, Comment, Genre, GenreTitle, Review,
+                            Title, current_year)
+from reviews.signals import bulk_changed
+from users.models import User
+
+WORDS = (
+    'война', 'мир', 'тайна', 'город', 'ночь', 'звезда', 'море', 'дорога',
+    'сердце', 'тень', 'время', 'огонь', 'ветер', 'история', 'песня', 'лес',
+    'последний', 'белый', 'черный', 'долгий', 'тихий', 'красный', 'новый',
+    'star', 'night', 'story', 'road', 'dark', 'love', 'river', 'king',
+)
+REVIEW_WORDS = (
+    'отличный', 'скучный', 'сюжет', 'актеры', 'музыка', 'финал', 'герой',
+    'рекомендую', 'шедевр', 'затянуто', 'атмосфера', 'пересматривал',
+    'книга', 'автор', 'фильм', 'режиссер', 'диалоги', 'неожиданно',
+)
+MODELS = (User, Category, Genre, Title, GenreTitle, Review, Comment)
+
+
+class Command(BaseCommand):
+    help = 'generate a synthetic production-like dataset'
+
+    def add_arguments(self, parser):
+        for name, default in (('users', 10000), ('categories', 10),
+                              ('genres', 40), ('titles', 10000),
+                              ('reviews', 100000), ('comments', 100000)):
+            parser.add_argument(f'--{name}', type=int, default=default,
+                                help=f'number of {name} to add')
+        parser.add_argument(
+            '--skew', type=float, default=1.1,
+            help='zipf exponent of title popularity (0 - uniform)',
+        )
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--no-copy', action='store_true',
+            help='use bulk_create instead of COPY on PostgreSQL',
+        )
+
+    def handle(self, *args, **options):
+        """Добавляет к данным в БД синтетический набор данных.
+
+        id задаются явно, начиная со следующего за максимальным, поэтому
+        внешние ключи строятся без чтения вставленных строк. Без новых
+        произведений отзывы добавляются к существующим, без новых
+        отзывов и пользователей комментарии - к существующим.
+        """
+        self.verbosity = options['verbosity']
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.copy = use_copy() and not options['no_copy']
+        if options['users'] < 1 and options['reviews']:
+            raise CommandError('Для отзывов нужен хотя бы один пользователь')
+        if (options['titles'] < 1 and options['reviews']
+                and not Title.objects.exists()):
+            raise CommandError('Для отзывов нужно хотя бы одно произведение')
+
+        with transaction.atomic():
+            self.start = {model: self.next_id(model) for model in MODELS}
+            users = self.insert(User, options['users'], self.users)
+            categories = self.insert(
+                Category, options['categories'], self.categories
+            )
+            genres = self.insert(Genre, options['genres'], self.genres)
+            titles = self.insert(
+                Title, options['titles'], self.titles, categories
+            )
+            self.insert(
+                GenreTitle, options['titles'], self.genre_titles,
+                titles, genres
+            )
+            if options['reviews'] and not titles:
+                titles = self.existing(Title)
+            reviews = self.insert(
+                Review, options['reviews'], self.reviews,
+                titles, users, options['skew']
+            )
+            if options['comments']:
+                self.insert(
+                    Comment, options['comments'], self.comments,
+                    reviews or self.existing(Review),
+                    users or self.existing(User),
+                )
+            reset_sequences(MODELS)
+            update_title_counters()
+            for model in MODELS:
+                bulk_changed.send(sender=model)
+
+    def next_id(self, model):
+        return (model.objects.aggregate(value=Max('pk'))['value'] or 0) + 1
+
+    @staticmethod
+    def existing(model):
+        return list(model.objects.order_by('pk').values_list('pk', flat=True))
+
+    def insert(self, model, count, factory, *args):
+        """Вставляет строки фабрики и возвращает диапазон их id"""
+        started = time.monotonic()
+        first = self.start[model]
+        inserted = insert_objects(
+            model, factory(first, count, *args), self.batch_size,
+            copy=self.copy, progress=self.progress(model.__name__),
+        )
+        elapsed = time.monotonic() - started
+        rate = inserted / elapsed if elapsed else inserted
+        self.stdout.write(
+            f'{model.__name__}: {inserted} строк за {elapsed:.2f} с '
+            f'({rate:.0f} строк/с)'
+        )
+        return range(first, first + inserted)
+
+    def progress(self, name):
+        if self.verbosity < 2:
+            return None
+        return lambda inserted: self.stdout.write(f'{name}: {inserted}')
+
+    def words(self, vocabulary, low, high):
+        return ' '.join(
+            self.random.choice(vocabulary)
+            for _ in range(self.random.randint(low, high))
+        )
+
+    def users(self, first, count):
+        for pk in range(first, first + count):
+            yield User(
+                id=pk, username=f'user{pk}', email=f'user{pk}@yamdb.ru',
+                role='user',
+            )
+
+    def categories(self, first, count):
+        for pk in range(first, first + count):
+            yield Category(
+                id=pk, name=f'Категория {pk}', slug=f'category-{pk}'
+            )
+
+    def genres(self, first, count):
+        for pk in range(first, first + count):
+            yield Genre(id=pk, name=f'Жанр {pk}', slug=f'genre-{pk}')
+
+    def titles(self, first, count, categories):
+        for pk in range(first, first + count):
+            yield Title(
+                id=pk,
+                name=f'{self.words(WORDS, 1, 4).capitalize()} {pk}',
+                year=self.random.randint(1900, current_year),
+                category_id=(
+                    self.random.choice(categories) if categories else None
+                ),
+                description=self.words(REVIEW_WORDS, 5, 30),
+            )
+
+    def genre_titles(self, first, count, titles, genres):
+        pk = first
+        for title_id in titles:
+            if not genres:
+                return
+            for genre_id in self.random.sample(
+                genres, min(len(genres), self.random.randint(1, 3))
+            ):
+                yield GenreTitle(id=pk, title_id=title_id, genre_id=genre_id)
+                pk += 1
+
+    def review_counts(self, titles, users, count, skew):
+        """Распределяет отзывы по произведениям по закону Ципфа.
+
+        Популярность не связана с id: ранги назначаются случайно.
+        Одному произведению достается не больше отзывов, чем
+        пользователей, из-за ограничения unique_title_author; излишек
+        переходит следующим по популярности произведениям.
+        """
+        ranks = list(range(1, len(titles) + 1))
+        self.random.shuffle(ranks)
+        weights = [rank ** -skew for rank in ranks]
+        total = sum(weights)
+        counts = [
+            min(len(users), int(count * weight / total))
+            for weight in weights
+        ]
+        deficit = count - sum(counts)
+        for index in sorted(range(len(ranks)), key=ranks.__getitem__):
+            if deficit <= 0:
+                break
+            extra = min(len(users) - counts[index], deficit)
+            counts[index] += extra
+            deficit -= extra
+        return counts
+
+    def reviews(self, first, count, titles, users, skew):
+        pk = first
+        counts = self.review_counts(titles, users, count, skew)
+        for title_id, title_count in zip(titles, counts):
+            quality = self.random.uniform(3, 9)
+            for author_id in self.random.sample(users, title_count):
+                if pk >= first + count:
+                    return
+                score = round(self.random.gauss(quality, 1.5))
+                yield Review(
+                    id=pk, title_id=title_id, author_id=author_id,
+                    score=min(10, max(1, score)),
+                    text=self.words(REVIEW_WORDS, 3, 40),
+                )
+                pk += 1
+
+    def comments(self, first, count, reviews, users):
+        if not reviews or not users:
+            return
+        for pk in range(first, first + count):
+            yield Comment(
+                id=pk,
+                review_id=self.random.choice(reviews),
+                author_id=self.random.choice(users),
+                text=self.words(REVIEW_WORDS, 2, 20),
+            )
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from reviews.models import RatingPrior, Title
+from reviews.ranking import rebuild_ranking
+from reviews.signals import bulk_changed
+
+
+class Command(BaseCommand):
+    help = 'recompute catalogue mean score and weighted ratings of titles'
+
+    def handle(self, *args, **options):
+        """Пересчитывает взвешенный рейтинг всех произведений"""
+        updated = rebuild_ranking()
+        # Сводки групп и маски жанров от рейтинга не зависят
+        bulk_changed.send(sender=Title, fields=['weighted_rating'])
+        prior = RatingPrior.objects.first()
+        self.stdout.write(
+            f'Средняя оценка: {prior.mean if prior else "нет отзывов"}, '
+            f'обновлено произведений: {updated}'
+        )
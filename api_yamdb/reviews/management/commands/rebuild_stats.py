@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from reviews.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = 'rebuild stored statistics of genres and categories'
+
+    def handle(self, *args, **options):
+        """Пересчитывает статистику всех жанров и категорий"""
+        updated = rebuild_stats()
+        self.stdout.write(f'Обновлено строк статистики: {updated}')
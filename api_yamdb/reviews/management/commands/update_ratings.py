@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from reviews.counters import TITLE_COUNTER_FIELDS, update_title_counters
+from reviews.models import Title
+from reviews.signals import bulk_changed
+
+
+class Command(BaseCommand):
+    help = ('rebuild stored review counters, score histograms and ratings '
+            'of titles')
+
+    def handle(self, *args, **options):
+        """Пересчитывает счетчики и гистограммы отзывов всех произведений"""
+        updated = update_title_counters()
+        bulk_changed.send(sender=Title, fields=TITLE_COUNTER_FIELDS)
+        self.stdout.write(f'Обновлено произведений: {updated}')
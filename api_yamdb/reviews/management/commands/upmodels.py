@@ -1,119 +1,137 @@
 import csv
 import os
+import time
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from reviews.bulk import (insert_objects, reset_sequences, truncate_tables,
+                          use_copy)
+from reviews.counters import update_title_counters
 from reviews.models import Category, Comment, Genre, GenreTitle, Review, Title
+from reviews.signals import bulk_changed
 from users.models import User
 
 from api_yamdb.settings import BASE_DIR
 
+# Порядок загрузки учитывает внешние ключи:
+# (опция, файл по умолчанию, модель, {столбец csv: поле модели})
+TABLES = (
+    ('users', 'users.csv', User, {
+        'id': 'id', 'username': 'username', 'email': 'email',
+        'role': 'role', 'bio': 'bio', 'first_name': 'first_name',
+        'last_name': 'last_name',
+    }),
+    ('category', 'category.csv', Category, {
+        'id': 'id', 'name': 'name', 'slug': 'slug',
+    }),
+    ('genre', 'genre.csv', Genre, {
+        'id': 'id', 'name': 'name', 'slug': 'slug',
+    }),
+    ('titles', 'titles.csv', Title, {
+        'id': 'id', 'name': 'name', 'year': 'year',
+        'category': 'category_id',
+    }),
+    ('genre_title', 'genre_title.csv', GenreTitle, {
+        'id': 'id', 'title_id': 'title_id', 'genre_id': 'genre_id',
+    }),
+    ('review', 'review.csv', Review, {
+        'id': 'id', 'title_id': 'title_id', 'text': 'text',
+        'author': 'author_id', 'score': 'score', 'pub_date': 'pub_date',
+    }),
+    ('comments', 'comments.csv', Comment, {
+        'id': 'id', 'review_id': 'review_id', 'text': 'text',
+        'author': 'author_id', 'pub_date': 'pub_date',
+    }),
+)
+
 
 class Command(BaseCommand):
     help = 'upgrade model data from csv'
 
-    def handle(self, *args, **options):
-        """Вызывает функции для добавление данных в модели"""
-        Command.users_update()
-        Command.category_update()
-        Command.genre_update()
-        Command.title_update()
-        Command.genre_title()
-        Command.review_update()
-        Command.comment_update()
-
-    def users_update():
-        with open(os.path.join(BASE_DIR, 'static/data/users.csv'),
-                  encoding='utf-8') as csv_file:
-            csv_reader = csv.DictReader(csv_file, delimiter=',')
-            for row in csv_reader:
-                id = row['id']
-                username = row['username']
-                email = row['email']
-                role = row['role']
-                bio = row['bio']
-                first_name = row['first_name']
-                last_name = row['last_name']
-                users = User(id=id, username=username, email=email, role=role,
-                             bio=bio, first_name=first_name,
-                             last_name=last_name)
-                users.save()
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--data-dir',
+            default=os.path.join(BASE_DIR, 'static/data'),
+            help='directory with csv files',
+        )
+        for name, filename, model, columns in TABLES:
+            parser.add_argument(
+                f'--{name.replace("_", "-")}',
+                dest=name,
+                help=f'path to csv for {model.__name__} '
+                     f'(default: <data-dir>/{filename})',
+            )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='rows per bulk insert',
+        )
+        parser.add_argument(
+            '--no-copy',
+            action='store_true',
+            help='use bulk_create instead of COPY on PostgreSQL',
+        )
+        parser.add_argument(
+            '--truncate',
+            action='store_true',
+            help='delete existing rows of the imported tables (and rows '
+                 'referencing them) before loading',
+        )
 
-    def title_update():
-        """Добавление данных для модели Title"""
-        with open(os.path.join(BASE_DIR, 'static/data/titles.csv'),
-                  encoding='utf-8') as csv_file:
-            csv_reader = csv.DictReader(csv_file, delimiter=',')
-            for row in csv_reader:
-                id = row['id']
-                name = row['name']
-                year = row['year']
-                category = row['category']
-                title = Title(id=id, name=name, year=year,
-                              category_id=category)
-                title.save()
-
-    def category_update():
-        """Добавление данных для модели Categories"""
-        with open(os.path.join(BASE_DIR, 'static/data/category.csv'),
-                  encoding='utf-8') as csv_file:
-            csv_reader = csv.DictReader(csv_file, delimiter=',')
-            for row in csv_reader:
-                id = row['id']
-                name = row['name']
-                slug = row['slug']
-                category = Category(id=id, name=name, slug=slug)
-                category.save()
-
-    def genre_update():
-        """Добавление данных для модели Genre"""
-        with open(os.path.join(BASE_DIR, 'static/data/genre.csv'),
-                  encoding='utf-8') as csv_file:
-            csv_reader = csv.DictReader(csv_file, delimiter=',')
-            for row in csv_reader:
-                id = row['id']
-                name = row['name']
-                slug = row['slug']
-                genre = Genre(id=id, name=name, slug=slug)
-                genre.save()
+    def handle(self, *args, **options):
+        """Загружает данные всех моделей одной транзакцией"""
+        self.verbosity = options['verbosity']
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля')
+        paths = []
+        for name, filename, model, columns in TABLES:
+            path = options[name] or os.path.join(
+                options['data_dir'], filename
+            )
+            if not os.path.isfile(path):
+                raise CommandError(f'Файл не найден: {path}')
+            paths.append(path)
 
-    def genre_title():
-        """Добавление данных для модели GenreTitle"""
-        with open(os.path.join(BASE_DIR, 'static/data/genre_title.csv'),
-                  encoding='utf-8') as csv_file:
-            csv_reader = csv.DictReader(csv_file, delimiter=',')
-            for row in csv_reader:
-                id = row['id']
-                title_id = row['title_id']
-                genre_id = row['genre_id']
-                title = GenreTitle(id=id, title_id=title_id, genre_id=genre_id)
-                title.save()
+        copy = use_copy() and not options['no_copy']
+        models = [table[2] for table in TABLES]
+        with transaction.atomic():
+            if options['truncate']:
+                truncate_tables(models)
+            for (name, filename, model, columns), path in zip(TABLES, paths):
+                self.load_table(
+                    name, model, columns, path, options['batch_size'], copy
+                )
+            reset_sequences(models)
+            # bulk_create и COPY не вызывают сигналы, счетчики пересчитываем
+            update_title_counters()
+            for name, filename, model, columns in TABLES:
+                bulk_changed.send(sender=model)
 
-    def comment_update():
-        with open(os.path.join(BASE_DIR, 'static/data/comments.csv'),
-                  encoding='utf-8') as csv_file:
-            csv_reader = csv.DictReader(csv_file, delimiter=',')
-            for row in csv_reader:
-                id = row['id']
-                review_id = row['review_id']
-                text = row['text']
-                author_id = row['author']
-                pub_date = row['pub_date']
-                comments = Comment(id=id, review_id=review_id, text=text,
-                                   author_id=author_id, pub_date=pub_date)
-                comments.save()
+    def load_table(self, name, model, columns, path, batch_size, copy):
+        """Потоково загружает csv в таблицу модели пачками"""
+        started = time.monotonic()
+        with open(path, encoding='utf-8') as csv_file:
+            rows = csv.DictReader(csv_file, delimiter=',')
+            loaded = insert_objects(
+                model,
+                (
+                    model(**{field: row[column]
+                             for column, field in columns.items()})
+                    for row in rows
+                ),
+                batch_size,
+                copy=copy,
+                progress=self.progress(name),
+            )
+        elapsed = time.monotonic() - started
+        rate = loaded / elapsed if elapsed else loaded
+        self.stdout.write(
+            f'{name}: {loaded} строк за {elapsed:.2f} с '
+            f'({rate:.0f} строк/с)'
+        )
 
-    def review_update():
-        with open(os.path.join(BASE_DIR, 'static/data/review.csv'),
-                  encoding='utf-8') as csv_file:
-            csv_reader = csv.DictReader(csv_file, delimiter=',')
-            for row in csv_reader:
-                id = row['id']
-                title_id = row['title_id']
-                text = row['text']
-                author_id = row['author']
-                score = row['score']
-                pub_date = row['pub_date']
-                reviews = Review(id=id, title_id=title_id, text=text,
-                                 author_id=author_id, score=score,
-                                 pub_date=pub_date)
-                reviews.save()
+    def progress(self, name):
+        if self.verbosity < 2:
+            return None
+        return lambda loaded: self.stdout.write(f'{name}: {loaded}')
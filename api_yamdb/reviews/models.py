@@ -1,11 +1,42 @@
 from datetime import datetime as dt
 
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import IntegrityError, models, router, transaction
 from users.models import User
 
+from .fields import SearchNameField
+
 current_year = dt.now().year
 
+# Допустимые оценки отзыва
+SCORES = range(1, 11)
+
+
+def score_counter(score):
+    """Счетчик отзывов с оценкой score для гистограммы произведения"""
+    return models.IntegerField(
+        f'Отзывов с оценкой {score}', default=0, editable=False
+    )
+
+
+class StoredCountersMixin:
+    """Не перезаписывает счетчики COUNTER_FIELDS устаревшими значениями.
+
+    Счетчики обновляются только атомарно через F() из reviews.signals,
+    поэтому save() существующего объекта их не сохраняет.
+    """
+
+    COUNTER_FIELDS = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
 
 class Category(models.Model):
     """Категории для категорий"""
@@ -35,20 +66,55 @@ class Genre(models.Model):
         max_length=200,
         help_text='Выберите жанр произведения'
     )
+    # Бит жанра в Title.genre_mask, выдается reviews.genre_masks
+    mask = models.BigIntegerField(
+        'Бит жанра', null=True, unique=True, editable=False
+    )
+
+    # Попытки занять свободный бит, если его забрал параллельный запрос
+    MASK_ATTEMPTS = 5
 
     def __str__(self) -> str:
         return self.slug
 
+    def save(self, *args, **kwargs):
+        """Новый жанр получает свободный бит маски сразу при вставке"""
+        if not self._state.adding or self.mask is not None:
+            return super().save(*args, **kwargs)
+        from .genre_masks import free_masks
+
+        using = kwargs.get('using') or router.db_for_write(
+            type(self), instance=self
+        )
+        for attempt in range(self.MASK_ATTEMPTS):
+            self.mask = next(free_masks(), None)
+            try:
+                with transaction.atomic(using=using):
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                # Повторяем, только если ошибка из-за занятого бита
+                if (
+                    self.mask is None
+                    or attempt == self.MASK_ATTEMPTS - 1
+                    or not Genre.objects.using(using)
+                    .filter(mask=self.mask).exists()
+                ):
+                    self.mask = None
+                    raise
+
     class Meta:
         verbose_name: str = 'Жанр'
         verbose_name_plural: str = 'Жанры'
         ordering = ('pk',)
 
 
-class Title(models.Model):
+class Title(StoredCountersMixin, models.Model):
     """Модель для произведений"""
 
     name = models.CharField('Название произведения', max_length=200)
+    search_name = SearchNameField(
+        'Название для поиска', max_length=400, source='name', db_index=True
+    )
     year = models.PositiveSmallIntegerField(
         'Год создания произведения',
         blank=False,
@@ -73,14 +139,99 @@ class Title(models.Model):
         help_text='Выберите категорию произведения',
     )
     description = models.TextField('Описание')
+    reviews_count = models.IntegerField(
+        'Количество отзывов', default=0, editable=False
+    )
+    score_sum = models.IntegerField('Сумма оценок', default=0, editable=False)
+    # 0 у произведений без отзывов: не-NULL значения сортируются
+    # по индексу одинаково в PostgreSQL и SQLite
+    weighted_rating = models.FloatField(
+        'Взвешенный рейтинг', default=0, editable=False
+    )
+    # Средняя оценка, как ее показывает rating, для сортировки
+    # по индексу; 0 у произведений без отзывов
+    mean_rating = models.PositiveSmallIntegerField(
+        'Средняя оценка', default=0, editable=False
+    )
+
+    scores_1 = score_counter(1)
+    scores_2 = score_counter(2)
+    scores_3 = score_counter(3)
+    scores_4 = score_counter(4)
+    scores_5 = score_counter(5)
+    scores_6 = score_counter(6)
+    scores_7 = score_counter(7)
+    scores_8 = score_counter(8)
+    scores_9 = score_counter(9)
+    scores_10 = score_counter(10)
+    # Сумма битов жанров произведения
+    genre_mask = models.BigIntegerField(
+        'Маска жанров', default=0, editable=False
+    )
+
+    HISTOGRAM_FIELDS = tuple(f'scores_{score}' for score in SCORES)
+    COUNTER_FIELDS = (
+        'reviews_count', 'score_sum', 'weighted_rating', 'mean_rating',
+        'genre_mask',
+    ) + HISTOGRAM_FIELDS
 
     def __str__(self) -> str:
         return self.name
 
+    @property
+    def rating(self):
+        """Средняя оценка по сохраненным счетчикам отзывов"""
+        if not self.reviews_count:
+            return None
+        return self.score_sum / self.reviews_count
+
+    @property
+    def score_histogram(self):
+        """Число отзывов по оценкам: {1: ..., 10: ...}"""
+        return {
+            score: getattr(self, field)
+            for score, field in zip(SCORES, self.HISTOGRAM_FIELDS)
+        }
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Исходная категория нужна для пересчета статистики категорий
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
     class Meta:
         verbose_name: str = 'Произведение'
         verbose_name_plural: str = 'Произведения'
         ordering = ('pk',)
+        indexes = [
+            models.Index(fields=['year', 'id'], name='title_year_idx'),
+            models.Index(fields=['category', 'id'], name='title_category_idx'),
+            # Сортировки списка и лучшие произведения читаются по индексу
+            # в прямом или обратном порядке без сортировки таблицы
+            models.Index(fields=['name', 'id'], name='title_name_idx'),
+            models.Index(
+                fields=['pub_date', 'id'], name='title_pub_date_idx'
+            ),
+            models.Index(
+                fields=['weighted_rating', 'id'], name='title_top_idx'
+            ),
+            models.Index(
+                fields=['category', 'weighted_rating', 'id'],
+                name='title_category_top_idx'
+            ),
+            models.Index(
+                fields=['category', 'pub_date', 'id'],
+                name='title_category_pub_date_idx'
+            ),
+            models.Index(
+                fields=['mean_rating', 'id'], name='title_rating_idx'
+            ),
+            models.Index(
+                fields=['category', 'mean_rating', 'id'],
+                name='title_category_rating_idx'
+            ),
+        ]
 
 
 class GenreTitle(models.Model):
@@ -99,12 +250,30 @@ class GenreTitle(models.Model):
         on_delete=models.SET_NULL
     )
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Исходные произведение и жанр нужны для пересчета сводок и масок
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
     class Meta:
         verbose_name: str = 'Жанр и Произведение'
         verbose_name_plural: str = 'Жанры и произведения'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['title', 'genre'],
+                name='unique_title_genre'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['genre', 'title'], name='genretitle_genre_idx'
+            ),
+        ]
 
 
-class Review(models.Model):
+class Review(StoredCountersMixin, models.Model):
     """Модель отзывов"""
 
     text = models.TextField('Текст отзыва', blank=False)
@@ -125,10 +294,25 @@ class Review(models.Model):
         'Оценка',
         validators=[MinValueValidator(1), MaxValueValidator(10)]
     )
+    comment_count = models.IntegerField(
+        'Количество комментариев', default=0, editable=False
+    )
+    last_comment_at = models.DateTimeField(
+        'Дата последнего комментария', null=True, editable=False
+    )
+
+    COUNTER_FIELDS = ('comment_count', 'last_comment_at')
 
     def __str__(self) -> str:
         return self.text
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем исходные значения для пересчета счетчиков Title
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
     class Meta:
         verbose_name = 'Отзыв'
         verbose_name_plural = 'Отзывы'
@@ -139,6 +323,13 @@ class Review(models.Model):
                 name='unique_title_author'
             )
         ]
+        indexes = [
+            models.Index(fields=['title', 'id'], name='review_title_idx'),
+            models.Index(
+                fields=['title', 'pub_date', 'id'],
+                name='review_title_pub_date_idx'
+            ),
+        ]
 
 
 class Comment(models.Model):
@@ -162,7 +353,83 @@ class Comment(models.Model):
     def __str__(self) -> str:
         return self.text
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Исходный отзыв нужен для пересчета счетчиков Review
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
     class Meta:
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
         ordering = ('pk',)
+        indexes = [
+            models.Index(fields=['review', 'id'], name='comment_review_idx'),
+            models.Index(
+                fields=['review', 'pub_date', 'id'],
+                name='comment_review_pub_date_idx'
+            ),
+        ]
+
+
+class CatalogueStats(models.Model):
+    """Сводка по группе произведений, поддерживается reviews.stats"""
+
+    titles_count = models.IntegerField('Количество произведений', default=0)
+    reviews_count = models.IntegerField('Количество отзывов', default=0)
+    score_sum = models.IntegerField('Сумма оценок', default=0)
+
+    @property
+    def rating(self):
+        """Средняя оценка по всем отзывам группы"""
+        if not self.reviews_count:
+            return None
+        return self.score_sum / self.reviews_count
+
+    class Meta:
+        abstract = True
+
+
+class GenreStats(CatalogueStats):
+    genre = models.OneToOneField(
+        Genre,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name='stats',
+        verbose_name='Жанр',
+    )
+
+    class Meta:
+        verbose_name = 'Статистика жанра'
+        verbose_name_plural = 'Статистика жанров'
+        ordering = ('genre',)
+
+
+class CategoryStats(CatalogueStats):
+    category = models.OneToOneField(
+        Category,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name='stats',
+        verbose_name='Категория',
+    )
+
+    class Meta:
+        verbose_name = 'Статистика категории'
+        verbose_name_plural = 'Статистика категорий'
+        ordering = ('category',)
+
+
+class RatingPrior(models.Model):
+    """Средняя оценка каталога для взвешенного рейтинга, одна строка.
+
+    Пересчитывается командой rebuild_ranking, между пересчетами
+    рейтинги произведений считаются от сохраненного значения.
+    """
+
+    mean = models.FloatField('Средняя оценка каталога')
+
+    class Meta:
+        verbose_name = 'Средняя оценка каталога'
+        verbose_name_plural = 'Средняя оценка каталога'
@@ -0,0 +1,82 @@
+from django.conf import settings
+from django.db.models import (Case, ExpressionWrapper, F, FloatField,
+                              IntegerField, Subquery, Sum, Value, When)
+from django.db.models.functions import Coalesce
+
+from .models import RatingPrior, Title
+
+# Средняя оценка, пока rebuild_ranking еще не запускался: середина шкалы
+DEFAULT_PRIOR_MEAN = 5.5
+
+
+def prior_mean():
+    """Сохраненная средняя оценка каталога, подзапросом"""
+    return Coalesce(
+        Subquery(
+            RatingPrior.objects.values('mean')[:1], output_field=FloatField()
+        ),
+        Value(DEFAULT_PRIOR_MEAN),
+    )
+
+
+def mean_rating(count=0, score=0):
+    """Целая средняя оценка, как в поле rating ответа, после изменения
+    счетчиков на count и score. Без отзывов 0.
+
+    Деление целых в SQLite и PostgreSQL отбрасывает дробную часть,
+    как и IntegerField сериализатора.
+    """
+    return Case(
+        When(reviews_count__gt=-count, then=ExpressionWrapper(
+            (F('score_sum') + score) / (F('reviews_count') + count),
+            output_field=IntegerField(),
+        )),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def weighted_rating(count=0, score=0):
+    """Байесовский рейтинг после изменения счетчиков на count и score.
+
+    (score_sum + m * C) / (reviews_count + m), где C - средняя оценка
+    каталога, m - RANKING_MIN_REVIEWS: произведение с одним отзывом
+    почти не отходит от средней. Без отзывов рейтинг 0. Выражение
+    читает старые значения счетчиков, поэтому его можно ставить в тот же
+    UPDATE, что меняет их через F().
+    """
+    weight = settings.RANKING_MIN_REVIEWS
+    return Case(
+        When(reviews_count__gt=-count, then=ExpressionWrapper(
+            (F('score_sum') + score + prior_mean() * weight)
+            / (F('reviews_count') + count + weight),
+            output_field=FloatField(),
+        )),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+
+
+def update_weighted_ratings(titles):
+    """Пересчитывает рейтинги произведений выборки одним UPDATE"""
+    return titles.update(
+        weighted_rating=weighted_rating(), mean_rating=mean_rating()
+    )
+
+
+def rebuild_ranking():
+    """Обновляет среднюю оценку каталога и рейтинги всех произведений.
+
+    Средняя берется из счетчиков произведений, отзывы не читаются.
+    Возвращает число произведений.
+    """
+    totals = Title.objects.aggregate(
+        reviews=Sum('reviews_count'), score=Sum('score_sum')
+    )
+    if totals['reviews']:
+        RatingPrior.objects.update_or_create(
+            pk=1, defaults={'mean': totals['score'] / totals['reviews']}
+        )
+    else:
+        RatingPrior.objects.all().delete()
+    return update_weighted_ratings(Title.objects.all())
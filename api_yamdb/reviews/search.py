@@ -0,0 +1,225 @@
+import re
+import sqlite3
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+TITLE_FTS_TABLE = 'reviews_title_fts'
+# Триграммный токенизатор FTS5 появился в SQLite 3.34
+SQLITE_TRIGRAM = sqlite3.sqlite_version_info >= (3, 34)
+TRIGRAM_MIN_LENGTH = 3
+# Таблицы с полнотекстовым поиском по полю text
+TEXT_SEARCH_TABLES = ('reviews_review', 'reviews_comment')
+WORD_RE = re.compile(r'\w+')
+
+
+def normalize(text):
+    """Приводит текст к виду для поиска без учета регистра.
+
+    str.casefold корректно обрабатывает кириллицу, в отличие от
+    LIKE в SQLite; ё приравнивается к е.
+    """
+    return (text or '').casefold().replace('ё', 'е')
+
+
+def fts_phrase(text):
+    """Экранирует строку как фразу запроса FTS5"""
+    return '"{}"'.format(text.replace('"', '""'))
+
+
+def filter_titles_by_name(queryset, value):
+    """Произведения, в названии которых встречается value.
+
+    PostgreSQL использует триграммный GIN-индекс по search_name,
+    SQLite - триграммную таблицу FTS5, поддерживаемую триггерами.
+    """
+    value = normalize(value).strip()
+    if not value:
+        return queryset
+    if (
+        connections[queryset.db].vendor == 'sqlite'
+        and SQLITE_TRIGRAM
+        and len(value) >= TRIGRAM_MIN_LENGTH
+    ):
+        # RawSQL в pk__in SQLite разворачивает в IN ((...)) и берет
+        # только первую строку подзапроса, поэтому условие через extra
+        return queryset.extra(
+            where=[
+                f'"reviews_title"."id" IN (SELECT rowid FROM '
+                f'{TITLE_FTS_TABLE} WHERE {TITLE_FTS_TABLE} MATCH %s)'
+            ],
+            params=[fts_phrase(value)],
+        )
+    return queryset.filter(search_name__contains=value)
+
+
+def autocomplete_titles(queryset, prefix, limit):
+    """Первые limit произведений, название которых начинается с prefix"""
+    prefix = normalize(prefix).lstrip()
+    if not prefix:
+        return queryset.none()
+    if connections[queryset.db].vendor == 'sqlite':
+        # Диапазон по btree-индексу вместо LIKE, который SQLite не
+        # может выполнить по индексу с ESCAPE
+        queryset = queryset.filter(
+            search_name__gte=prefix, search_name__lt=prefix + '\U0010ffff'
+        )
+    else:
+        queryset = queryset.filter(search_name__startswith=prefix)
+    return queryset.order_by('search_name', 'pk')[:limit]
+
+
+def text_search(queryset, query):
+    """Полнотекстовый поиск по полю text с ранжированием.
+
+    Возвращает queryset с атрибутом rank (больше - релевантнее),
+    отсортированный по убыванию rank. На PostgreSQL используется
+    GIN-индекс по to_tsvector, на SQLite - таблица FTS5 с триггерами.
+    Ранжируются только TEXT_SEARCH_CANDIDATES самых новых совпадений:
+    иначе ts_rank и bm25 считаются для каждого из них, и время ответа
+    растет вместе с корпусом.
+    """
+    table = queryset.model._meta.db_table
+    connection = connections[queryset.db]
+    limit = settings.TEXT_SEARCH_CANDIDATES
+    if connection.vendor == 'postgresql':
+        config = settings.FULL_TEXT_SEARCH_CONFIG
+        vector = f'to_tsvector(%s::regconfig, "{table}"."text")'
+        tsquery = 'plainto_tsquery(%s::regconfig, %s)'
+        candidates, params = compile_subquery(queryset.extra(
+            where=[f'{vector} @@ {tsquery}'],
+            params=(config, config, query),
+        ).order_by('-pk').values('pk')[:limit])
+        # ts_rank считается только для кандидатов из подзапроса
+        return queryset.extra(
+            select={'rank': f'ts_rank({vector}, {tsquery})'},
+            select_params=(config, config, query),
+            where=[f'"{table}"."id" IN ({candidates})'],
+            params=params,
+        ).order_by('-rank', '-pk')
+    if connection.vendor == 'sqlite':
+        words = WORD_RE.findall(query)
+        if not words:
+            return queryset.none()
+        fts_table = f'{table}_fts'
+        matches = queryset.extra(
+            tables=[fts_table],
+            where=[
+                f'{fts_table}.rowid = "{table}"."id"',
+                f'{fts_table} MATCH %s',
+            ],
+            params=(' '.join(fts_phrase(word) for word in words),),
+        )
+        # FTS5 отдает совпадения по убыванию rowid без сортировки
+        candidates, params = compile_subquery(matches.values('pk').extra(
+            order_by=[f'-{fts_table}.rowid']
+        )[:limit])
+        # bm25 в FTS5 тем меньше, чем релевантнее документ. Он считается
+        # для строк результата в той же таблице FTS: подзапрос на каждую
+        # строку заново собирал бы статистику по всем совпадениям.
+        # Нижняя граница rowid не дает перебирать старые совпадения
+        return matches.extra(
+            select={'rank': f'-{fts_table}.rank'},
+            where=[
+                f'"{table}"."id" IN ({candidates})',
+                f'{fts_table}.rowid >= (SELECT MIN(id) FROM ({candidates}))',
+            ],
+            params=params * 2,
+        ).order_by('-rank', '-pk')
+    return queryset.filter(text__icontains=query).extra(
+        select={'rank': '0'}
+    ).order_by('-pk')
+
+
+def compile_subquery(queryset):
+    """SQL и параметры queryset для вставки в условие extra.
+
+    Условия extra ссылаются на таблицы по имени, а в подзапросе pk__in
+    Django переименовал бы их в U0.
+    """
+    return queryset.query.get_compiler(queryset.db).as_sql()
+
+
+def install_search_indexes(using='default', **kwargs):
+    """Создает поисковые индексы, которые нельзя описать в Meta.indexes.
+
+    Вызывается после каждого migrate: пересоздание таблиц в SQLite
+    удаляет триггеры, а команды идемпотентны.
+    """
+    from .models import Title
+
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            config = settings.FULL_TEXT_SEARCH_CONFIG
+            for table in TEXT_SEARCH_TABLES:
+                cursor.execute(
+                    f'CREATE INDEX IF NOT EXISTS {table}_text_{config}_fts '
+                    f'ON {table} USING gin '
+                    f'(to_tsvector(%s::regconfig, text))',
+                    (config,)
+                )
+            try:
+                cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            except DatabaseError:
+                # Без прав на расширение поиск работает без индекса
+                pass
+            else:
+                cursor.execute(
+                    'CREATE INDEX IF NOT EXISTS '
+                    'reviews_title_search_name_trgm ON reviews_title '
+                    'USING gin (search_name gin_trgm_ops)'
+                )
+        elif connection.vendor == 'sqlite':
+            fts_tables = [
+                (table, 'text', 'unicode61 remove_diacritics 2')
+                for table in TEXT_SEARCH_TABLES
+            ]
+            if SQLITE_TRIGRAM:
+                fts_tables.append(('reviews_title', 'search_name', 'trigram'))
+            for table, column, tokenize in fts_tables:
+                for sql in sqlite_fts_statements(
+                    cursor, table, column, tokenize
+                ):
+                    cursor.execute(sql)
+
+    # Заполняем search_name у строк, созданных до появления поля
+    titles = list(
+        Title.objects.using(using).filter(search_name='').exclude(name='')
+    )
+    for title in titles:
+        title.search_name = normalize(title.name)
+    Title.objects.using(using).bulk_update(
+        titles, ['search_name'], batch_size=1000
+    )
+
+
+def sqlite_fts_statements(cursor, table, column, tokenize):
+    """SQL таблицы FTS5 над table.column и триггеров синхронизации"""
+    fts = f'{table}_fts'
+    cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+        (fts,)
+    )
+    exists = cursor.fetchone() is not None
+    statements = [
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5('
+        f"{column}, content='{table}', content_rowid='id', "
+        f"tokenize='{tokenize}')",
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} '
+        f'BEGIN INSERT INTO {fts}(rowid, {column}) '
+        f'VALUES (new.id, new.{column}); END',
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} '
+        f'BEGIN INSERT INTO {fts}({fts}, rowid, {column}) '
+        f"VALUES ('delete', old.id, old.{column}); END",
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_au '
+        f'AFTER UPDATE OF {column} ON {table} '
+        f'BEGIN INSERT INTO {fts}({fts}, rowid, {column}) '
+        f"VALUES ('delete', old.id, old.{column}); "
+        f'INSERT INTO {fts}(rowid, {column}) '
+        f'VALUES (new.id, new.{column}); END',
+    ]
+    if not exists:
+        # Индексируем строки, созданные до появления таблицы FTS
+        statements.append(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+    return statements
@@ -0,0 +1,332 @@
+from django.db.models import DEFERRED, DateTimeField, F, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import Signal, receiver
+
+from .counters import (last_comment_date, update_review_counters,
+                       update_title_counters)
+from .genre_masks import (assign_genre_masks, clear_genre_mask,
+                          rebuild_genre_masks)
+from .histogram import histogram_changes
+from .models import (Category, CategoryStats, Comment, Genre, GenreStats,
+                     GenreTitle, Review, Title)
+from .ranking import mean_rating, weighted_rating
+from .stats import (change_stats, move_title, rebuild_stats,
+                    refresh_category_stats, refresh_genre_stats,
+                    refresh_title_stats, refresh_titles_stats)
+
+# Массовое изменение строк модели в обход post_save/post_delete.
+# Необязательные аргументы: pks - id измененных строк, fields - имена
+# измененных полей, genre_ids и category_ids - группы, из которых
+# ушли произведения
+bulk_changed = Signal()
+
+# Поля произведения, от которых зависят сводки групп
+TITLE_STATS_FIELDS = {'category', 'reviews_count', 'score_sum'}
+
+
+def change_title_counters(title_id, added=None, removed=None):
+    """Атомарно учитывает оценку added и убирает оценку removed.
+
+    Счетчики, гистограмма и рейтинги произведения меняются одним
+    UPDATE, затем сводки его групп.
+    """
+    count = (added is not None) - (removed is not None)
+    score = (added or 0) - (removed or 0)
+    Title.objects.filter(pk=title_id).update(
+        reviews_count=F('reviews_count') + count,
+        score_sum=F('score_sum') + score,
+        weighted_rating=weighted_rating(count, score),
+        mean_rating=mean_rating(count, score),
+        **histogram_changes(added, removed)
+    )
+    change_stats(title_id, count, score)
+
+
+def loaded_review_values(review):
+    """Исходные title_id и score отзыва, если он был загружен из БД"""
+    loaded = getattr(review, '_loaded_values', {})
+    title_id = loaded.get('title_id', DEFERRED)
+    score = loaded.get('score', DEFERRED)
+    if DEFERRED in (title_id, score):
+        return None
+    return title_id, score
+
+
+@receiver(pre_save, sender=Review)
+def load_review_values(sender, instance, raw=False, **kwargs):
+    """Исходные title_id и score отзыва, загруженного без них"""
+    if raw or instance._state.adding:
+        return
+    if loaded_review_values(instance) is None:
+        row = (
+            Review.objects.filter(pk=instance.pk)
+            .values('title_id', 'score').first()
+        )
+        if row is not None:
+            instance._loaded_values = row
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, created, raw=False, **kwargs):
+    """Обновляет счетчики произведения при создании и изменении отзыва"""
+    if raw:
+        return
+    if created:
+        change_title_counters(instance.title_id, added=instance.score)
+    else:
+        loaded = loaded_review_values(instance)
+        if loaded is None:
+            update_title_counters([instance.title_id])
+            refresh_title_stats(instance.title_id)
+        elif loaded[0] != instance.title_id:
+            change_title_counters(loaded[0], removed=loaded[1])
+            change_title_counters(instance.title_id, added=instance.score)
+        elif loaded[1] != instance.score:
+            change_title_counters(
+                instance.title_id, added=instance.score, removed=loaded[1]
+            )
+    instance._loaded_values = {
+        'title_id': instance.title_id,
+        'score': instance.score,
+    }
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    """Уменьшает счетчики произведения при удалении отзыва"""
+    title_id, score = (
+        loaded_review_values(instance)
+        or (instance.title_id, instance.score)
+    )
+    change_title_counters(title_id, removed=score)
+
+
+def add_review_comment(review_id, pub_date):
+    """Атомарно учитывает новый комментарий в счетчиках отзыва"""
+    pub_date = Value(pub_date, output_field=DateTimeField())
+    Review.objects.filter(pk=review_id).update(
+        comment_count=F('comment_count') + 1,
+        # Комментарии параллельных запросов фиксируются в любом порядке
+        last_comment_at=Greatest(
+            Coalesce(F('last_comment_at'), pub_date), pub_date
+        ),
+    )
+
+
+def remove_review_comment(review_id):
+    """Атомарно убирает комментарий из счетчиков отзыва.
+
+    Дата последнего комментария берется подзапросом по индексу
+    (review, pub_date) в том же UPDATE.
+    """
+    Review.objects.filter(pk=review_id).update(
+        comment_count=F('comment_count') - 1,
+        last_comment_at=last_comment_date(),
+    )
+
+
+@receiver(pre_save, sender=Comment)
+def load_comment_review(sender, instance, raw=False, **kwargs):
+    """Исходный отзыв комментария, загруженного без review_id"""
+    if raw or instance._state.adding:
+        return
+    loaded = getattr(instance, '_loaded_values', {})
+    if loaded.get('review_id', DEFERRED) is DEFERRED:
+        loaded['review_id'] = (
+            Comment.objects.filter(pk=instance.pk)
+            .values_list('review_id', flat=True).first()
+        )
+        instance._loaded_values = loaded
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    """Обновляет счетчики отзыва при создании и переносе комментария"""
+    if raw:
+        return
+    loaded = getattr(instance, '_loaded_values', {})
+    previous = loaded.get('review_id')
+    if created:
+        add_review_comment(instance.review_id, instance.pub_date)
+    elif previous is not None and previous != instance.review_id:
+        remove_review_comment(previous)
+        add_review_comment(instance.review_id, instance.pub_date)
+    loaded['review_id'] = instance.review_id
+    instance._loaded_values = loaded
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    """Уменьшает счетчики отзыва при удалении комментария"""
+    review_id = getattr(instance, '_loaded_values', {}).get(
+        'review_id', instance.review_id
+    )
+    remove_review_comment(review_id)
+
+
+@receiver(post_delete, sender=Genre)
+def genre_deleted(sender, instance, **kwargs):
+    clear_genre_mask(instance.mask)
+
+
+@receiver(post_save, sender=Genre)
+def genre_saved(sender, instance, created, raw=False, **kwargs):
+    """У нового жанра сводка с нулями"""
+    if created and not raw:
+        GenreStats.objects.create(genre=instance)
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        CategoryStats.objects.create(category=instance)
+
+
+@receiver(pre_save, sender=Title)
+def load_title_category(sender, instance, raw=False, **kwargs):
+    """Исходная категория произведения, загруженного без нее"""
+    if raw or instance._state.adding:
+        return
+    loaded = getattr(instance, '_loaded_values', {})
+    if loaded.get('category_id', DEFERRED) is DEFERRED:
+        loaded['category_id'] = (
+            Title.objects.filter(pk=instance.pk)
+            .values_list('category_id', flat=True).first()
+        )
+        instance._loaded_values = loaded
+
+
+@receiver(post_save, sender=Title)
+def title_saved(sender, instance, created, raw=False, **kwargs):
+    """Переносит произведение в сводку новой категории"""
+    if raw:
+        return
+    loaded = getattr(instance, '_loaded_values', {})
+    previous = loaded.get('category_id')
+    if created:
+        move_title(instance.pk, category_ids=[instance.category_id])
+    elif previous != instance.category_id:
+        move_title(instance.pk, category_ids=[previous], sign=-1)
+        move_title(instance.pk, category_ids=[instance.category_id])
+    loaded['category_id'] = instance.category_id
+    instance._loaded_values = loaded
+
+
+@receiver(pre_delete, sender=Title)
+def remember_title_genres(sender, instance, **kwargs):
+    # После удаления связи с жанрами уже обнулены
+    instance._genre_ids = list(
+        GenreTitle.objects.filter(title_id=instance.pk)
+        .values_list('genre_id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Title)
+def title_deleted(sender, instance, **kwargs):
+    """Пересчитывает сводки групп удаленного произведения.
+
+    Разницу применить нельзя: каскадное удаление отзывов уже изменило
+    часть сводок, а связи с жанрами к этому моменту обнулены.
+    """
+    refresh_genre_stats(getattr(instance, '_genre_ids', None))
+    refresh_category_stats([instance.category_id])
+
+
+@receiver(pre_save, sender=GenreTitle)
+def load_genre_title(sender, instance, raw=False, **kwargs):
+    """Исходные произведение и жанр связи, загруженной без них"""
+    if raw or instance._state.adding:
+        return
+    loaded = getattr(instance, '_loaded_values', {})
+    if DEFERRED in (loaded.get('title_id', DEFERRED),
+                    loaded.get('genre_id', DEFERRED)):
+        instance._loaded_values = (
+            GenreTitle.objects.filter(pk=instance.pk)
+            .values('title_id', 'genre_id').first() or {}
+        )
+
+
+@receiver(post_save, sender=GenreTitle)
+def genre_title_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    loaded = getattr(instance, '_loaded_values', {})
+    previous = (loaded.get('title_id'), loaded.get('genre_id'))
+    current = (instance.title_id, instance.genre_id)
+    if created or previous != current:
+        # Связь перенесена в другое произведение или жанр
+        if not created and previous[0] is not None:
+            move_title(previous[0], [previous[1]], sign=-1)
+            rebuild_genre_masks([previous[0]])
+        if current[0] is not None:
+            move_title(current[0], [current[1]])
+            rebuild_genre_masks([current[0]])
+    instance._loaded_values = {'title_id': current[0], 'genre_id': current[1]}
+
+
+@receiver(post_delete, sender=GenreTitle)
+def genre_title_deleted(sender, instance, **kwargs):
+    """Вызывается и для title.genre.remove/clear/set"""
+    if instance.title_id is not None:
+        move_title(instance.title_id, [instance.genre_id], sign=-1)
+        rebuild_genre_masks([instance.title_id])
+
+
+@receiver(m2m_changed, sender=Title.genre.through)
+def title_genres_added(sender, instance, action, reverse, pk_set,
+                       **kwargs):
+    """title.genre.add создает связи через bulk_create без post_save"""
+    if action != 'post_add' or not pk_set:
+        return
+    if reverse:
+        # genre.titles.add(...)
+        refresh_genre_stats([instance.pk])
+        rebuild_genre_masks(pk_set)
+    else:
+        move_title(instance.pk, pk_set)
+        rebuild_genre_masks([instance.pk])
+
+
+# Модели, массовое изменение которых меняет статистику групп
+STATS_REFRESH = {
+    Genre: refresh_genre_stats,
+    Category: refresh_category_stats,
+    GenreTitle: refresh_genre_stats,
+    Review: rebuild_stats,
+}
+
+
+@receiver(bulk_changed)
+def refresh_bulk_stats(sender, pks=None, fields=None, genre_ids=(),
+                       category_ids=(), **kwargs):
+    """У произведений с известными pks пересчитываются только их группы"""
+    if sender is Title:
+        if fields is not None and not TITLE_STATS_FIELDS & set(fields):
+            return
+        if pks is None:
+            rebuild_stats()
+        else:
+            refresh_titles_stats(pks, genre_ids, category_ids)
+        return
+    refresh = STATS_REFRESH.get(sender)
+    if refresh is not None:
+        refresh()
+
+
+@receiver(bulk_changed)
+def refresh_bulk_review_counters(sender, **kwargs):
+    if sender is Comment:
+        update_review_counters()
+
+
+@receiver(bulk_changed)
+def refresh_bulk_genre_masks(sender, pks=None, fields=None, **kwargs):
+    """Маски зависят только от связей, а не от полей произведения"""
+    if sender is Genre:
+        assign_genre_masks()
+    elif sender is Title and fields is None:
+        rebuild_genre_masks(pks)
+    elif sender is GenreTitle:
+        rebuild_genre_masks()
@@ -0,0 +1,159 @@
+from django.db.models import Count, F, Subquery, Sum
+
+from .models import (Category, CategoryStats, Genre, GenreStats, GenreTitle,
+                     Title)
+
+
+def genre_aggregates(genre_ids):
+    """Число произведений, отзывов и сумма оценок по жанрам"""
+    links = GenreTitle.objects.filter(title__isnull=False)
+    if genre_ids is not None:
+        links = links.filter(genre_id__in=genre_ids)
+    return {
+        row['genre_id']: (row['titles'], row['reviews'], row['score'])
+        for row in links.order_by().values('genre_id').annotate(
+            titles=Count('title_id'),
+            reviews=Sum('title__reviews_count'),
+            score=Sum('title__score_sum'),
+        )
+    }
+
+
+def category_aggregates(category_ids):
+    """Число произведений, отзывов и сумма оценок по категориям"""
+    titles = Title.objects.filter(category__isnull=False)
+    if category_ids is not None:
+        titles = titles.filter(category_id__in=category_ids)
+    return {
+        row['category_id']: (row['titles'], row['reviews'], row['score'])
+        for row in titles.order_by().values('category_id').annotate(
+            titles=Count('pk'),
+            reviews=Sum('reviews_count'),
+            score=Sum('score_sum'),
+        )
+    }
+
+
+def store_stats(model, ids, aggregates):
+    """Записывает сводки групп ids, у групп без произведений - нули"""
+    existing = model.objects.in_bulk(ids)
+    created, updated = [], []
+    for pk in ids:
+        titles, reviews, score = aggregates.get(pk, (0, 0, 0))
+        stats = existing.get(pk)
+        if stats is None:
+            created.append(model(
+                pk=pk, titles_count=titles, reviews_count=reviews,
+                score_sum=score,
+            ))
+        elif (stats.titles_count, stats.reviews_count,
+              stats.score_sum) != (titles, reviews, score):
+            stats.titles_count = titles
+            stats.reviews_count = reviews
+            stats.score_sum = score
+            updated.append(stats)
+    model.objects.bulk_create(created)
+    model.objects.bulk_update(
+        updated, ('titles_count', 'reviews_count', 'score_sum')
+    )
+    return len(created) + len(updated)
+
+
+def refresh_genre_stats(genre_ids=None):
+    """Пересчитывает сводки жанров по счетчикам произведений.
+
+    Без аргументов пересчитывает все жанры. Сложность - O(произведений
+    в жанрах), отзывы не читаются. Возвращает число измененных строк.
+    """
+    if genre_ids is None:
+        aggregates = genre_aggregates(None)
+        genre_ids = Genre.objects.values_list('pk', flat=True)
+    else:
+        genre_ids = set(genre_ids) - {None}
+        if not genre_ids:
+            return 0
+        aggregates = genre_aggregates(genre_ids)
+    return store_stats(GenreStats, genre_ids, aggregates)
+
+
+def refresh_category_stats(category_ids=None):
+    """Пересчитывает сводки категорий, как refresh_genre_stats"""
+    if category_ids is None:
+        aggregates = category_aggregates(None)
+        category_ids = Category.objects.values_list('pk', flat=True)
+    else:
+        category_ids = set(category_ids) - {None}
+        if not category_ids:
+            return 0
+        aggregates = category_aggregates(category_ids)
+    return store_stats(CategoryStats, category_ids, aggregates)
+
+
+def rebuild_stats():
+    """Пересчитывает сводки всех жанров и категорий"""
+    return refresh_genre_stats() + refresh_category_stats()
+
+
+def refresh_title_stats(title_id):
+    """Пересчитывает сводки жанров и категории произведения"""
+    refresh_titles_stats([title_id])
+
+
+def refresh_titles_stats(title_ids, genre_ids=(), category_ids=()):
+    """Пересчитывает сводки групп произведений title_ids.
+
+    genre_ids и category_ids - группы, из которых произведения ушли.
+    """
+    genre_ids = set(genre_ids) | set(
+        GenreTitle.objects.filter(title_id__in=title_ids)
+        .values_list('genre_id', flat=True)
+    )
+    category_ids = set(category_ids) | set(
+        Title.objects.filter(pk__in=title_ids)
+        .values_list('category_id', flat=True)
+    )
+    return refresh_genre_stats(genre_ids) + refresh_category_stats(
+        category_ids
+    )
+
+
+def change_stats(title_id, count, score):
+    """Атомарно прибавляет отзывы произведения к сводкам его групп.
+
+    Два UPDATE с подзапросами, число запросов не зависит от числа
+    жанров произведения.
+    """
+    changes = {
+        'reviews_count': F('reviews_count') + count,
+        'score_sum': F('score_sum') + score,
+    }
+    GenreStats.objects.filter(pk__in=GenreTitle.objects.filter(
+        title_id=title_id
+    ).values('genre_id')).update(**changes)
+    CategoryStats.objects.filter(pk__in=Title.objects.filter(
+        pk=title_id
+    ).values('category_id')).update(**changes)
+
+
+def move_title(title_id, genre_ids=(), category_ids=(), sign=1):
+    """Добавляет (sign=1) или убирает (-1) произведение из сводок групп.
+
+    Счетчики отзывов произведения берутся подзапросом, поэтому на каждую
+    модель сводок приходится один UPDATE.
+    """
+    title = Title.objects.filter(pk=title_id)
+    changes = {
+        'titles_count': F('titles_count') + sign,
+        'reviews_count': F('reviews_count') + sign * Subquery(
+            title.values('reviews_count')
+        ),
+        'score_sum': F('score_sum') + sign * Subquery(
+            title.values('score_sum')
+        ),
+    }
+    genre_ids = set(genre_ids) - {None}
+    category_ids = set(category_ids) - {None}
+    if genre_ids:
+        GenreStats.objects.filter(pk__in=genre_ids).update(**changes)
+    if category_ids:
+        CategoryStats.objects.filter(pk__in=category_ids).update(**changes)
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import User
+from .models import OutgoingEmail, User
 
 
 @admin.register(User)
@@ -15,3 +15,11 @@ class UserAdmin(admin.ModelAdmin):
         else:
             obj.is_staff = False
             obj.save()
+
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ('recipient', 'subject', 'status', 'attempts',
+                    'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('recipient',)
@@ -0,0 +1,79 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from .models import User
+
+# Версия токенов и права пользователя в общем кэше
+TOKEN_STATE_KEY = 'users:token:{}'
+
+_users = {}
+_lock = threading.Lock()
+
+
+def get_cached_user(pk):
+    """Пользователь из кэша процесса или из БД.
+
+    Запись живет USER_CACHE_TIMEOUT секунд и сбрасывается при
+    сохранении или удалении пользователя в этом процессе.
+    """
+    now = time.monotonic()
+    with _lock:
+        cached = _users.get(pk)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+    user = User.objects.filter(pk=pk).first()
+    if user is not None:
+        with _lock:
+            _users[pk] = (now + settings.USER_CACHE_TIMEOUT, user)
+    return user
+
+
+def invalidate_user(pk):
+    with _lock:
+        _users.pop(pk, None)
+
+
+def clear_user_cache():
+    with _lock:
+        _users.clear()
+
+
+def load_token_state(pk):
+    """Версия токенов и CLAIM_FIELDS из основной БД, None без пользователя.
+
+    Реплика может еще не знать о смене прав.
+    """
+    return User.objects.using(DEFAULT_DB_ALIAS).filter(pk=pk).values(
+        'token_version', *User.CLAIM_FIELDS
+    ).first()
+
+
+def get_token_state(pk):
+    """Версия токенов и права пользователя из общего кэша.
+
+    Запись живет AUTH_CACHE_TIMEOUT секунд и удаляется при сохранении
+    и удалении пользователя, поэтому изменения в обход save() видны
+    не позже, чем через это время.
+    """
+    key = TOKEN_STATE_KEY.format(pk)
+    state = cache.get(key)
+    if state is None:
+        state = load_token_state(pk)
+        if state is not None:
+            cache.set(key, state, settings.AUTH_CACHE_TIMEOUT)
+    return state
+
+
+def invalidate_token_state(pk, using=DEFAULT_DB_ALIAS):
+    """Удаляет права из общего кэша сейчас и после фиксации транзакции.
+
+    Иначе параллельный запрос успеет положить в кэш права, прочитанные
+    до фиксации.
+    """
+    key = TOKEN_STATE_KEY.format(pk)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key), using=using)
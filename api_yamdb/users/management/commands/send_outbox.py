@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from users.outbox import deliver_outbox
+
+
+class Command(BaseCommand):
+    help = 'deliver queued emails in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='keep polling the outbox instead of exiting when empty',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=2,
+            help='seconds to wait when the outbox is empty',
+        )
+
+    def handle(self, *args, **options):
+        """Отправляет письма из очереди, пока она не опустеет"""
+        total_sent = total_failed = 0
+        while True:
+            close_old_connections()
+            sent, failed = deliver_outbox(options['batch_size'])
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                if options['verbosity'] > 1:
+                    self.stdout.write(
+                        f'Отправлено: {sent}, отложено: {failed}'
+                    )
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(
+            f'Отправлено писем: {total_sent}, отложено: {total_failed}'
+        )
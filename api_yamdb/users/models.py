@@ -1,5 +1,7 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models import DEFERRED, F
+from django.utils import timezone
 
 
 class User(AbstractUser):
@@ -18,6 +20,15 @@ class User(AbstractUser):
         default='user',
         max_length=30,
     )
+    # Номер в токенах доступа, токены с другим номером не принимаются
+    token_version = models.PositiveIntegerField(
+        'Версия токенов', default=0, editable=False
+    )
+
+    # Поля, которые переносятся в claims токена доступа
+    CLAIM_FIELDS = ('username', 'role', 'is_superuser', 'is_active')
+    # Поля, изменение которых отзывает выпущенные токены
+    TOKEN_FIELDS = ('role', 'is_superuser', 'is_active', 'password')
 
     class Meta:
         ordering = ('pk',)
@@ -26,3 +37,150 @@ class User(AbstractUser):
 
     def __str__(self):
         return self.username
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем исходные права, чтобы заметить их изменение
+        instance._loaded_claims = instance.get_claims()
+        instance._loaded_auth = instance.get_auth_values()
+        return instance
+
+    def get_claims(self):
+        """Значения CLAIM_FIELDS без загрузки отложенных полей"""
+        return {
+            field: self.__dict__.get(field, DEFERRED)
+            for field in self.CLAIM_FIELDS
+        }
+
+    def get_auth_values(self):
+        """Значения TOKEN_FIELDS без загрузки отложенных полей"""
+        return {
+            field: self.__dict__.get(field, DEFERRED)
+            for field in self.TOKEN_FIELDS
+        }
+
+    def auth_changed(self, update_fields=None):
+        """Сохраняемые поля TOKEN_FIELDS отличаются от загруженных"""
+        loaded = getattr(self, '_loaded_auth', {})
+        return any(
+            field in self.__dict__
+            and self.__dict__[field] != loaded.get(field, DEFERRED)
+            for field in self.TOKEN_FIELDS
+            if update_fields is None or field in update_fields
+        )
+
+    def save(self, *args, **kwargs):
+        """Смена роли, флагов или пароля отзывает выпущенные токены"""
+        update_fields = kwargs.get('update_fields')
+        bump = not self._state.adding and self.auth_changed(update_fields)
+        if bump:
+            self.token_version = F('token_version') + 1
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'token_version'}
+        super().save(*args, **kwargs)
+        if bump:
+            # Новый номер загрузится из БД при обращении
+            del self.__dict__['token_version']
+        self._loaded_auth = self.get_auth_values()
+
+    def refresh_from_db(self, using=None, fields=None):
+        deferred = self.get_deferred_fields()
+        super().refresh_from_db(using, fields)
+        refreshed = (
+            set(self.TOKEN_FIELDS) - deferred if fields is None
+            else set(fields)
+        )
+        self.remember_auth(refreshed)
+
+    def remember_auth(self, fields):
+        """Поля fields загружены из БД и служат исходными значениями"""
+        loaded = getattr(self, '_loaded_auth', {})
+        for field in set(fields) & set(self.TOKEN_FIELDS):
+            loaded[field] = self.__dict__.get(field, DEFERRED)
+        self._loaded_auth = loaded
+
+
+class TokenUser(User):
+    """Пользователь, восстановленный из claims токена без запроса к БД.
+
+    Остальные поля отложены и при первом обращении к любому из них
+    берутся разом из кэша пользователей. Сохранение записывает только
+    загруженные и измененные поля.
+    """
+
+    class Meta:
+        proxy = True
+
+    @classmethod
+    def from_claims(cls, pk, claims):
+        values = {field: claims[field] for field in cls.CLAIM_FIELDS}
+        values['id'] = pk
+        # from_db ожидает значения в порядке полей модели
+        field_names = [
+            field.attname for field in cls._meta.concrete_fields
+            if field.attname in values
+        ]
+        return cls.from_db(
+            'default', field_names,
+            [values[name] for name in field_names],
+        )
+
+    def refresh_from_db(self, using=None, fields=None):
+        deferred = self.get_deferred_fields()
+        if fields is None or not deferred.issuperset(fields):
+            super().refresh_from_db(using, fields)
+            return
+        from .cache import get_cached_user
+        user = get_cached_user(self.pk)
+        if user is None:
+            raise User.DoesNotExist('Пользователь удален')
+        for field in deferred:
+            setattr(self, field, getattr(user, field))
+        self.remember_auth(deferred)
+
+
+class OutgoingEmail(models.Model):
+    """Письмо в очереди на отправку.
+
+    Запрос только сохраняет письмо, отправкой пачками занимается
+    команда send_outbox.
+    """
+
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'Ожидает отправки'),
+        (SENT, 'Отправлено'),
+        (FAILED, 'Не отправлено'),
+    )
+
+    subject = models.CharField('Тема', max_length=255)
+    body = models.TextField('Текст')
+    from_email = models.CharField('Отправитель', max_length=254)
+    recipient = models.EmailField('Получатель')
+    status = models.CharField(
+        'Статус', choices=STATUSES, default=PENDING, max_length=10
+    )
+    attempts = models.PositiveSmallIntegerField('Попыток отправки', default=0)
+    next_attempt_at = models.DateTimeField(
+        'Следующая попытка', default=timezone.now
+    )
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    created_at = models.DateTimeField('Создано', auto_now_add=True)
+    sent_at = models.DateTimeField('Отправлено', null=True, blank=True)
+
+    class Meta:
+        ordering = ('pk',)
+        verbose_name = 'Исходящее письмо'
+        verbose_name_plural = 'Исходящие письма'
+        indexes = [
+            models.Index(
+                fields=['status', 'next_attempt_at'],
+                name='outgoing_email_due_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipient}: {self.subject}'
@@ -0,0 +1,98 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+# Сколько письмо считается занятым отправителем, прежде чем его
+# сможет забрать другой процесс
+CLAIM_LEASE = timedelta(minutes=5)
+# Предельная пауза между повторными попытками
+MAX_RETRY_DELAY = timedelta(hours=6)
+
+
+def enqueue_email(subject, body, recipient, from_email='auth@yamdb.com'):
+    """Ставит письмо в очередь, отправка произойдет после коммита"""
+    return OutgoingEmail.objects.create(
+        subject=subject, body=body, from_email=from_email,
+        recipient=recipient,
+    )
+
+
+def claim_batch(batch_size):
+    """Забирает пачку писем, которые пора отправить.
+
+    Строки блокируются с SKIP LOCKED и откладываются на CLAIM_LEASE,
+    поэтому несколько отправителей не получат одно и то же письмо.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            OutgoingEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutgoingEmail.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        OutgoingEmail.objects.filter(pk__in=ids).update(
+            next_attempt_at=now + CLAIM_LEASE
+        )
+    return list(OutgoingEmail.objects.filter(pk__in=ids).order_by('pk'))
+
+
+def retry_later(email, error):
+    """Откладывает письмо с экспоненциальной паузой или отбрасывает его"""
+    email.attempts += 1
+    email.last_error = f'{type(error).__name__}: {error}'
+    if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        email.status = OutgoingEmail.FAILED
+    else:
+        delay = timedelta(
+            seconds=settings.EMAIL_OUTBOX_RETRY_DELAY
+            * 2 ** (email.attempts - 1)
+        )
+        email.next_attempt_at = timezone.now() + min(delay, MAX_RETRY_DELAY)
+    email.save(update_fields=(
+        'attempts', 'last_error', 'status', 'next_attempt_at'
+    ))
+
+
+def deliver_outbox(batch_size=None, connection=None):
+    """Отправляет одну пачку писем через одно соединение.
+
+    Возвращает число отправленных и число отложенных писем.
+    """
+    emails = claim_batch(batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE)
+    if not emails:
+        return 0, 0
+    connection = connection or get_connection()
+    sent, failed = [], 0
+    try:
+        connection.open()
+    except Exception as error:
+        for email in emails:
+            retry_later(email, error)
+        return 0, len(emails)
+    try:
+        for email in emails:
+            message = EmailMessage(
+                email.subject, email.body, email.from_email,
+                [email.recipient], connection=connection,
+            )
+            try:
+                message.send()
+            except Exception as error:
+                retry_later(email, error)
+                failed += 1
+            else:
+                sent.append(email.pk)
+    finally:
+        connection.close()
+    OutgoingEmail.objects.filter(pk__in=sent).update(
+        status=OutgoingEmail.SENT, sent_at=timezone.now(),
+        attempts=F('attempts') + 1, last_error='',
+    )
+    return len(sent), failed
@@ -0,0 +1,23 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_token_state, invalidate_user
+from .models import User
+
+
+@receiver(post_save)
+def user_saved(sender, instance, created, using, raw=False, **kwargs):
+    """Сбрасывает кэш пользователя в этом процессе и его права
+    в общем кэше"""
+    if not isinstance(instance, User) or created or raw:
+        return
+    invalidate_user(instance.pk)
+    invalidate_token_state(instance.pk, using)
+    instance._loaded_claims = instance.get_claims()
+
+
+@receiver(post_delete)
+def user_deleted(sender, instance, using, **kwargs):
+    if isinstance(instance, User):
+        invalidate_user(instance.pk)
+        invalidate_token_state(instance.pk, using)